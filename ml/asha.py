@@ -0,0 +1,99 @@
+"""Asynchronous successive halving (ASHA) for hyper-parameter sweeps.
+
+Every trial of a sweep is a normal ``train.py`` run that shares a rung directory
+(``--asha-dir`` / ``asha.dir``). Rungs are at ``min_epochs * eta^k`` epochs
+(k = 0, 1, ...; below ``max_epochs``). When a trial reaches a rung it records its
+val macro_f1 there and continues only if it is in the top ``1/eta`` of all
+results recorded at that rung so far – otherwise it stops like an early stop
+(best.pt / metrics_final.json are still written). No trial ever waits for others.
+
+Promotion rule (as in ASHA / Optuna's SuccessiveHalvingPruner): with n results
+at the rung, a trial continues if its value >= the ``max(n // eta, 1)``-th best.
+While fewer than ``eta`` results exist, k = 1: only a trial that matches or beats the
+best value recorded so far continues (the first trial at a rung always does, a second one
+only if it is at least as good). Later, weak configs are stopped after ``min_epochs``
+instead of running all epochs (or until patience).
+
+Cost: with eta=3 only ~1/3 of the trials run past the first rung, 1/9 past the
+second, ... -> a sweep of N trials costs roughly N * min_epochs * (1 + #rungs)
+epochs instead of N * epochs.
+
+Files: ``<dir>/rung_<epoch>/<trial_id>.json`` ({'trial', 'epoch', 'value'}), written
+atomically (tmp + rename) -> safe with parallel trials on one host / shared FS.
+"""
+from __future__ import annotations
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+
+def rung_epochs(min_epochs: int, reduction_factor: int, max_epochs: int) -> List[int]:
+    rungs = []
+    r = max(1, int(min_epochs))
+    while r < max_epochs:
+        rungs.append(r)
+        r *= max(2, int(reduction_factor))
+    return rungs
+
+
+def is_promotable(value: float, competing: List[float], reduction_factor: int) -> bool:
+    """competing includes ``value`` itself."""
+    ranked = sorted(competing, reverse=True)
+    k = max(len(ranked) // int(reduction_factor), 1)
+    return value >= ranked[k - 1]
+
+
+class AshaPruner:
+    def __init__(self, rung_dir: Union[str, Path], trial_id: str, min_epochs: int = 2,
+                 reduction_factor: int = 3, max_epochs: int = 35):
+        self.rung_dir = Path(rung_dir)
+        self.trial_id = trial_id
+        self.reduction_factor = int(reduction_factor)
+        self.rungs = rung_epochs(min_epochs, reduction_factor, max_epochs)
+        self.history: List[Dict] = []
+        self.pruned_at: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, asha_cfg: Optional[Dict], rung_dir: Optional[str], trial_id: str, max_epochs: int) -> Optional['AshaPruner']:
+        asha_cfg = asha_cfg or {}
+        rung_dir = rung_dir or asha_cfg.get('dir')
+        if not rung_dir:
+            return None
+        return cls(rung_dir, trial_id, int(asha_cfg.get('min_epochs', 2)),
+                   int(asha_cfg.get('reduction_factor', 3)), max_epochs)
+
+    def _record(self, epoch: int, value: float) -> List[float]:
+        d = self.rung_dir / f'rung_{epoch:04d}'
+        d.mkdir(parents=True, exist_ok=True)
+        tmp = d / f'.{self.trial_id}.json.tmp'
+        tmp.write_text(json.dumps({'trial': self.trial_id, 'epoch': epoch, 'value': value}), encoding='utf-8')
+        os.replace(tmp, d / f'{self.trial_id}.json')
+        values = []
+        for p in d.glob('*.json'):
+            try:
+                values.append(float(json.loads(p.read_text(encoding='utf-8'))['value']))
+            except (ValueError, KeyError, OSError):
+                continue  # parallel geschrieben / defekt -> ignorieren
+        return values
+
+    def report(self, epoch: int, value: float) -> bool:
+        """Record ``value`` if ``epoch`` is a rung; False -> trial should stop."""
+        if epoch not in self.rungs:
+            return True
+        competing = self._record(epoch, float(value))
+        keep = is_promotable(float(value), competing, self.reduction_factor)
+        self.history.append({'epoch': epoch, 'value': float(value), 'n_at_rung': len(competing), 'promoted': keep})
+        if not keep:
+            self.pruned_at = epoch
+        return keep
+
+    def summary(self) -> Dict:
+        return {
+            'rung_dir': self.rung_dir.as_posix(),
+            'trial_id': self.trial_id,
+            'rungs': self.rungs,
+            'reduction_factor': self.reduction_factor,
+            'history': self.history,
+            'pruned_at': self.pruned_at,
+        }
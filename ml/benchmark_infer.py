@@ -3,9 +3,19 @@
 
 Measures:
 - Cold start load time (PyTorch .pt + ONNX)
-- Warm inference latency (mean / p50 / p90 / p95 / p99)
+- Warm inference latency (mean / p50 / p90 / p95 / p99), timed with perf_counter_ns
 - Throughput (images/sec) for batch=1 (focus: on-device style)
 - Optional CUDA sync for accurate GPU timing
+- ``--threads N``: intra-op threads (torch.set_num_threads / ORT intra_op_num_threads; 0 = library default)
+
+Latency under load (``--sweep``):
+- grid over ``--batch-sizes`` x ``--sweep-threads`` (intra-op) x ``--streams`` (concurrent request
+  streams = Python threads sending requests back-to-back against one shared model / session)
+- per point: requests run for ``--sweep-seconds``; latency p50/p90/p99 + mean and throughput
+  (images/s) with bootstrap confidence intervals (``--ci``, throughput over ``--windows`` time windows)
+- curves (throughput / p50 / p99 over batch size per threads x streams) in ``benchmark_sweep.json``,
+  keyed by host (CPU model, cores, ISA flags, library versions) -> runs from several machines
+  accumulate in one file and can be compared directly
 
 Usage:
   python ml/benchmark_infer.py \
@@ -13,12 +23,15 @@ Usage:
     --checkpoint ml/outputs/run_001/best.pt \
     --onnx ml/outputs/run_001/model.onnx \
     --repeats 150
+  python ml/benchmark_infer.py --config ml/configs/baseline.yaml --checkpoint ml/outputs/run_001/best.pt \
+    --sweep --batch-sizes 1,4,16 --sweep-threads 1,2,4 --streams 1,2,4
 
-Outputs JSON: benchmark_results.json in same dir as checkpoint by default (override with --out).
+Outputs JSON: benchmark_results.json (and benchmark_sweep.json) in same dir as checkpoint by default (override with --out).
 """
 from __future__ import annotations
-import argparse, json, time, statistics, os
+import argparse, json, time, statistics, os, platform, hashlib, threading
 from pathlib import Path
+from typing import Callable, Dict, List
 
 import numpy as np
 
@@ -47,7 +60,8 @@ def build_torch_model(name: str, num_classes: int):
     from torch import nn
     from torchvision import models
     if name == 'mobilenet_v3_small':
-        m = models.mobilenet_v3_small(weights=models.MobileNet_V3_Small_Weights.DEFAULT)
+        # Gewichte kommen aus dem Checkpoint -> kein ImageNet Download
+        m = models.mobilenet_v3_small(weights=None)
         m.classifier[3] = nn.Linear(m.classifier[3].in_features, num_classes)
         return m
     return nn.Sequential(
@@ -63,19 +77,44 @@ def percentile(lst, p):
     if f == c: return lst[f]
     return lst[f] + (lst[c]-lst[f]) * (k-f)
 
-def benchmark_torch(ckpt_path: Path, cfg, repeats: int, image_size: int, device: str):
-    if torch is None:
-        return None
-    from torch import nn
+def latency_summary(timings: List[float]) -> Dict:
+    timings = sorted(timings)
+    return {
+        'mean_ms': statistics.mean(timings),
+        'p50_ms': percentile(timings,50),
+        'p90_ms': percentile(timings,90),
+        'p95_ms': percentile(timings,95),
+        'p99_ms': percentile(timings,99),
+        'throughput_fps': 1000.0 / statistics.mean(timings)
+    }
+
+def set_torch_threads(threads: int):
+    if torch is not None and threads > 0:
+        torch.set_num_threads(threads)
+
+def ort_session(onnx_path: Path, providers, threads: int = 0):
+    opts = ort.SessionOptions()
+    if threads > 0:
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+    return ort.InferenceSession(onnx_path.as_posix(), sess_options=opts, providers=providers)
+
+def load_torch_model(ckpt_path: Path, cfg, device: str):
     model_name = cfg.get('model', {}).get('name', 'mobilenet_v3_small')
     num_classes = cfg.get('model', {}).get('num_classes', len(CLASS_NAMES))
+    t0 = time.perf_counter_ns()
     model = build_torch_model(model_name, num_classes)
     state = torch.load(ckpt_path, map_location='cpu')
-    sd = state.get('model', state)
-    model.load_state_dict(sd, strict=False)
-    start_load = time.time()
+    from prune import load_pruned_checkpoint
+    model = load_pruned_checkpoint(model, state)  # prune_spec / qat -> Architektur, dann strict load
     model.eval().to(device)
-    load_time = time.time() - start_load
+    return model, (time.perf_counter_ns() - t0) / 1e6
+
+def benchmark_torch(ckpt_path: Path, cfg, repeats: int, image_size: int, device: str, threads: int = 0):
+    if torch is None:
+        return None
+    set_torch_threads(threads)
+    model, load_ms = load_torch_model(ckpt_path, cfg, device)
     dummy = torch.randn(1,3,image_size,image_size, device=device)
     timings = []
     # Warmup
@@ -84,55 +123,231 @@ def benchmark_torch(ckpt_path: Path, cfg, repeats: int, image_size: int, device:
             _ = model(dummy)
     torch.cuda.synchronize() if (device=='cuda' and torch.cuda.is_available()) else None
     for _ in range(repeats):
-        t0 = time.time()
+        t0 = time.perf_counter_ns()
         with torch.no_grad():
             _ = model(dummy)
         if device=='cuda' and torch.cuda.is_available():
             torch.cuda.synchronize()
-        t1 = time.time()
-        timings.append((t1 - t0)*1000.0)
-    timings.sort()
+        timings.append((time.perf_counter_ns() - t0) / 1e6)
     return {
         'framework': 'pytorch',
         'device': device,
-        'load_ms': load_time*1000.0,
-        'mean_ms': statistics.mean(timings),
-        'p50_ms': percentile(timings,50),
-        'p90_ms': percentile(timings,90),
-        'p95_ms': percentile(timings,95),
-        'p99_ms': percentile(timings,99),
-        'throughput_fps': 1000.0 / statistics.mean(timings)
+        'threads': torch.get_num_threads(),
+        'load_ms': load_ms,
+        **latency_summary(timings)
     }
 
-def benchmark_onnx(onnx_path: Path, repeats: int, image_size: int, providers):
+def benchmark_onnx(onnx_path: Path, repeats: int, image_size: int, providers, threads: int = 0):
     if ort is None or not onnx_path.exists():
         return None
-    t0 = time.time()
-    sess = ort.InferenceSession(onnx_path.as_posix(), providers=providers)
-    load_ms = (time.time() - t0)*1000.0
+    t0 = time.perf_counter_ns()
+    sess = ort_session(onnx_path, providers, threads)
+    load_ms = (time.perf_counter_ns() - t0) / 1e6
     dummy = np.random.randn(1,3,image_size,image_size).astype(np.float32)
     # Warmup
     for _ in range(10):
         _ = sess.run(None, {'input': dummy})
     timings = []
     for _ in range(repeats):
-        s = time.time()
+        s = time.perf_counter_ns()
         _ = sess.run(None, {'input': dummy})
-        e = time.time()
-        timings.append((e - s)*1000.0)
-    timings.sort()
+        timings.append((time.perf_counter_ns() - s) / 1e6)
     return {
         'framework': 'onnxruntime',
         'providers': providers,
+        'threads': threads or None,
         'load_ms': load_ms,
-        'mean_ms': statistics.mean(timings),
-        'p50_ms': percentile(timings,50),
-        'p90_ms': percentile(timings,90),
-        'p95_ms': percentile(timings,95),
-        'p99_ms': percentile(timings,99),
-        'throughput_fps': 1000.0 / statistics.mean(timings)
+        **latency_summary(timings)
+    }
+
+# ---------- Latency under load (Sweep) ----------
+
+def host_info() -> Dict:
+    """CPU / library fingerprint; sweeps are stored per ``host_key``."""
+    cpu, flags = None, []
+    try:  # Linux; sonst platform.processor()
+        for line in Path('/proc/cpuinfo').read_text(encoding='utf-8', errors='ignore').splitlines():
+            if line.startswith('model name') and cpu is None:
+                cpu = line.split(':', 1)[1].strip()
+            elif line.startswith(('flags', 'Features')) and not flags:
+                flags = line.split(':', 1)[1].split()
+    except OSError:
+        pass
+    cpu = cpu or platform.processor() or platform.machine()
+    isa = [f for f in ('sse4_2', 'avx', 'avx2', 'fma', 'avx512f', 'avx512_vnni', 'avx512_bf16', 'amx_tile', 'asimd', 'asimddp', 'sve') if f in flags]
+    return {
+        'cpu': cpu,
+        'logical_cores': os.cpu_count(),
+        'affinity_cores': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None,
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'isa': isa,
+        'python': platform.python_version(),
+        'torch': getattr(torch, '__version__', None),
+        'onnxruntime': getattr(ort, '__version__', None),
+    }
+
+def host_key(info: Dict) -> str:
+    ident = json.dumps({k: info.get(k) for k in ('cpu', 'logical_cores', 'affinity_cores', 'machine', 'isa')}, sort_keys=True)
+    slug = ''.join(c if c.isalnum() else '-' for c in str(info.get('cpu', 'cpu'))).strip('-').lower()
+    while '--' in slug:
+        slug = slug.replace('--', '-')
+    return f"{slug[:40]}_{info.get('affinity_cores') or info.get('logical_cores')}c_{hashlib.sha1(ident.encode('utf-8')).hexdigest()[:8]}"
+
+def bootstrap_ci(values, stat: Callable = np.mean, level: float = 0.95, n_boot: int = 1000, seed: int = 0):
+    """Percentile bootstrap CI of ``stat`` -> [low, high] (None for < 2 values)."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return None
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(values), size=(n_boot, len(values)))
+    stats = np.array([stat(values[i]) for i in idx])
+    a = (1.0 - level) / 2
+    return [round(float(np.quantile(stats, a)), 4), round(float(np.quantile(stats, 1.0 - a)), 4)]
+
+def run_load(infer: Callable, make_input: Callable, streams: int, duration_s: float, warmup: int = 3) -> Dict:
+    """``streams`` threads call ``infer(x)`` back-to-back for ``duration_s``; returns per-request (start_ns, end_ns)."""
+    inputs = [make_input() for _ in range(streams)]
+    for x in inputs:
+        for _ in range(warmup):
+            infer(x)
+    records: List[List] = [[] for _ in range(streams)]
+    barrier = threading.Barrier(streams + 1)
+    errors: List[BaseException] = []
+
+    def worker(i):
+        barrier.wait()
+        deadline = t_start[0] + int(duration_s * 1e9)
+        x, rec = inputs[i], records[i]
+        try:
+            while True:
+                s = time.perf_counter_ns()
+                if s >= deadline:
+                    break
+                infer(x)
+                rec.append((s, time.perf_counter_ns()))
+        except BaseException as e:  # Fehler im Stream nicht verschlucken
+            errors.append(e)
+
+    t_start = [0]
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(streams)]
+    for t in threads:
+        t.start()
+    t_start[0] = time.perf_counter_ns()
+    barrier.wait()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return {'t0_ns': t_start[0], 'requests': [r for rec in records for r in rec]}
+
+def summarize_load(requests, t0_ns: int, batch_size: int, streams: int, windows: int = 5, level: float = 0.95) -> Dict:
+    """Latency percentiles + throughput (images/s) with bootstrap CIs over requests / time windows."""
+    if not requests:
+        return {'requests': 0}
+    lat = np.array([(e - s) / 1e6 for s, e in requests])
+    ends = np.array([e for _, e in requests], dtype=np.int64)
+    wall_s = (ends.max() - t0_ns) / 1e9
+    edges = np.linspace(t0_ns, ends.max(), windows + 1)
+    per_window = np.histogram(ends, bins=edges)[0] * batch_size / (wall_s / windows)
+    return {
+        'requests': int(len(lat)),
+        'images': int(len(lat) * batch_size),
+        'wall_s': round(float(wall_s), 4),
+        'throughput_ips': round(len(lat) * batch_size / wall_s, 2),
+        'throughput_ci': bootstrap_ci(per_window, level=level),
+        'latency_ms': {
+            'mean': round(float(lat.mean()), 4),
+            'mean_ci': bootstrap_ci(lat, level=level),
+            'p50': round(float(np.percentile(lat, 50)), 4),
+            'p50_ci': bootstrap_ci(lat, stat=np.median, level=level),
+            'p90': round(float(np.percentile(lat, 90)), 4),
+            'p99': round(float(np.percentile(lat, 99)), 4),
+        },
+        'per_image_ms': round(float(lat.mean()) / batch_size, 4),
+        'streams': streams,
+    }
+
+def build_curves(points: List[Dict]) -> Dict:
+    """framework -> 't{threads}_s{streams}' -> lists over batch size (Throughput-/Latenzkurven)."""
+    curves: Dict[str, Dict] = {}
+    for p in sorted(points, key=lambda p: p['batch_size']):
+        if 'error' in p or not p.get('requests'):
+            continue
+        c = curves.setdefault(p['framework'], {}).setdefault(f"t{p['threads']}_s{p['streams']}", {
+            'threads': p['threads'], 'streams': p['streams'], 'batch_size': [], 'throughput_ips': [],
+            'throughput_ci': [], 'p50_ms': [], 'p99_ms': []})
+        c['batch_size'].append(p['batch_size'])
+        c['throughput_ips'].append(p['throughput_ips'])
+        c['throughput_ci'].append(p['throughput_ci'])
+        c['p50_ms'].append(p['latency_ms']['p50'])
+        c['p99_ms'].append(p['latency_ms']['p99'])
+    return curves
+
+def _parse_ints(s: str) -> List[int]:
+    return [int(v) for v in s.split(',') if v.strip()]
+
+def run_sweep(args, cfg, ckpt_path: Path, image_size: int, device: str) -> Dict:
+    batch_sizes = _parse_ints(args.batch_sizes)
+    thread_counts = _parse_ints(args.sweep_threads) if args.sweep_threads else sorted({1, 2, os.cpu_count() or 1})
+    stream_counts = _parse_ints(args.streams)
+    points = []
+    backends = []
+    if torch is not None:
+        model, _ = load_torch_model(ckpt_path, cfg, device)
+        def torch_infer(x):
+            with torch.inference_mode():
+                model(x)
+            if device == 'cuda':
+                torch.cuda.synchronize()
+        backends.append(('pytorch', lambda b: torch.randn(b, 3, image_size, image_size, device=device), torch_infer))
+    onnx_path = Path(args.onnx) if args.onnx else None
+    if ort is not None and onnx_path is not None and onnx_path.exists():
+        backends.append(('onnxruntime', lambda b: np.random.randn(b, 3, image_size, image_size).astype(np.float32), None))
+    for framework, make, infer in backends:
+        for threads in thread_counts:
+            if framework == 'pytorch':
+                set_torch_threads(threads)
+            else:
+                sess = ort_session(onnx_path, ['CPUExecutionProvider'], threads)
+                infer = lambda x, sess=sess: sess.run(None, {'input': x})
+            for streams in stream_counts:
+                for bs in batch_sizes:
+                    point = {'framework': framework, 'threads': threads, 'streams': streams, 'batch_size': bs}
+                    try:
+                        load = run_load(infer, lambda: make(bs), streams, args.sweep_seconds, warmup=args.sweep_warmup)
+                        point.update(summarize_load(load['requests'], load['t0_ns'], bs, streams, args.windows, args.ci))
+                    except Exception as e:  # z.B. ONNX mit fester Batch-Größe 1
+                        point['error'] = str(e).splitlines()[0][:200]
+                    points.append(point)
+                    if 'error' in point:
+                        print(f"[SWEEP] {framework} t={threads} s={streams} b={bs}: Fehler {point['error']}")
+                    else:
+                        ci = point['throughput_ci'] or [float('nan')] * 2
+                        print(f"[SWEEP] {framework} t={threads} s={streams} b={bs}: {point['throughput_ips']:.1f} img/s "
+                              f"[{ci[0]:.1f}, {ci[1]:.1f}] p50={point['latency_ms']['p50']:.2f}ms p99={point['latency_ms']['p99']:.2f}ms")
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'checkpoint': ckpt_path.as_posix(),
+        'onnx': onnx_path.as_posix() if onnx_path else None,
+        'device': device,
+        'image_size': image_size,
+        'settings': {'seconds': args.sweep_seconds, 'warmup': args.sweep_warmup, 'windows': args.windows,
+                     'ci_level': args.ci, 'clock': 'perf_counter_ns'},
+        'points': points,
+        'curves': build_curves(points),
     }
 
+def write_sweep(out_file: Path, info: Dict, result: Dict) -> str:
+    """Merge into ``out_file``: {'hosts': {host_key: {'host': info, 'runs': [...]}}}."""
+    data = json.loads(out_file.read_text(encoding='utf-8')) if out_file.exists() else {}
+    key = host_key(info)
+    entry = data.setdefault('hosts', {}).setdefault(key, {'host': info, 'runs': []})
+    entry['host'] = info
+    entry['runs'].append(result)
+    out_file.write_text(json.dumps(data, indent=2), encoding='utf-8')
+    return key
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--config', required=True)
@@ -140,7 +355,16 @@ def main():
     ap.add_argument('--onnx', required=False)
     ap.add_argument('--repeats', type=int, default=150)
     ap.add_argument('--device', default='auto', help='cuda | cpu | auto')
+    ap.add_argument('--threads', type=int, default=0, help='Intra-Op Threads (torch / ORT) für den Batch-1 Benchmark (0 = Default der Library)')
     ap.add_argument('--out', default=None)
+    ap.add_argument('--sweep', action='store_true', help='Latenz unter Last: Batch x Threads x Streams -> benchmark_sweep.json')
+    ap.add_argument('--batch-sizes', default='1,2,4,8,16')
+    ap.add_argument('--sweep-threads', default=None, help='Intra-Op Thread-Anzahlen, z.B. 1,2,4 (Default: 1,2,alle Kerne)')
+    ap.add_argument('--streams', default='1,2,4', help='Gleichzeitige Request-Streams (Threads mit gemeinsamem Modell)')
+    ap.add_argument('--sweep-seconds', type=float, default=3.0, help='Messdauer je Sweep-Punkt')
+    ap.add_argument('--sweep-warmup', type=int, default=3, help='Warmup Requests je Stream')
+    ap.add_argument('--windows', type=int, default=10, help='Zeitfenster für das Throughput-Konfidenzintervall')
+    ap.add_argument('--ci', type=float, default=0.95, help='Konfidenzniveau (Bootstrap)')
     args = ap.parse_args()
 
     cfg = load_config(args.config)
@@ -154,14 +378,24 @@ def main():
     ckpt_path = Path(args.checkpoint)
     if not ckpt_path.exists():
         raise SystemExit(f"Checkpoint nicht gefunden: {ckpt_path}")
+    out_dir = Path(args.out) if args.out else ckpt_path.parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.sweep:
+        info = host_info()
+        result = run_sweep(args, cfg, ckpt_path, image_size, device)
+        out_file = out_dir / 'benchmark_sweep.json'
+        key = write_sweep(out_file, info, result)
+        print(f"[SWEEP] Host {key} ({info['cpu']}, {info['logical_cores']} Kerne) -> {out_file}")
+        return
 
     results = {}
-    torch_res = benchmark_torch(ckpt_path, cfg, args.repeats, image_size, device)
+    torch_res = benchmark_torch(ckpt_path, cfg, args.repeats, image_size, device, args.threads)
     if torch_res:
         results['pytorch'] = torch_res
     if args.onnx:
         onnx_path = Path(args.onnx)
-        onnx_cpu = benchmark_onnx(onnx_path, args.repeats, image_size, providers=['CPUExecutionProvider'])
+        onnx_cpu = benchmark_onnx(onnx_path, args.repeats, image_size, providers=['CPUExecutionProvider'], threads=args.threads)
         if onnx_cpu:
             results['onnx_cpu'] = onnx_cpu
         # Optional GPU provider
@@ -172,8 +406,6 @@ def main():
                 if onnx_gpu:
                     results['onnx_cuda'] = onnx_gpu
 
-    out_dir = Path(args.out) if args.out else ckpt_path.parent
-    out_dir.mkdir(parents=True, exist_ok=True)
     out_file = out_dir / 'benchmark_results.json'
     with open(out_file, 'w', encoding='utf-8') as f:
         json.dump(results, f, indent=2)
@@ -16,6 +16,8 @@ import argparse, json, csv, time
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+from generate_manifest import VARIANT_MAP
+
 def load_json(path: Path) -> Dict[str, Any]:
     return json.loads(path.read_text(encoding='utf-8'))
 
@@ -56,16 +58,9 @@ def main():
     last_history = load_history_last(history_path) if history_path.exists() else None
 
     reports = (eval_data or {}).get('reports', {})
-    # Choose variant metrics in manifest based on model_file
+    # Variante aus dem Manifest (quantization), Fallback: gleiche Zuordnung wie generate_manifest
     model_file = manifest.get('model_file')
-    variant_key = None
-    if model_file:
-        if 'int8_full' in model_file:
-            variant_key = 'int8_full'
-        elif 'int8_dynamic' in model_file:
-            variant_key = 'int8_dynamic'
-        else:
-            variant_key = 'fp32'
+    variant_key = manifest.get('quantization') or (VARIANT_MAP.get(model_file, 'fp32') if model_file else None)
     variant_metrics = reports.get(variant_key, {}) if variant_key else {}
 
     summary = {
@@ -4,8 +4,10 @@
 Generates:
   <out>/dataset_manifest.json
   <out>/splits/train.csv, val.csv, test.csv
+  <out>/splits/split_index.npz  (uint64 sample ids, consumed via data.split_index)
 
-Basic stratified split (if class column given) else random.
+Default split strategy ``hash``: stable hash bucketing by group (plant_id) – see ml/splits.py.
+Legacy: ``--strategy stratified`` (shuffle per class column) or ``random``.
 
 Usage:
   python ml/build_dataset_snapshot.py \
@@ -20,6 +22,10 @@ import argparse, csv, json, hashlib, random
 from pathlib import Path
 from collections import defaultdict
 
+import numpy as np
+
+from splits import DEFAULT_KEY_COL, split_rows, save_split_index, sample_id, row_key
+
 RANDOM_SEED = 42
 
 
@@ -64,10 +70,14 @@ def random_split(rows, val_ratio, test_ratio):
     n_val = int(n * val_ratio)
     test = rows[:n_test]
     val = rows[n_test:n_test+n_val]
-    train = rows[n_test+n_test:]
+    train = rows[n_test+n_val:]
     return train, val, test
 
 
+def ids_of(rows, key_col):
+    return np.unique(np.asarray([sample_id(row_key(r, key_col)) for r in rows], dtype=np.uint64))
+
+
 def write_csv(path: Path, rows, fieldnames):
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open('w', newline='', encoding='utf-8') as f:
@@ -93,6 +103,11 @@ def main():
     ap.add_argument('--val-ratio', type=float, default=0.15)
     ap.add_argument('--test-ratio', type=float, default=0.10)
     ap.add_argument('--min-per-class', type=int, default=0)
+    ap.add_argument('--strategy', choices=['hash', 'stratified', 'random'], default='hash',
+                    help='hash = stabil bei Datenzuwachs, gruppiert nach --group-col (ml/splits.py)')
+    ap.add_argument('--salt', default='split_v1', help='Split-Name / Salt für hash (entspricht data.split)')
+    ap.add_argument('--group-col', default='plant_id', help='Gruppen-Spalte für hash (Fallback: --key-col)')
+    ap.add_argument('--key-col', default=DEFAULT_KEY_COL, help='Spalte mit eindeutigem Sample-Key (Default path = <label>/<filename>)')
     ap.add_argument('--hash-limit', type=int, default=200, help='Limit number of files to hash for integrity sample (0=off)')
     args = ap.parse_args()
 
@@ -110,7 +125,12 @@ def main():
     if args.class_col and args.class_col not in fieldnames:
         raise SystemExit(f"class column {args.class_col} not in meta header")
 
-    if args.class_col:
+    if args.strategy == 'hash':
+        parts = split_rows(rows, args.val_ratio, args.test_ratio, args.salt, args.key_col, args.group_col)
+        train, val, test = parts['train'], parts['val'], parts['test']
+        class_stats_all = compute_class_stats(rows, args.class_col) if args.class_col else None
+        class_stats_train = compute_class_stats(train, args.class_col) if args.class_col else None
+    elif args.class_col and args.strategy == 'stratified':
         train, val, test = stratified_split(rows, args.class_col, args.val_ratio, args.test_ratio)
         class_stats_all = compute_class_stats(rows, args.class_col)
         class_stats_train = compute_class_stats(train, args.class_col)
@@ -129,6 +149,13 @@ def main():
     write_csv(splits_dir / 'train.csv', train, fieldnames)
     write_csv(splits_dir / 'val.csv', val, fieldnames)
     write_csv(splits_dir / 'test.csv', test, fieldnames)
+    # kompakter Split-Index (Sample-IDs) für train.py / eval.py / distill.py (data.split_index)
+    index_meta = {'strategy': args.strategy, 'val_ratio': args.val_ratio, 'test_ratio': args.test_ratio, 'key_col': args.key_col}
+    if args.strategy == 'hash':
+        index_meta.update({'salt': args.salt, 'group_col': args.group_col})
+    save_split_index(splits_dir / 'split_index.npz',
+                     {'train': ids_of(train, args.key_col), 'val': ids_of(val, args.key_col), 'test': ids_of(test, args.key_col)},
+                     index_meta)
 
     sample_hashes = []
     if args.hash_limit > 0:
@@ -159,6 +186,9 @@ def main():
         'val_ratio': args.val_ratio,
         'test_ratio': args.test_ratio,
         'seed': RANDOM_SEED,
+        'split_strategy': args.strategy,
+        'split_salt': args.salt if args.strategy == 'hash' else None,
+        'split_group_col': args.group_col if args.strategy == 'hash' else None,
         'sample_hashes': sample_hashes,
     }
     (out_dir / 'dataset_manifest.json').write_text(json.dumps(manifest, indent=2), encoding='utf-8')
@@ -3,13 +3,18 @@
 Expected input:
   ml/data/metadata/metadata.jsonl  (one JSON object per line)
 Each object MUST contain at least: {"path": relative image path from data root, "label": class label}
-Optional fields: split (if pre-assigned), weight, stage, notes.
+Optional fields: split (if pre-assigned), weight, stage, notes, plant_id.
+
+Default strategy ``hash`` (ml/splits.py): split decided by hashing plant_id (fallback: path)
+with a salt -> stable when new records are added, no plant in two splits.
+``--strategy stratified`` keeps the old per-label shuffle (seed 42).
 
 Outputs:
   ml/data/splits/train.txt
   ml/data/splits/val.txt
   ml/data/splits/test.txt
 Each line: <relative_path>\t<label>
+  ml/data/splits/split_index.npz  (uint64 ids of ``path``; data.split_index + data.key_col: path)
 
 Logs stats to stdout + ml/data/splits/stats.json
 """
@@ -18,6 +23,10 @@ import argparse, json, math, random
 from pathlib import Path
 from collections import defaultdict, Counter
 
+import numpy as np
+
+from splits import split_rows, save_split_index, sample_id
+
 RANDOM_SEED = 42
 
 def load_records(meta_path: Path):
@@ -67,6 +76,9 @@ def main():
     ap.add_argument('--val-ratio', type=float, default=0.15)
     ap.add_argument('--test-ratio', type=float, default=0.15)
     ap.add_argument('--min-per-class', type=int, default=5, help='Warn if class count below this')
+    ap.add_argument('--strategy', choices=['hash', 'stratified'], default='hash')
+    ap.add_argument('--salt', default='split_v1', help='Split-Name / Salt für hash (entspricht data.split)')
+    ap.add_argument('--group-key', default='plant_id', help='Gruppenfeld für hash (Fallback: path)')
     args = ap.parse_args()
 
     assert math.isclose(args.train_ratio + args.val_ratio + args.test_ratio, 1.0, rel_tol=1e-3), 'Ratios must sum to 1.'
@@ -86,14 +98,24 @@ def main():
         if cnt < args.min_per_class:
             print(f"WARNING: class '{lbl}' has only {cnt} samples (< {args.min_per_class})")
 
-    splits = stratified_split(items, labels, (args.train_ratio, args.val_ratio, args.test_ratio))
+    if args.strategy == 'hash':
+        splits = split_rows(items, args.val_ratio, args.test_ratio, args.salt, key_col='path', group_col=args.group_key)
+    else:
+        splits = stratified_split(items, labels, (args.train_ratio, args.val_ratio, args.test_ratio))
 
     for split_name in ('train','val','test'):
         write_split(args.outdir / f'{split_name}.txt', splits[split_name])
+    index_meta = {'strategy': args.strategy, 'val_ratio': args.val_ratio, 'test_ratio': args.test_ratio, 'key_col': 'path'}
+    if args.strategy == 'hash':
+        index_meta.update({'salt': args.salt, 'group_col': args.group_key})
+    save_split_index(args.outdir / 'split_index.npz',
+                     {k: np.unique(np.asarray([sample_id(str(r['path'])) for r in v], dtype=np.uint64)) for k, v in splits.items()},
+                     index_meta)
 
     stats = {
         'total': len(items),
         'classes': class_counts,
+        'strategy': args.strategy,
         'splits': {k: len(v) for k,v in splits.items()},
         'ratio_actual': {k: len(v)/len(items) for k,v in splits.items()}
     }
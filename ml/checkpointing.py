@@ -0,0 +1,177 @@
+"""Asynchronous checkpoint writer + full training state helpers.
+
+The training thread only takes a CPU copy of the state (``cpu_state_copy``) and
+hands it to a background writer thread which serializes it to ``<name>.tmp`` and
+atomically renames it (``os.replace``) -> a crash never leaves a half-written
+checkpoint behind, and torch.save no longer blocks the step loop.
+
+Periodic full-state checkpoints (``checkpoints/ckpt_epoch0007.pt``) keep only the
+last N files; ``best.pt`` keeps its slim format ({'model','macro_f1','epoch'}) so
+eval.py / export_model.py / grad_cam.py continue to work unchanged.
+
+Full state (``format: full_v1``): model, optimizer, scaler, lr_history, RNG states
+(python/numpy/torch/cuda), best_macro_f1, early-stop counters, f1_history, epoch.
+Every full checkpoint is also a valid ``--resume`` target and model checkpoint.
+
+Usage:
+ckpt = AsyncCheckpointer(out_dir / 'checkpoints', keep_last=3)
+ckpt.save_full(state)                      # rotiert, behält die letzten 3
+ckpt.save(slim_state, out_dir / 'best.pt')  # ohne Rotation
+ckpt.flush()                               # vor dem Lesen von best.pt
+ckpt.close()
+"""
+from __future__ import annotations
+import os
+import queue
+import random
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+FULL_STATE_FORMAT = 'full_v1'
+CKPT_PREFIX = 'ckpt_epoch'
+
+
+def _torch():
+    import torch  # local import for optional dependency
+    return torch
+
+
+def cpu_state_copy(obj: Any) -> Any:
+    """Deep copy of nested dict/list state with every tensor detached & copied to CPU."""
+    torch = _torch()
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: cpu_state_copy(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [cpu_state_copy(v) for v in obj]
+    if isinstance(obj, tuple):
+        return tuple(cpu_state_copy(v) for v in obj)
+    return obj
+
+
+def atomic_save(state: Dict[str, Any], path: Union[str, Path]):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    _torch().save(state, tmp)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: Union[str, Path], map_location='cpu') -> Dict[str, Any]:
+    """torch.load for full-state checkpoints (RNG states are not plain tensors)."""
+    torch = _torch()
+    try:
+        return torch.load(path, map_location=map_location, weights_only=False)
+    except TypeError:  # torch < 1.13 kennt weights_only nicht
+        return torch.load(path, map_location=map_location)
+
+
+def capture_rng_state() -> Dict[str, Any]:
+    torch = _torch()
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state: Dict[str, Any]):
+    torch = _torch()
+    if 'python' in state:
+        random.setstate(state['python'])
+    if 'numpy' in state:
+        np.random.set_state(state['numpy'])
+    if 'torch' in state:
+        torch.set_rng_state(state['torch'].cpu())
+    if state.get('cuda') is not None and torch.cuda.is_available():
+        try:
+            torch.cuda.set_rng_state_all([s.cpu() for s in state['cuda']])
+        except Exception as e:  # andere GPU-Anzahl als beim Speichern
+            print(f"[CKPT][WARN] CUDA RNG State nicht wiederhergestellt: {e}")
+
+
+def list_checkpoints(ckpt_dir: Union[str, Path]) -> List[Path]:
+    ckpt_dir = Path(ckpt_dir)
+    if not ckpt_dir.is_dir():
+        return []
+    return sorted(ckpt_dir.glob(f'{CKPT_PREFIX}*.pt'))
+
+
+def latest_checkpoint(ckpt_dir: Union[str, Path]) -> Optional[Path]:
+    ckpts = list_checkpoints(ckpt_dir)
+    return ckpts[-1] if ckpts else None
+
+
+class AsyncCheckpointer:
+    """Single background writer thread; writes happen in submission order."""
+
+    def __init__(self, ckpt_dir: Union[str, Path], keep_last: int = 3, async_write: bool = True):
+        self.ckpt_dir = Path(ckpt_dir)
+        self.keep_last = keep_last
+        self.async_write = async_write
+        self.errors: List[str] = []
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._thread = None
+        if async_write:
+            self._thread = threading.Thread(target=self._worker, name='ckpt-writer', daemon=True)
+            self._thread.start()
+
+    def save(self, state: Dict[str, Any], path: Union[str, Path], rotate: bool = False):
+        """Snapshot ``state`` to CPU now, write it later (or immediately if async_write=False)."""
+        job = (cpu_state_copy(state), Path(path), rotate)
+        if self._thread is None:
+            self._write(job)
+        else:
+            self._queue.put(job)
+
+    def save_full(self, state: Dict[str, Any]) -> Path:
+        path = self.ckpt_dir / f"{CKPT_PREFIX}{int(state['epoch']):04d}.pt"
+        self.save(state, path, rotate=True)
+        return path
+
+    def flush(self):
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        self.flush()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(job)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, job):
+        state, path, rotate = job
+        try:
+            atomic_save(state, path)
+            if rotate:
+                self._prune()
+        except Exception as e:
+            self.errors.append(f'{path.name}: {e}')
+            print(f"[CKPT][WARN] Schreiben fehlgeschlagen ({path}): {e}")
+
+    def _prune(self):
+        if self.keep_last <= 0:
+            return
+        for old in list_checkpoints(self.ckpt_dir)[:-self.keep_last]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
@@ -4,8 +4,9 @@
 Steps:
 1. (Optional) Run quantization if --onnx provided and output dir missing.
 2. Run TFLite accuracy comparison (strict thresholds).
-3. Generate manifest selecting best model.
-4. Exit non-zero if thresholds violated or required artifacts missing.
+3. Latency/accuracy Pareto report (pareto_report.py) over all variants.
+4. Generate manifest selecting the fastest model within --max-drop.
+5. Exit non-zero if thresholds violated or required artifacts missing.
 
 Usage Example:
   python ml/ci_gate.py \
@@ -18,7 +19,7 @@ Usage Example:
     --manifest-out app/src/main/assets/leafsense_model.json
 """
 from __future__ import annotations
-import argparse, subprocess, sys, json
+import argparse, subprocess, sys, json, os
 from pathlib import Path
 
 def run(cmd: list[str], desc: str):
@@ -41,6 +42,10 @@ def main():
     ap.add_argument('--image-size', type=int, default=224)
     ap.add_argument('--manifest-out', required=True)
     ap.add_argument('--skip-quant', action='store_true')
+    ap.add_argument('--bench-iters', type=int, default=50, help='Benchmark-Iterationen je Variante für den Pareto Report')
+    ap.add_argument('--skip-pareto', action='store_true', help='Ohne Latenzmessung: Manifest wählt per Fallback-Priorität')
+    ap.add_argument('--jobs', type=int, default=0, help='Prozesse für den Genauigkeitsvergleich (0 = alle Kerne, 1 = seriell)')
+    ap.add_argument('--eval-cache', default='ml/cache/eval_tflite', help='Dekodierter Eval Cache (geteilt mit quantize_ptq Auto-Vergleich, wiederverwendet über CI Läufe)')
     args = ap.parse_args()
 
     quant_dir = Path(args.quant_dir)
@@ -65,6 +70,8 @@ def main():
         '--image-size', str(args.image_size),
         '--max-macro-f1-drop', str(args.max_drop),
         '--max-accuracy-drop', str(args.max_drop),
+        '--eval-cache', args.eval_cache,
+        '--jobs', str(args.jobs or os.cpu_count() or 1),
         '--strict'
     ]
     if args.min_macro_f1 is not None:
@@ -74,14 +81,33 @@ def main():
         print('[FAIL] Accuracy Gate nicht bestanden.')
         sys.exit(rc)
 
-    # Step 3 Manifest
+    # Step 3 Pareto (Latenz je Variante + Genauigkeit aus Step 2)
+    pareto_path = quant_dir / 'pareto_report.json'
+    if pareto_path.exists():
+        pareto_path.unlink()  # keinen veralteten Report verwenden
+    if not args.skip_pareto:
+        pcmd = [
+            sys.executable, 'ml/pareto_report.py',
+            '--models-dir', str(quant_dir),
+            '--max-drop', str(args.max_drop),
+            '--iters', str(args.bench_iters),
+            '--out', str(pareto_path)
+        ]
+        rc = run(pcmd, 'Pareto Report')
+        if rc != 0:
+            print('[WARN] Pareto Report fehlgeschlagen – Manifest nutzt Fallback-Priorität.')
+
+    # Step 4 Manifest
     mcmd = [
         sys.executable, 'ml/generate_manifest.py',
         '--models-dir', str(quant_dir),
         '--out', args.manifest_out,
         '--classes', args.classes,
-        '--input-size', str(args.image_size)
+        '--input-size', str(args.image_size),
+        '--max-drop', str(args.max_drop)
     ]
+    if pareto_path.exists():
+        mcmd.extend(['--pareto', str(pareto_path)])
     rc = run(mcmd, 'Generate Manifest')
     if rc != 0:
         print('[FAIL] Manifest Generierung fehlgeschlagen.')
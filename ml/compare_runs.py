@@ -14,13 +14,16 @@ Usage:
 
 Columns included:
   run, epochs, macro_f1, val_loss, test_macro_f1, test_loss, pr_auc, roc_auc,
-  stopped_early, median_early_stop, lr_initial, lr_optimal_guess
+  stopped_early, median_early_stop, asha_pruned_at, train_samples_per_s, lr_initial, lr_optimal_guess
+
+sweep.py reuses ``extract_row`` / ``write_comparison`` (plus one column per swept parameter).
 """
 from __future__ import annotations
 import argparse, json, glob, statistics, csv
 from pathlib import Path
 
 KEY_METRICS_DEFAULT = ["macro_f1", "test_macro_f1", "pr_auc", "roc_auc"]
+HEADERS = ['run','epochs','macro_f1','val_loss','test_macro_f1','test_loss','pr_auc','roc_auc','stopped_early','median_early_stop','asha_pruned_at','train_samples_per_s','lr_initial','lr_optimal_guess']
 
 
 def safe_load(path: Path):
@@ -31,6 +34,20 @@ def safe_load(path: Path):
         return None
 
 
+def curves_from_inference(run_dir: Path):
+    """Macro PR/ROC AUC from cached val logits (train.py --save-inference), if present."""
+    inf_dir = run_dir / 'inference'
+    if not (inf_dir / 'val_logits.npy').exists():
+        return None, None
+    try:
+        from inference_results import InferenceResults
+        from curves import macro_pr_curve, macro_roc_curve
+        res = InferenceResults.load(inf_dir, 'val')
+        return macro_pr_curve(res.probs, res.labels)['macro_pr_auc'], macro_roc_curve(res.probs, res.labels)['macro_roc_auc']
+    except Exception:
+        return None, None
+
+
 def extract_row(run_dir: Path):
     metrics = safe_load(run_dir / 'metrics_final.json') or {}
     pr = safe_load(run_dir / 'pr_curve.json') or {}
@@ -39,15 +56,22 @@ def extract_row(run_dir: Path):
 
     pr_auc = pr.get('macro_pr_auc') or pr.get('pr_auc')
     roc_auc = roc.get('macro_roc_auc') or roc.get('roc_auc')
+    if pr_auc is None or roc_auc is None:
+        # Fallback: Kurven aus gespeicherten Val-Logits berechnen (gleiche Definition wie train.py)
+        inf_pr, inf_roc = curves_from_inference(run_dir)
+        pr_auc = pr_auc if pr_auc is not None else inf_pr
+        roc_auc = roc_auc if roc_auc is not None else inf_roc
 
     early_info = metrics.get('early_stopping', {})
     median_es = early_info.get('type') == 'median'
     stopped_early = early_info.get('stopped_early', False)
 
+    asha = metrics.get('asha') or {}
+    perf = metrics.get('performance') or {}
     row = {
         'run': run_dir.name,
-        'epochs': metrics.get('epochs_completed'),
-        'macro_f1': metrics.get('val', {}).get('macro_f1') or metrics.get('macro_f1'),
+        'epochs': metrics.get('epochs_completed') or metrics.get('epochs_trained'),
+        'macro_f1': metrics.get('val', {}).get('macro_f1') or metrics.get('macro_f1') or metrics.get('best_macro_f1'),
         'val_loss': metrics.get('val', {}).get('loss') or metrics.get('val_loss'),
         'test_macro_f1': metrics.get('test', {}).get('macro_f1'),
         'test_loss': metrics.get('test', {}).get('loss'),
@@ -55,6 +79,8 @@ def extract_row(run_dir: Path):
         'roc_auc': roc_auc,
         'stopped_early': stopped_early,
         'median_early_stop': median_es,
+        'asha_pruned_at': asha.get('pruned_at'),
+        'train_samples_per_s': (perf.get('train_throughput') or {}).get('samples_per_s'),
         'lr_initial': (lr_find.get('history')[0]['lr'] if lr_find and lr_find.get('history') else None),
         'lr_optimal_guess': lr_find.get('suggested_lr') if lr_find else None,
     }
@@ -77,28 +103,9 @@ def format_markdown(rows, headers):
     return '\n'.join(lines) + '\n'
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument('--runs', nargs='*', help='Glob patterns of run directories (default ml/outputs/*)')
-    ap.add_argument('--out-dir', default='ml/outputs/summary')
-    ap.add_argument('--metric', action='append', help='Metric(s) to highlight best run')
-    args = ap.parse_args()
-
-    run_dirs = []
-    patterns = args.runs or ['ml/outputs/*']
-    for pat in patterns:
-        for p in glob.glob(pat):
-            if Path(p).is_dir():
-                run_dirs.append(Path(p))
-    run_dirs = sorted(set(run_dirs))
-    if not run_dirs:
-        raise SystemExit('Keine Runs gefunden.')
-
-    rows = [extract_row(rd) for rd in run_dirs]
-
-    headers = ['run','epochs','macro_f1','val_loss','test_macro_f1','test_loss','pr_auc','roc_auc','stopped_early','median_early_stop','lr_initial','lr_optimal_guess']
-
-    out_dir = Path(args.out_dir)
+def write_comparison(rows, headers, out_dir: Path, metrics_for_best=None):
+    """comparison.csv / comparison.md / summary.json / best_by_metric_<m>.txt"""
+    out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
     # CSV
@@ -116,8 +123,7 @@ def main():
     summary = { 'rows': rows, 'count': len(rows) }
     (out_dir / 'summary.json').write_text(json.dumps(summary, indent=2), encoding='utf-8')
 
-    metrics_for_best = args.metric or KEY_METRICS_DEFAULT
-    for metric in metrics_for_best:
+    for metric in metrics_for_best or KEY_METRICS_DEFAULT:
         valid = [r for r in rows if r.get(metric) is not None]
         if not valid:
             continue
@@ -127,6 +133,27 @@ def main():
         best = sorted(valid, key=lambda r: r.get(metric), reverse=reverse)[0]
         (out_dir / f'best_by_metric_{metric}.txt').write_text(best['run'], encoding='utf-8')
 
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--runs', nargs='*', help='Glob patterns of run directories (default ml/outputs/*)')
+    ap.add_argument('--out-dir', default='ml/outputs/summary')
+    ap.add_argument('--metric', action='append', help='Metric(s) to highlight best run')
+    args = ap.parse_args()
+
+    run_dirs = []
+    patterns = args.runs or ['ml/outputs/*']
+    for pat in patterns:
+        for p in glob.glob(pat):
+            if Path(p).is_dir():
+                run_dirs.append(Path(p))
+    run_dirs = sorted(set(run_dirs))
+    if not run_dirs:
+        raise SystemExit('Keine Runs gefunden.')
+
+    rows = [extract_row(rd) for rd in run_dirs]
+    out_dir = Path(args.out_dir)
+    write_comparison(rows, HEADERS, out_dir, args.metric or KEY_METRICS_DEFAULT)
     print(f"[OK] {len(rows)} Runs verglichen -> {out_dir}")
 
 if __name__ == '__main__':
@@ -2,11 +2,21 @@
 """Compare FP32 vs Quantized TFLite model accuracy & metrics.
 
 Features:
-- Loads one or more TFLite models (fp32, dynamic int8, full int8) if files exist in a directory.
+- Loads one or more TFLite models (fp32, dynamic int8, full int8, float16, int16x8) if files exist in a directory.
 - Reconstructs dataset from meta.csv (same format used in training) without torch dependency.
 - Applies identical preprocessing (resize -> center crop -> normalization) to match training/eval.
 - Computes: overall accuracy, macro F1, per-class precision/recall/F1, confusion matrix.
-- Produces delta metrics vs fp32 baseline (macro F1 drop %, accuracy drop %).
+- Fast evaluation: one interpreter per model with tensors allocated once, ``--threads``
+  interpreter threads, ``--batch-size`` images per invoke for dynamic-batch models.
+  Each report carries ``throughput`` (img/s incl. cache read and invoke-only).
+- ``--jobs N``: variants and contiguous shards of the sample list run in N worker processes
+  (own interpreter each); per-variant confusion matrices are summed -> same result as serial.
+- Images are decoded once into a uint8 memmap (ml/eval_cache.py, process pool ``--workers``)
+  shared by all variants; ``--eval-cache DIR`` keeps it for later runs (ci_gate / quantize_ptq).
+- Produces delta metrics vs fp32 baseline (macro F1 drop %, accuracy drop %) and a per-variant
+  ``within_max_drop`` flag (float16 / int16x8 are reported but not gated).
+- ``--reference OTHER_REPORT.json``: gain per variant vs an earlier report on the same eval set,
+  e.g. int8_full after QAT (train.py --qat-from) vs int8_full from plain PTQ -> ``reference`` block.
 - Writes JSON report to artifacts/quant_eval/<timestamp>_tflite_eval.json.
 
 Usage Example:
@@ -27,10 +37,15 @@ Assumptions:
 from __future__ import annotations
 import argparse, os, json, time
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 import csv
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from PIL import Image
+
+from eval_cache import (EvalCache, apply_lut, input_lut, load_pixels, normalize, open_or_build_eval_cache,
+                        quantize_input)
 
 # ---------- Dataset Loading (Torch-free) ----------
 
@@ -62,24 +77,12 @@ def load_samples(data_root: Path, meta_csv: Path, class_names: List[str]) -> Lis
 # ---------- Preprocessing (match eval) ----------
 
 def preprocess_image(path: Path, image_size: int) -> np.ndarray:
-    # Resize 1.15x then center crop like eval transforms
-    img = Image.open(path).convert('RGB')
-    target = int(image_size * 1.15)
-    img = img.resize((target, target))
-    # Center crop
-    left = (target - image_size)//2
-    top = (target - image_size)//2
-    img = img.crop((left, top, left+image_size, top+image_size))
-    arr = np.array(img).astype(np.float32) / 255.0
-    mean = np.array([0.485,0.456,0.406], dtype=np.float32)
-    std = np.array([0.229,0.224,0.225], dtype=np.float32)
-    arr = (arr - mean) / std
+    # Resize 1.15x then center crop like eval transforms (ml/eval_cache.py), ImageNet normalization
     # Model originally trained in NCHW; exported ONNX -> TF -> TFLite is NHWC
-    arr = np.expand_dims(arr, 0)  # (1,H,W,C)
-    return arr.astype(np.float32)
+    return np.expand_dims(normalize(load_pixels(path, image_size)), 0)  # (1,H,W,C)
 
-# For full-int8 model expecting uint8, we will quantize after normalization mapping to expected scale if metadata exists.
-# Simpler approach: let TFLite runtime handle dequant since converter set inference_input_type.
+# Full-int8 models (converter inference_input_type uint8) expect quantized inputs: TFLiteRunner maps cached
+# uint8 pixels through a per-channel LUT built from the input scale / zero point (eval_cache.input_lut).
 
 # ---------- Metrics ----------
 
@@ -90,6 +93,13 @@ def update_confusion(cm: np.ndarray, y_true: int, y_pred: int):
     if 0 <= y_true < cm.shape[0] and 0 <= y_pred < cm.shape[0]:
         cm[y_true, y_pred] += 1
 
+def confusion_counts(y_true: np.ndarray, y_pred: np.ndarray, n: int) -> np.ndarray:
+    """Vectorized update_confusion over whole arrays (out-of-range pairs dropped the same way)."""
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    ok = (y_true >= 0) & (y_true < n) & (y_pred >= 0) & (y_pred < n)
+    return np.bincount(y_true[ok] * n + y_pred[ok], minlength=n * n).reshape(n, n)
+
 def compute_metrics(cm: np.ndarray) -> Dict:
     tp = np.diag(cm).astype(float)
     fp = cm.sum(axis=0) - tp
@@ -116,49 +126,165 @@ def compute_metrics(cm: np.ndarray) -> Dict:
 
 # ---------- TFLite Inference ----------
 
-def load_tflite_interpreter(model_path: Path):
+def load_tflite_interpreter(model_path: Path, num_threads: Optional[int] = None):
     import tensorflow as tf
-    return tf.lite.Interpreter(model_path=str(model_path))
-
-def run_inference(interpreter, input_data: np.ndarray) -> int:
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
-    # Assume single input/output
-    inp = input_details[0]
-    tensor = input_data
-    # For int8 full-quant model expecting uint8 input
-    if inp['dtype'] == np.uint8:
-        # De-normalize then scale to [0,255]
-        # Reverse normalization: x_norm = (x - mean)/std => x = x_norm*std + mean
-        mean = np.array([0.485,0.456,0.406], dtype=np.float32)
-        std = np.array([0.229,0.224,0.225], dtype=np.float32)
-        x = input_data.copy()
-        x = x * std + mean
-        x = np.clip(x, 0, 1) * 255.0
-        tensor = x.astype(np.uint8)
-    interpreter.resize_tensor_input(inp['index'], tensor.shape)
-    interpreter.allocate_tensors()
-    interpreter.set_tensor(inp['index'], tensor)
-    interpreter.invoke()
-    out = interpreter.get_tensor(output_details[0]['index'])
-    # If quantized output, need dequantization parameters
-    if output_details[0]['dtype'] != np.float32:
-        scale, zero = output_details[0]['quantization']
-        out = (out.astype(np.float32) - zero) * scale
-    # Assume logits; take argmax
-    pred = int(np.argmax(out, axis=1)[0])
-    return pred
+    return tf.lite.Interpreter(model_path=str(model_path), num_threads=num_threads)
+
+def supports_dynamic_batch(input_detail: Dict) -> bool:
+    sig = input_detail.get('shape_signature')
+    return sig is not None and len(sig) > 0 and int(sig[0]) == -1
+
+class TFLiteRunner:
+    """One interpreter, tensors allocated once for a fixed batch size.
+
+    - Input/output details are read once.
+    - Models with dynamic batch (shape_signature[0] == -1) run ``batch_size`` images per
+      invoke; the last partial batch is zero-padded instead of re-allocating.
+    - Fixed-shape models (batch 1) run image by image on the same allocation.
+    """
+
+    def __init__(self, model_path: Path, num_threads: Optional[int] = None, batch_size: int = 1):
+        self.interpreter = load_tflite_interpreter(model_path, num_threads)
+        self.inp = self.interpreter.get_input_details()[0]
+        self.out = self.interpreter.get_output_details()[0]
+        self.batch_size = max(1, batch_size) if supports_dynamic_batch(self.inp) else int(self.inp['shape'][0])
+        if int(self.inp['shape'][0]) != self.batch_size:
+            shape = [self.batch_size] + [int(d) for d in self.inp['shape'][1:]]
+            self.interpreter.resize_tensor_input(self.inp['index'], shape)
+        self.interpreter.allocate_tensors()
+        # Details nach allocate neu lesen (Quantisierungsparameter / Shapes stabil)
+        self.inp = self.interpreter.get_input_details()[0]
+        self.out = self.interpreter.get_output_details()[0]
+        self._lut = None
+
+    @property
+    def quantized_input(self) -> bool:
+        return self.inp['dtype'] in (np.uint8, np.int8)
+
+    def _to_input(self, x: np.ndarray) -> np.ndarray:
+        # For int8 full-quant model expecting uint8 / int8 input: quantize with the input's scale / zero point
+        if self.quantized_input:
+            return quantize_input(x, self.inp['quantization'], self.inp['dtype'])
+        return x.astype(self.inp['dtype'], copy=False)
+
+    def _invoke(self, x: np.ndarray) -> np.ndarray:
+        self.interpreter.set_tensor(self.inp['index'], x)
+        self.interpreter.invoke()
+        out = self.interpreter.get_tensor(self.out['index'])
+        # If quantized output, need dequantization parameters
+        if self.out['dtype'] != np.float32:
+            scale, zero = self.out['quantization']
+            out = (out.astype(np.float32) - zero) * scale
+        return out
+
+    def pixels_to_input(self, pixels: np.ndarray) -> np.ndarray:
+        """uint8 NHWC pixels -> model input; quantized inputs via LUT (no float round trip)."""
+        if self.quantized_input:
+            if self._lut is None:
+                self._lut = input_lut(self.inp['quantization'], self.inp['dtype'])
+            return apply_lut(pixels, self._lut)
+        return normalize(pixels).astype(self.inp['dtype'], copy=False)
+
+    def predict_pixels(self, pixels: np.ndarray) -> np.ndarray:
+        """Argmax class indices for a uint8 NHWC pixel batch (eval cache layout)."""
+        return self._predict_input(self.pixels_to_input(pixels))
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Argmax class indices for a NHWC float32 (normalized) batch of any length."""
+        return self._predict_input(self._to_input(x))
+
+    def _predict_input(self, x: np.ndarray) -> np.ndarray:
+        preds = []
+        b = self.batch_size
+        for s in range(0, len(x), b):
+            chunk = x[s:s+b]
+            n = len(chunk)
+            if n < b:
+                chunk = np.concatenate([chunk, np.zeros((b - n,) + chunk.shape[1:], dtype=chunk.dtype)], axis=0)
+            preds.append(np.argmax(self._invoke(chunk), axis=1)[:n])
+        return np.concatenate(preds) if preds else np.zeros((0,), dtype=np.int64)
 
 # ---------- Main ----------
 
-def evaluate_model(model_path: Path, samples: List[Tuple[Path,int]], image_size: int) -> Dict:
-    interpreter = load_tflite_interpreter(model_path)
-    cm = init_confusion(len(set([s[1] for s in samples])))
-    for p,label in samples:
-        arr = preprocess_image(p, image_size)
-        pred = run_inference(interpreter, arr)
-        update_confusion(cm, label, pred)
-    return compute_metrics(cm)
+GATED_VARIANTS = ('int8_dynamic', 'int8_full')
+
+def evaluate_shard(model_path: Path, cache: EvalCache, num_classes: int, start: int = 0, stop: Optional[int] = None,
+                   num_threads: Optional[int] = None, batch_size: int = 32) -> Dict:
+    """Confusion counts + timings for samples [start, stop) of the cache (own interpreter)."""
+    t_start = time.perf_counter()
+    runner = TFLiteRunner(model_path, num_threads=num_threads, batch_size=batch_size)
+    y_true, y_pred = [], []
+    t_infer = 0.0
+    for pixels, labels in cache.iter_batches(max(runner.batch_size, batch_size), start, stop, normalized=False):
+        t0 = time.perf_counter()
+        preds = runner.predict_pixels(pixels)
+        t_infer += time.perf_counter() - t0
+        y_true.append(labels)
+        y_pred.append(preds)
+    cm = (confusion_counts(np.concatenate(y_true), np.concatenate(y_pred), num_classes) if y_true
+          else init_confusion(num_classes))
+    return {'cm': cm, 'seconds': time.perf_counter() - t_start, 'infer_seconds': t_infer,
+            'batch_size': runner.batch_size}
+
+def _shard_worker(args) -> Tuple[str, Dict]:
+    name, model_path, cache_dir, num_classes, start, stop, num_threads, batch_size = args
+    return name, evaluate_shard(Path(model_path), EvalCache(cache_dir), num_classes, start, stop, num_threads, batch_size)
+
+def shard_ranges(n: int, shards: int) -> List[Tuple[int, int]]:
+    """Split [0, n) into ``shards`` contiguous, nearly equal ranges (no empty ones)."""
+    shards = max(1, min(shards, n))
+    bounds = np.linspace(0, n, shards + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def merge_shards(parts: List[Dict], num_threads: Optional[int]) -> Dict:
+    """Summed confusion -> identical metrics to a serial run; throughput from summed shard times."""
+    cm = sum(p['cm'] for p in parts)
+    metrics = compute_metrics(cm)
+    n = int(cm.sum())
+    total = sum(p['seconds'] for p in parts)
+    t_infer = sum(p['infer_seconds'] for p in parts)
+    metrics['throughput'] = {
+        'images': n,
+        'images_per_s': round(n / total, 2) if total > 0 else None,            # je Prozess, inkl. Cache-Read + Normalisierung
+        'infer_images_per_s': round(n / t_infer, 2) if t_infer > 0 else None,  # je Prozess, nur invoke()
+        'batch_size': parts[0]['batch_size'],
+        'num_threads': num_threads,
+        'shards': len(parts),
+    }
+    return metrics
+
+def evaluate_model(model_path: Path, cache: EvalCache, num_classes: int,
+                   num_threads: Optional[int] = None, batch_size: int = 32) -> Dict:
+    return merge_shards([evaluate_shard(model_path, cache, num_classes, num_threads=num_threads,
+                                        batch_size=batch_size)], num_threads)
+
+def evaluate_parallel(models: Dict[str, Path], cache: EvalCache, num_classes: int, jobs: int,
+                      num_threads: int, batch_size: int) -> Dict[str, Dict]:
+    """Variants x shards in ``jobs`` processes (spawn, one interpreter each); confusion merged per variant."""
+    shards_per_model = max(1, jobs // max(1, len(models)))
+    tasks = [(name, path.as_posix(), cache.cache_dir.as_posix(), num_classes, a, b, num_threads, batch_size)
+             for name, path in models.items() for a, b in shard_ranges(len(cache), shards_per_model)]
+    parts: Dict[str, List[Dict]] = {name: [] for name in models}
+    # spawn: TF Runtime ist nach Import im Elternprozess nicht fork-sicher
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as ex:
+        for name, part in ex.map(_shard_worker, tasks):
+            parts[name].append(part)
+    return {name: merge_shards(parts[name], num_threads) for name in models}
+
+def reference_gain(reports: Dict[str, Dict], reference: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Per variant: metric gain (percentage points) vs the same variant of a reference report and
+    the drop vs the reference fp32 (e.g. QAT int8_full vs the original float model)."""
+    ref_fp32 = reference.get('fp32')
+    gains = {}
+    for name, m in reports.items():
+        ref = reference.get(name)
+        gains[name] = {
+            'macro_f1_gain_pct': round((m['macro_f1'] - ref['macro_f1']) * 100.0, 2) if ref else None,
+            'accuracy_gain_pct': round((m['accuracy'] - ref['accuracy']) * 100.0, 2) if ref else None,
+            'delta_macro_f1_vs_reference_fp32_pct': round((m['macro_f1'] - ref_fp32['macro_f1']) * 100.0, 2) if ref_fp32 else None,
+        }
+    return gains
+
 
 def main():
     ap = argparse.ArgumentParser()
@@ -172,6 +298,12 @@ def main():
     ap.add_argument('--max-accuracy-drop', type=float, default=3.0, help='Maximal erlaubter Accuracy Drop in Prozent (negativer Wert)')
     ap.add_argument('--min-macro-f1', type=float, default=None, help='Absolute Mindest-Macro-F1 (Baseline muss >= Wert, sonst Fail)')
     ap.add_argument('--strict', action='store_true', help='Falls gesetzt: Bei Verstoß sofort Exit Code 2 (sonst nur Warnung)')
+    ap.add_argument('--threads', type=int, default=0, help='TFLite Interpreter Threads je Prozess (0 = alle Kerne bzw. Kerne/--jobs)')
+    ap.add_argument('--jobs', type=int, default=1, help='Prozesse: Varianten und Shards der Samples parallel (eigener Interpreter je Prozess, Confusion wird zusammengeführt)')
+    ap.add_argument('--batch-size', type=int, default=32, help='Bilder pro invoke() bei Modellen mit dynamischer Batch-Dimension (sonst 1)')
+    ap.add_argument('--workers', type=int, default=0, help='Prozesse für den Eval-Cache Aufbau (0 = auto, 1 = im Hauptprozess)')
+    ap.add_argument('--eval-cache', default=None, help='Wurzel für den dekodierten Eval Cache (ml/eval_cache.py); ohne Angabe nur für diesen Lauf (temp)')
+    ap.add_argument('--reference', default=None, help='Früherer *_tflite_eval.json (gleiches Eval-Set), z.B. PTQ ohne QAT -> Gewinn je Variante')
     args = ap.parse_args()
 
     models_dir = Path(args.models_dir)
@@ -184,23 +316,50 @@ def main():
     candidates = {
         'fp32': models_dir / 'model_fp32.tflite',
         'int8_dynamic': models_dir / 'model_int8_dynamic.tflite',
-        'int8_full': models_dir / 'model_int8_full.tflite'
+        'int8_full': models_dir / 'model_int8_full.tflite',
+        'float16': models_dir / 'model_float16.tflite',
+        'int16x8': models_dir / 'model_int16x8.tflite',
     }
     existing = {k: v for k,v in candidates.items() if v.exists()}
     if 'fp32' not in existing:
         raise SystemExit('Baseline model_fp32.tflite fehlt – zuerst quantize_ptq.py ausführen.')
 
+    jobs = max(1, args.jobs)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // jobs)
+    # Einmal dekodieren, alle Varianten (und mit --eval-cache auch Folge-Läufe) lesen denselben Memmap
+    tmp_cache = None
+    cache_root = args.eval_cache
+    if not cache_root:
+        tmp_cache = tempfile.TemporaryDirectory(prefix='tflite_eval_cache_')
+        cache_root = tmp_cache.name
+    t_cache = time.time()
+    cache = open_or_build_eval_cache(cache_root, samples, args.meta, args.data_root, class_names,
+                                     args.image_size, workers=args.workers)
+    cache_seconds = round(time.time() - t_cache, 2)
+    num_classes = len(class_names)  # nicht aus den Labels: fehlende Klasse im Split würde Indizes verschieben
     reports: Dict[str, Dict] = {}
     baseline_metrics = None
+    t_eval = time.time()
+    if jobs > 1:
+        print(f'[INFO] Evaluiere {", ".join(existing)} parallel: {jobs} Prozesse x {threads} Threads')
+        parallel = evaluate_parallel(existing, cache, num_classes, jobs, threads, args.batch_size)
     for name, path in existing.items():
-        print(f'[INFO] Evaluiere {name}: {path.name}')
-        start = time.time()
-        metrics = evaluate_model(path, samples, args.image_size)
-        metrics['eval_seconds'] = round(time.time()-start,2)
+        if jobs > 1:
+            metrics = parallel[name]
+        else:
+            print(f'[INFO] Evaluiere {name}: {path.name}')
+            start = time.time()
+            metrics = evaluate_model(path, cache, num_classes, num_threads=threads, batch_size=args.batch_size)
+            metrics['eval_seconds'] = round(time.time()-start,2)
+        tp = metrics['throughput']
+        print(f"[INFO] {name}: acc={metrics['accuracy']:.4f} macro_f1={metrics['macro_f1']:.4f} "
+              f"{tp['images_per_s']} img/s (invoke {tp['infer_images_per_s']} img/s, batch={tp['batch_size']})")
         reports[name] = metrics
         if name == 'fp32':
             baseline_metrics = metrics
 
+    eval_wall = round(time.time() - t_eval, 2)
+
     # Compute deltas vs baseline
     if baseline_metrics:
         for name, m in reports.items():
@@ -209,6 +368,16 @@ def main():
             m['delta_macro_f1_pct'] = round((m['macro_f1'] - baseline_metrics['macro_f1']) * 100.0, 2)
             m['delta_accuracy_pct'] = round((m['accuracy'] - baseline_metrics['accuracy']) * 100.0, 2)
 
+    reference = None
+    if args.reference:
+        ref_report = json.loads(Path(args.reference).read_text(encoding='utf-8'))
+        reference = {'report': Path(args.reference).as_posix(),
+                     'gain': reference_gain(reports, ref_report.get('reports', {}))}
+        for name, g in reference['gain'].items():
+            if g['macro_f1_gain_pct'] is not None:
+                print(f"[REF] {name}: macro_f1 {g['macro_f1_gain_pct']:+.2f} pp, acc {g['accuracy_gain_pct']:+.2f} pp "
+                      f"(vs Referenz-fp32 {g['delta_macro_f1_vs_reference_fp32_pct']:+.2f} pp)")
+
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
     ts = time.strftime('%Y%m%d_%H%M%S')
@@ -225,7 +394,12 @@ def main():
         if args.min_macro_f1 is not None and base_f1 < args.min_macro_f1:
             status['min_macro_f1_ok'] = False
             status['violations'].append(f'baseline: macro_f1 {base_f1:.4f} < min_macro_f1 {args.min_macro_f1}')
-        for variant in ('int8_dynamic','int8_full'):
+        for name, m in reports.items():
+            # je Variante: innerhalb der Drop-Schwellen? (generate_manifest / pareto_report wählen nur solche)
+            m['within_max_drop'] = name == 'fp32' or (
+                m['delta_macro_f1_pct'] >= -abs(args.max_macro_f1_drop) and m['delta_accuracy_pct'] >= -abs(args.max_accuracy_drop))
+        # Gate (Exit Code) wie bisher nur für die Int8 Varianten; float16 / int16x8 sind optional
+        for variant in GATED_VARIANTS:
             if variant in reports and 'delta_macro_f1_pct' in reports[variant]:
                 d_f1 = reports[variant]['delta_macro_f1_pct']  # negative if drop
                 if d_f1 < -abs(args.max_macro_f1_drop):
@@ -240,11 +414,17 @@ def main():
     status['overall_ok'] = overall_ok
 
     with out_file.open('w', encoding='utf-8') as f:
-        json.dump({'classes': class_names, 'reports': reports, 'thresholds': {
+        json.dump({'classes': class_names, 'reports': reports,
+                   'eval_wall_seconds': eval_wall, 'jobs': jobs, 'reference': reference,
+                   'eval_cache': {'dir': cache.cache_dir.as_posix() if args.eval_cache else None,
+                                  'images': len(cache), 'prepare_seconds': cache_seconds},
+                   'thresholds': {
             'max_macro_f1_drop_pct': args.max_macro_f1_drop,
             'max_accuracy_drop_pct': args.max_accuracy_drop
         }, 'status': status}, f, indent=2)
     print(f'[DONE] Bericht gespeichert: {out_file}')
+    if tmp_cache is not None:
+        tmp_cache.cleanup()
     if not overall_ok:
         msg = ' | '.join(status['violations']) if status['violations'] else 'Unbekannter Schwellwert-Verstoß'
         if args.strict:
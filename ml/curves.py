@@ -0,0 +1,174 @@
+"""Vectorized macro PR / ROC curves (one-vs-rest) from class scores.
+
+Used by train.py (--pr-curve / --roc-curve), eval.py (--curves) and compare_runs.py.
+
+Each class column is sorted once; operating points for a whole threshold grid are
+then looked up with ``np.searchsorted`` -> O(C * N log N + C * G log N) instead of
+a Python scan over all thresholds per grid point.
+
+Conventions (match sklearn.metrics):
+- A sample is predicted positive for class c at threshold t if score >= t.
+- precision at a threshold without any positive prediction is 1.0 (recall 0.0),
+  like the last point of ``precision_recall_curve``.
+- ROC points equal ``roc_curve(..., drop_intermediate=True)``.
+- Classes without positives (PR) or without positives/negatives (ROC) are left
+  out of the macro mean instead of turning it into NaN.
+
+Usage:
+probs = softmax(logits)            # (N, C)
+pr = macro_pr_curve(probs, labels) # {'thresholds', 'macro_precision', 'macro_recall', 'macro_pr_auc'}
+roc = macro_roc_curve(probs, labels)
+
+Streaming variant (MetricsTracker(score_bins=B)): per-class score histograms with
+bin k = floor(score * B) give TP/FP counts at the thresholds k/B directly, so
+``macro_pr_from_histograms`` equals ``macro_pr_curve`` with grid linspace(0, 1, B+1);
+``macro_roc_from_histograms`` has one ROC point per bin (AUC exact for scores
+quantized to the bins, otherwise a close approximation).
+"""
+from __future__ import annotations
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+def default_grid(points: int = 101) -> np.ndarray:
+    return np.linspace(0, 1, points)
+
+
+def trapezoid_auc(x: np.ndarray, y: np.ndarray) -> float:
+    """Area under a curve with monotonic x (either direction), like sklearn.metrics.auc."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.size < 2:
+        return 0.0
+    return float(abs(np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2.0)))
+
+
+def pr_at_thresholds(y_true: np.ndarray, scores: np.ndarray, thresholds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Precision & recall of one binary problem at every threshold in ``thresholds``."""
+    y_true = np.asarray(y_true).astype(bool)
+    scores = np.asarray(scores, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    order = np.argsort(scores, kind='mergesort')
+    s = scores[order]
+    pos = y_true[order].astype(np.int64)
+    # tp_ge[j] = Anzahl Positiver mit Index >= j (absteigend kumuliert), tp_ge[n] = 0
+    tp_ge = np.concatenate([np.cumsum(pos[::-1])[::-1], [0]])
+    j = np.searchsorted(s, thresholds, side='left')  # erster Index mit score >= t
+    predicted = s.size - j
+    tp = tp_ge[j]
+    n_pos = tp_ge[0]
+    precision = np.where(predicted > 0, tp / np.maximum(predicted, 1), 1.0)
+    recall = tp / n_pos if n_pos > 0 else np.zeros_like(precision)
+    return precision, recall
+
+
+def roc_points(y_true: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(fpr, tpr) of one binary problem, identical to sklearn roc_curve(drop_intermediate=True)."""
+    y_true = np.asarray(y_true).astype(np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.argsort(scores, kind='mergesort')[::-1]
+    s = scores[order]
+    y = y_true[order]
+    distinct = np.where(np.diff(s))[0]
+    thr_idx = np.r_[distinct, y.size - 1]
+    tps = np.cumsum(y)[thr_idx]
+    fps = 1 + thr_idx - tps
+    if fps.size > 2:
+        keep = np.where(np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True])[0]
+        fps, tps = fps[keep], tps[keep]
+    fps = np.r_[0, fps]
+    tps = np.r_[0, tps]
+    fpr = fps / fps[-1] if fps[-1] > 0 else np.full(fps.shape, np.nan)
+    tpr = tps / tps[-1] if tps[-1] > 0 else np.full(tps.shape, np.nan)
+    return fpr, tpr
+
+
+def macro_pr_curve(probs: np.ndarray, labels: np.ndarray, grid: Optional[np.ndarray] = None) -> Dict:
+    probs = np.asarray(probs)
+    labels = np.asarray(labels)
+    grid = default_grid() if grid is None else np.asarray(grid, dtype=np.float64)
+    precs, recs = [], []
+    for c in range(probs.shape[1]):
+        y_true = labels == c
+        if not y_true.any():
+            continue
+        p, r = pr_at_thresholds(y_true, probs[:, c], grid)
+        precs.append(p)
+        recs.append(r)
+    if precs:
+        macro_prec = np.mean(precs, axis=0)
+        macro_rec = np.mean(recs, axis=0)
+    else:
+        macro_prec = np.zeros_like(grid)
+        macro_rec = np.zeros_like(grid)
+    return {
+        'thresholds': grid.tolist(),
+        'macro_precision': macro_prec.tolist(),
+        'macro_recall': macro_rec.tolist(),
+        'macro_pr_auc': trapezoid_auc(macro_rec, macro_prec),
+    }
+
+
+def macro_roc_curve(probs: np.ndarray, labels: np.ndarray, grid: Optional[np.ndarray] = None) -> Dict:
+    probs = np.asarray(probs)
+    labels = np.asarray(labels)
+    grid = default_grid() if grid is None else np.asarray(grid, dtype=np.float64)
+    tprs = []
+    for c in range(probs.shape[1]):
+        y_true = labels == c
+        if not y_true.any() or y_true.all():
+            continue
+        fpr, tpr = roc_points(y_true, probs[:, c])
+        tprs.append(np.interp(grid, fpr, tpr))
+    macro_tpr = np.mean(tprs, axis=0) if tprs else np.zeros_like(grid)
+    return {
+        'fpr': grid.tolist(),
+        'tpr': macro_tpr.tolist(),
+        'macro_roc_auc': trapezoid_auc(grid, macro_tpr),
+    }
+
+
+def _counts_at_bins(hist: np.ndarray) -> np.ndarray:
+    """(C, B+1) histogram -> (C, B+1) counts with score >= k/B (reverse cumulative)."""
+    return np.cumsum(np.asarray(hist, dtype=np.int64)[:, ::-1], axis=1)[:, ::-1]
+
+
+def macro_pr_from_histograms(pos_hist: np.ndarray, neg_hist: np.ndarray) -> Dict:
+    """Macro PR curve from per-class score histograms of positives / negatives, shape (C, B+1)."""
+    tp = _counts_at_bins(pos_hist)
+    fp = _counts_at_bins(neg_hist)
+    n_pos = tp[:, 0]
+    grid = np.linspace(0, 1, tp.shape[1])
+    keep = n_pos > 0
+    predicted = tp + fp
+    precision = np.where(predicted > 0, tp / np.maximum(predicted, 1), 1.0)[keep]
+    recall = (tp[keep] / n_pos[keep, None])
+    macro_prec = precision.mean(axis=0) if keep.any() else np.zeros_like(grid)
+    macro_rec = recall.mean(axis=0) if keep.any() else np.zeros_like(grid)
+    return {
+        'thresholds': grid.tolist(),
+        'macro_precision': macro_prec.tolist(),
+        'macro_recall': macro_rec.tolist(),
+        'macro_pr_auc': trapezoid_auc(macro_rec, macro_prec),
+    }
+
+
+def macro_roc_from_histograms(pos_hist: np.ndarray, neg_hist: np.ndarray, grid: Optional[np.ndarray] = None) -> Dict:
+    grid = default_grid() if grid is None else np.asarray(grid, dtype=np.float64)
+    tp = _counts_at_bins(pos_hist)
+    fp = _counts_at_bins(neg_hist)
+    tprs = []
+    for c in range(tp.shape[0]):
+        if tp[c, 0] == 0 or fp[c, 0] == 0:
+            continue
+        # Schwellen absteigend: keine Vorhersage (0,0) ... alle positiv (1,1)
+        fpr = np.r_[0.0, fp[c, ::-1] / fp[c, 0]]
+        tpr = np.r_[0.0, tp[c, ::-1] / tp[c, 0]]
+        tprs.append(np.interp(grid, fpr, tpr))
+    macro_tpr = np.mean(tprs, axis=0) if tprs else np.zeros_like(grid)
+    return {
+        'fpr': grid.tolist(),
+        'tpr': macro_tpr.tolist(),
+        'macro_roc_auc': trapezoid_auc(grid, macro_tpr),
+    }
@@ -8,27 +8,37 @@ Assumptions:
 Future extensions:
 - multi-label (labels column with semicolon)
 - quality flags filtering
-- plant_id grouping for stratified split
+
+Splits: ``ids`` (uint64 sample ids from splits.py) restricts the dataset to one
+split while streaming meta.csv – rows of other splits are never materialized
+(no path checks / Sample objects). Each split gets its own instance + transform.
 """
 from __future__ import annotations
 import csv
+import os
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 from typing import List, Tuple, Dict, Callable, Optional
 
 try:
     import torch
-    from torch.utils.data import Dataset
+    from torch.utils.data import Dataset, DataLoader
     from PIL import Image
 except ImportError:  # pragma: no cover - training env required
     Dataset = object  # type: ignore
+    DataLoader = None  # type: ignore
     Image = None      # type: ignore
 
+from image_io import open_rgb
+from splits import sample_id, row_key, DEFAULT_KEY_COL
+
 @dataclass
 class Sample:
     path: Path
     label_index: int
     label_name: str
+    sample_id: int = 0
 
 class PlantDataset(Dataset):  # type: ignore
     def __init__(self,
@@ -36,15 +46,31 @@ class PlantDataset(Dataset):  # type: ignore
                  meta_csv: str,
                  class_names: List[str],
                  transform: Optional[Callable] = None,
-                 flat_structure: bool = False):
+                 flat_structure: bool = False,
+                 decode_size: Optional[int] = None,
+                 ids=None,
+                 key_col: str = DEFAULT_KEY_COL,
+                 image_cache=None):
         self.root = Path(data_root)
         self.meta_csv = Path(meta_csv)
         self.class_names = class_names
         self.class_to_idx = {c: i for i, c in enumerate(class_names)}
         self.transform = transform
+        # JPEG draft decode: decode at >= decode_size instead of full resolution (see image_io.py)
+        self.decode_size = decode_size
+        self.key_col = key_col
+        # Vorverarbeiteter uint8 Cache (image_cache.py, data.cache); fehlende Samples -> Decode von Disk
+        self.image_cache = image_cache
+        # Split-Filter: Menge der erlaubten Sample-IDs (None = alle Zeilen)
+        self._id_filter = None if ids is None else set(int(i) for i in ids)
         self.samples: List[Sample] = []
         self._load(flat_structure=flat_structure)
 
+    @property
+    def sample_ids(self):
+        import numpy as np
+        return np.asarray([s.sample_id for s in self.samples], dtype=np.uint64)
+
     def _load(self, flat_structure: bool):
         if not self.meta_csv.exists():
             raise FileNotFoundError(f"meta.csv nicht gefunden: {self.meta_csv}")
@@ -57,6 +83,9 @@ class PlantDataset(Dataset):  # type: ignore
                 fname = row['filename'].strip()
                 if label not in self.class_to_idx:
                     continue  # unbekannte Labels überspringen
+                sid = sample_id(row_key(row, self.key_col))
+                if self._id_filter is not None and sid not in self._id_filter:
+                    continue  # anderer Split
                 # Primär: label-Unterordner
                 p = self.root / label / fname
                 if flat_structure or not p.exists():
@@ -66,21 +95,60 @@ class PlantDataset(Dataset):  # type: ignore
                         p = flat
                 if not p.exists():
                     continue
-                self.samples.append(Sample(p, self.class_to_idx[label], label))
+                self.samples.append(Sample(p, self.class_to_idx[label], label, sid))
         if not self.samples:
-            raise RuntimeError("Keine gültigen Samples geladen (prüfe Pfade & meta.csv)")
+            raise RuntimeError("Keine gültigen Samples geladen (prüfe Pfade, meta.csv & Split)")
 
     def __len__(self) -> int:
         return len(self.samples)
 
     def __getitem__(self, idx: int):
         s = self.samples[idx]
-        img = Image.open(s.path).convert('RGB')  # type: ignore
+        img = self.image_cache.get(s.sample_id) if self.image_cache is not None else None
+        if img is None:
+            img = open_rgb(s.path, self.decode_size)
         if self.transform:
             img = self.transform(img)
         return img, s.label_index
 
 
+def build_split_datasets(data_root: str, meta_csv: str, class_names: List[str], data_cfg: Dict | None,
+                         transforms: Dict[str, Optional[Callable]], decode_size: Optional[int] = None,
+                         splits=('train', 'val', 'test'), image_cache=None):
+    """One PlantDataset per split (own transform each) + split meta.
+
+    data_cfg keys: split_index (npz / snapshot splits dir), split (salt), val_ratio, test_ratio,
+    group_col, key_col, split_strategy (hash | random_legacy).
+    """
+    from splits import resolve_split_ids
+    data_cfg = data_cfg or {}
+    key_col = data_cfg.get('key_col', DEFAULT_KEY_COL)
+    if data_cfg.get('split_strategy', 'hash') == 'random_legacy':
+        ids, meta = _legacy_random_split_ids(data_root, meta_csv, class_names, data_cfg, key_col)
+    else:
+        ids, meta = resolve_split_ids(data_cfg, meta_csv)
+        key_col = meta.get('key_col', key_col)  # Index bestimmt, welche Spalte gehasht wurde
+    out = {}
+    for name in splits:
+        out[name] = PlantDataset(data_root, meta_csv, class_names, transform=transforms.get(name),
+                                 decode_size=decode_size, ids=ids[name], key_col=key_col, image_cache=image_cache)
+    return out, meta
+
+
+def _legacy_random_split_ids(data_root, meta_csv, class_names, data_cfg, key_col):
+    """Alte random_split(seed 42) Zuordnung – nur um Splits älterer Runs zu reproduzieren."""
+    import numpy as np
+    full = PlantDataset(data_root, meta_csv, class_names, key_col=key_col)
+    n = len(full)
+    n_val = int(n * float(data_cfg.get('val_ratio', 0.15)))
+    n_test = int(n * float(data_cfg.get('test_ratio', 0.15)))
+    n_train = n - n_val - n_test
+    perm = torch.randperm(n, generator=torch.Generator().manual_seed(42)).tolist()
+    all_ids = full.sample_ids
+    parts = {'train': perm[:n_train], 'val': perm[n_train:n_train + n_val], 'test': perm[n_train + n_val:]}
+    return {k: np.asarray(all_ids[v], dtype=np.uint64) for k, v in parts.items()}, {'strategy': 'random_legacy'}
+
+
 def build_transforms(image_size: int = 224, augment_cfg: Dict | None = None):
     """Return training & validation transform pipelines.
     augment_cfg keys (subset): horizontal_flip_prob, color_jitter, gaussian_blur_prob.
@@ -115,3 +183,54 @@ def build_transforms(image_size: int = 224, augment_cfg: Dict | None = None):
         T.Normalize(mean=[0.485,0.456,0.406], std=[0.229,0.224,0.225])
     ])
     return train_tf, val_tf
+
+
+def worker_init_threads(worker_id: int, threads: int = 1):
+    """DataLoader worker init: limit intra-op threads per worker.
+
+    Ohne Limit startet jeder Worker so viele OpenMP/MKL Threads wie Kerne vorhanden sind
+    -> N Worker x N Threads konkurrieren mit dem Trainingsprozess.
+    OMP_NUM_THREADS / MKL_NUM_THREADS zu setzen wäre hier wirkungslos (die Libraries sind im
+    Worker bereits initialisiert) – torch.set_num_threads greift dagegen zur Laufzeit.
+    """
+    try:
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+    try:
+        import cv2  # optional (albumentations o.ä.)
+        cv2.setNumThreads(threads)
+    except Exception:
+        pass
+
+
+def loader_options(train_cfg: Dict | None, device: str = 'cpu', persistent: Optional[bool] = None) -> Dict:
+    """DataLoader kwargs from the ``train`` config block.
+
+    Keys: num_workers, persistent_workers, prefetch_factor, pin_memory (true|false|auto), worker_threads.
+    persistent=False overrides the config (one-shot loaders, e.g. post-hoc test pass).
+    """
+    cfg = train_cfg or {}
+    num_workers = int(cfg.get('num_workers', 2))
+    pin = cfg.get('pin_memory', 'auto')
+    if pin == 'auto':
+        pin = str(device).startswith('cuda')
+    opts: Dict = {'num_workers': num_workers, 'pin_memory': bool(pin)}
+    if num_workers > 0:
+        # nur mit Workern gültig (DataLoader wirft sonst ValueError)
+        opts['persistent_workers'] = bool(cfg.get('persistent_workers', True)) if persistent is None else persistent
+        if cfg.get('prefetch_factor') is not None:
+            opts['prefetch_factor'] = int(cfg['prefetch_factor'])
+        threads = int(cfg.get('worker_threads', 1) or 0)
+        if threads > 0:
+            opts['worker_init_fn'] = partial(worker_init_threads, threads=threads)
+    return opts
+
+
+def build_loader(dataset, batch_size: int, train_cfg: Dict | None, device: str = 'cpu', shuffle: bool = False,
+                 sampler=None, persistent: Optional[bool] = None, **overrides):
+    """Shared DataLoader factory for train.py / eval.py / distill.py."""
+    opts = loader_options(train_cfg, device, persistent=persistent)
+    opts.update(overrides)
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle if sampler is None else False, sampler=sampler, **opts)
+
@@ -0,0 +1,175 @@
+"""torch.distributed (DDP) helpers for multi-process training on CPU nodes.
+
+Start via torchrun – train.py detects WORLD_SIZE > 1 and switches to DDP:
+
+    # 1 Host, 4 Prozesse
+    torchrun --standalone --nproc_per_node 4 ml/train.py --config ml/configs/baseline.yaml --out ml/outputs/run_ddp
+    # 2 Hosts à 4 Prozesse (auf jedem Host, node_rank 0/1)
+    torchrun --nnodes 2 --nproc_per_node 4 --node_rank 0 --rdzv_backend c10d --rdzv_endpoint host0:29500 ml/train.py ...
+
+- Backend: ``distributed.backend`` (default gloo; nccl nur mit CUDA sinnvoll).
+- Threads: torchrun setzt OMP_NUM_THREADS=1 – ohne Override würde jeder Rank nur
+  einen Kern nutzen. ``distributed.threads_per_process: 0`` -> cpu_count // local_world_size.
+- Train-Split: DistributedSampler (shuffle, set_epoch je Epoche).
+- Val-Split: ``ShardSampler`` ohne Padding (DistributedSampler würde Samples
+  duplizieren) -> nach ``all_reduce_tracker`` exakt dieselben Metriken wie 1 Prozess.
+- Checkpoints, Export, Post-hoc Auswertung & Reports nur auf Rank 0.
+"""
+from __future__ import annotations
+import builtins
+import os
+from dataclasses import dataclass
+from typing import Iterator, Optional, Sequence, Tuple
+
+
+@dataclass
+class DistContext:
+    enabled: bool = False
+    rank: int = 0
+    world_size: int = 1
+    local_rank: int = 0
+    local_world_size: int = 1
+    backend: Optional[str] = None
+    threads: Optional[int] = None
+
+    @property
+    def is_main(self) -> bool:
+        return self.rank == 0
+
+    def summary(self):
+        return {
+            'enabled': self.enabled,
+            'backend': self.backend,
+            'world_size': self.world_size,
+            'local_world_size': self.local_world_size,
+            'threads_per_process': self.threads,
+        }
+
+
+def _dist():
+    import torch.distributed as dist  # local import for optional dependency
+    return dist
+
+
+def launched_distributed() -> bool:
+    return int(os.environ.get('WORLD_SIZE', '1')) > 1
+
+
+def init_distributed(dist_cfg: Optional[dict] = None) -> DistContext:
+    """Init process group if started via torchrun (WORLD_SIZE > 1), else single-process context."""
+    if not launched_distributed():
+        return DistContext()
+    import torch
+    dist_cfg = dist_cfg or {}
+    backend = str(dist_cfg.get('backend', 'gloo'))
+    dist = _dist()
+    if not dist.is_initialized():
+        dist.init_process_group(backend=backend)
+    ctx = DistContext(
+        enabled=True,
+        rank=dist.get_rank(),
+        world_size=dist.get_world_size(),
+        local_rank=int(os.environ.get('LOCAL_RANK', '0')),
+        local_world_size=int(os.environ.get('LOCAL_WORLD_SIZE', '1')),
+        backend=backend,
+    )
+    threads = int(dist_cfg.get('threads_per_process', 0) or 0)
+    if threads <= 0:
+        threads = max(1, (os.cpu_count() or 1) // max(1, ctx.local_world_size))
+    torch.set_num_threads(threads)
+    ctx.threads = threads
+    setup_for_distributed(ctx.is_main)
+    print(f"[DDP] Rank {ctx.rank}/{ctx.world_size} backend={backend} threads={threads}", force=True)
+    return ctx
+
+
+def setup_for_distributed(is_main: bool):
+    """Suppress print() on non-main ranks (``print(..., force=True)`` still prints)."""
+    builtin_print = builtins.print
+
+    def _print(*args, **kwargs):
+        force = kwargs.pop('force', False)
+        if is_main or force:
+            builtin_print(*args, **kwargs)
+
+    builtins.print = _print
+
+
+def wrap_model(model, ctx: DistContext):
+    if not ctx.enabled:
+        return model
+    from torch.nn.parallel import DistributedDataParallel
+    if next(model.parameters()).is_cuda:
+        return DistributedDataParallel(model, device_ids=[ctx.local_rank])
+    return DistributedDataParallel(model)
+
+
+class ShardSampler:
+    """Contiguous, unpadded shard of ``range(n)`` for rank ``rank`` (deterministic order)."""
+
+    def __init__(self, n: int, rank: int, world_size: int):
+        per = n // world_size
+        extra = n % world_size
+        self.start = rank * per + min(rank, extra)
+        self.stop = self.start + per + (1 if rank < extra else 0)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.start, self.stop))
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+
+def train_sampler(dataset, ctx: DistContext, seed: int):
+    if not ctx.enabled:
+        return None
+    from torch.utils.data.distributed import DistributedSampler
+    return DistributedSampler(dataset, num_replicas=ctx.world_size, rank=ctx.rank, shuffle=True, seed=seed)
+
+
+def eval_sampler(dataset, ctx: DistContext):
+    if not ctx.enabled:
+        return None
+    return ShardSampler(len(dataset), ctx.rank, ctx.world_size)
+
+
+def all_reduce_tracker(tracker, ctx: DistContext):
+    """Sum confusion matrices (+ streaming accumulators) of all ranks into every rank's tracker."""
+    if not ctx.enabled:
+        return tracker
+    import torch
+    reduced = {}
+    for key, arr in tracker.accumulators().items():
+        t = torch.from_numpy(arr.copy())
+        _dist().all_reduce(t, op=_dist().ReduceOp.SUM)
+        reduced[key] = t.numpy()
+    tracker.set_accumulators(reduced)
+    return tracker
+
+
+def all_reduce_sum(values: Sequence[float], ctx: DistContext) -> Tuple[float, ...]:
+    if not ctx.enabled:
+        return tuple(float(v) for v in values)
+    import torch
+    t = torch.tensor([float(v) for v in values], dtype=torch.float64)
+    _dist().all_reduce(t, op=_dist().ReduceOp.SUM)
+    return tuple(t.tolist())
+
+
+def all_reduce_max(value: float, ctx: DistContext) -> float:
+    if not ctx.enabled:
+        return float(value)
+    import torch
+    t = torch.tensor([float(value)], dtype=torch.float64)
+    _dist().all_reduce(t, op=_dist().ReduceOp.MAX)
+    return float(t.item())
+
+
+def barrier(ctx: DistContext):
+    if ctx.enabled:
+        _dist().barrier()
+
+
+def cleanup(ctx: DistContext):
+    if ctx.enabled and _dist().is_initialized():
+        _dist().destroy_process_group()
@@ -2,11 +2,11 @@
 """Deploy ML + Knowledge assets into Android app assets folder.
 
 Responsibilities:
- 1. Select model (same priority as generate_manifest)
- 2. Ensure labels/classes available
- 3. Generate manifest (delegates to generate_manifest.py or inline minimal if flag set)
- 4. Copy model + labels + manifest + knowledge files into app/src/main/assets/
- 5. Validate manifest references (model_file, knowledge.merged_file) exist post-copy
+ 1. Generate manifest first (delegates to generate_manifest.py: Pareto pick from
+    <models-dir>/pareto_report.json, else priority list) – or reuse it with --no-manifest
+ 2. Copy exactly the manifest's ``model_file`` (no own selection -> manifest and copied model never diverge)
+ 3. Copy labels + knowledge files into app/src/main/assets/
+ 4. Validate manifest references (model_file, knowledge.merged_file) exist post-copy
 
 Usage example:
   python ml/deploy_ml_assets.py \
@@ -20,17 +20,6 @@ Add --no-manifest to skip regeneration if you already created it.
 from __future__ import annotations
 import argparse, shutil, subprocess, sys, json, hashlib
 from pathlib import Path
-from typing import Optional
-
-PRIORITY = ["model_int8_full.tflite","model_int8_dynamic.tflite","model_fp32.tflite","leafsense_model.tflite"]
-
-
-def find_model(models_dir: Path) -> Optional[Path]:
-    for name in PRIORITY:
-        p = models_dir / name
-        if p.exists():
-            return p
-    return None
 
 
 def copy(src: Path, dst: Path):
@@ -38,9 +27,9 @@ def copy(src: Path, dst: Path):
     shutil.copy2(src, dst)
 
 
-def run_generate_manifest(args, model_file: Path, out_manifest: Path, classes_source: Path | None):
+def run_generate_manifest(args, models_dir: Path, out_manifest: Path, classes_source: Path | None):
     cmd = [sys.executable, 'ml/generate_manifest.py',
-           '--models-dir', str(model_file.parent),
+           '--models-dir', str(models_dir),
            '--out', str(out_manifest),
            '--input-size', str(args.input_size)]
     if classes_source and classes_source.exists():
@@ -53,6 +42,10 @@ def run_generate_manifest(args, model_file: Path, out_manifest: Path, classes_so
         cmd += ['--kb-version', args.knowledge_version]
     if args.knowledge_index:
         cmd += ['--kb-index', args.knowledge_index]
+    if args.pareto:
+        cmd += ['--pareto', args.pareto]
+    if args.max_drop is not None:
+        cmd += ['--max-drop', str(args.max_drop)]
     print('[CMD]', ' '.join(cmd))
     subprocess.check_call(cmd)
 
@@ -108,21 +101,31 @@ def main():
     ap.add_argument('--knowledge-version', help='Knowledge Versions-Tag')
     ap.add_argument('--knowledge-index', help='Optionaler Index (faiss/tfidf)')
     ap.add_argument('--no-manifest', action='store_true', help='Manifest nicht regenerieren (nur kopieren)')
+    ap.add_argument('--pareto', help='pareto_report.json für die Auswahl (an generate_manifest durchgereicht)')
+    ap.add_argument('--max-drop', type=float, help='Max. Drop in Prozent (an generate_manifest durchgereicht)')
     args = ap.parse_args()
 
     models_dir = Path(args.models_dir)
     assets_dir = Path(args.out_assets)
     assets_dir.mkdir(parents=True, exist_ok=True)
 
-    model_path = find_model(models_dir)
-    if not model_path:
-        raise SystemExit('Kein Modell in models-dir gefunden (erwartet TFLite Varianten).')
+    labels_src = Path(args.labels) if args.labels else None
+    manifest_path = assets_dir / args.manifest_name
+    if not args.no_manifest:
+        run_generate_manifest(args, models_dir, manifest_path, labels_src)
+    elif not manifest_path.exists():
+        raise SystemExit('Manifest fehlt und --no-manifest gesetzt.')
 
-    # Copy model
-    copy(model_path, assets_dir / model_path.name)
-    print(f'[OK] Modell kopiert: {model_path.name}')
+    # Modell = Auswahl des Manifests (Pareto oder Priorität), nicht eigene Liste
+    try:
+        model_file = json.loads(manifest_path.read_text(encoding='utf-8')).get('model_file')
+    except Exception as e:
+        raise SystemExit(f"Manifest JSON ungültig: {e}")
+    if not model_file or not (models_dir / model_file).exists():
+        raise SystemExit(f'Im Manifest referenziertes Modell fehlt in models-dir: {model_file}')
+    copy(models_dir / model_file, assets_dir / model_file)
+    print(f'[OK] Modell kopiert: {model_file}')
 
-    labels_src = Path(args.labels) if args.labels else None
     if labels_src and labels_src.exists():
         copy(labels_src, assets_dir / labels_src.name)
         print(f'[OK] Labels kopiert: {labels_src.name}')
@@ -137,13 +140,6 @@ def main():
         copy(km, target_km)
         print(f'[OK] Knowledge kopiert: {km}')
 
-    manifest_path = assets_dir / args.manifest_name
-    if not args.no_manifest:
-        run_generate_manifest(args, model_path, manifest_path, labels_src)
-    else:
-        if not manifest_path.exists():
-            raise SystemExit('Manifest fehlt und --no-manifest gesetzt.')
-
     validate_manifest(manifest_path, assets_dir)
     print('[DONE] Deployment abgeschlossen ->', assets_dir)
 
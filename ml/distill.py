@@ -21,6 +21,9 @@ Config additions (distillation block):
     freeze_teacher: true
     student_from_scratch: true
     kd_loss: kl_div
+    cache_teacher_logits: false   # Teacher einmal vorab (K Views) statt in jedem Batch, siehe teacher_cache.py
+    teacher_views: 1
+    teacher_cache_dir: null       # default <out>/teacher_cache (gleicher Pfad -> Wiederverwendung über Runs)
 
 Outputs similar to train.py: best.pt, metrics_final.json, plus distill_meta.json with KD settings.
 """
@@ -40,8 +43,15 @@ try:
 except ImportError as e:  # pragma: no cover
     raise SystemExit('PyTorch Umgebung erforderlich: pip install torch torchvision')
 
-from dataset import PlantDataset, build_transforms
+from dataset import build_split_datasets, build_transforms, build_loader
 from metrics import MetricsTracker
+from prune import load_pruned_checkpoint
+from teacher_cache import TeacherLogitCache, ViewDataset, ViewSampler, build_teacher_cache, cache_signature
+
+CLASS_NAMES = [
+    'healthy','nitrogen_deficiency','calcium_deficiency','overwatering','underwatering',
+    'heat_stress','pest_suspect','fungal_suspect','nutrient_other','unknown'
+]
 
 # ---------------------------------------------------------------------------
 # Utility
@@ -106,7 +116,9 @@ def kd_loss_fn(student_logits, teacher_logits, T: float, reduction='batchmean'):
 # Training Loop
 # ---------------------------------------------------------------------------
 
-def train_one_epoch(student, teacher, loader, optimizer, device, scaler, cfg_distill, ce_loss, mixed_precision):
+def train_one_epoch(student, teacher, loader, optimizer, device, scaler, cfg_distill, ce_loss, mixed_precision,
+                    teacher_cache=None):
+    """teacher_cache: TeacherLogitCache -> loader liefert (imgs, labels, idx, view), kein Teacher Forward."""
     student.train()
     if teacher is not None and cfg_distill['freeze_teacher']:
         teacher.eval()
@@ -114,14 +126,16 @@ def train_one_epoch(student, teacher, loader, optimizer, device, scaler, cfg_dis
     total_ce = 0.0
     total_kd = 0.0
     steps = 0
-    for imgs, labels in loader:
-        imgs = imgs.to(device)
-        labels = labels.to(device)
+    for batch in loader:
+        imgs, labels = batch[0].to(device), batch[1].to(device)
         optimizer.zero_grad(set_to_none=True)
         with torch.cuda.amp.autocast(enabled=mixed_precision and device.type=='cuda'):
             s_logits = student(imgs)
             ce = ce_loss(s_logits, labels)
-            if teacher is not None:
+            if teacher_cache is not None:
+                t_logits = teacher_cache.lookup(batch[2], batch[3]).to(device, non_blocking=True)
+                kd = kd_loss_fn(s_logits, t_logits, cfg_distill['temperature'])
+            elif teacher is not None:
                 with torch.no_grad() if cfg_distill['freeze_teacher'] else torch.enable_grad():
                     t_logits = teacher(imgs)
                 kd = kd_loss_fn(s_logits, t_logits, cfg_distill['temperature'])
@@ -146,18 +160,14 @@ def train_one_epoch(student, teacher, loader, optimizer, device, scaler, cfg_dis
     }
 
 
-def evaluate(model, loader, device):
+def evaluate(model, loader, device, num_classes: int):
     model.eval()
-    tracker = MetricsTracker(num_classes=model.fc.out_features if hasattr(model,'fc') else 0)  # will adjust later
-    all_cm_classes = None
+    tracker = MetricsTracker(num_classes)
     with torch.no_grad():
         for imgs, labels in loader:
             imgs = imgs.to(device)
             labels = labels.to(device)
             logits = model(imgs)
-            if tracker.num_classes == 0:
-                tracker.num_classes = logits.shape[1]
-                tracker.cm = torch.zeros((tracker.num_classes, tracker.num_classes), dtype=torch.int64).numpy()
             tracker.update(logits, labels)
     res = tracker.compute()
     return res
@@ -171,6 +181,8 @@ def main():
     ap.add_argument('--config', required=True)
     ap.add_argument('--out', required=True)
     ap.add_argument('--teacher-checkpoint', help='Optional Pfad falls von Config abweichend')
+    ap.add_argument('--cache-teacher-logits', action='store_true', help='Teacher Logits einmal vorberechnen (distillation.cache_teacher_logits)')
+    ap.add_argument('--teacher-views', type=int, help='Anzahl augmentierter Views für den Teacher Cache (distillation.teacher_views)')
     args = ap.parse_args()
 
     cfg = load_config(args.config)
@@ -189,18 +201,14 @@ def main():
     # Dataset
     data = cfg['data']
     train_tf, val_tf = build_transforms(cfg['model']['image_size'], cfg.get('augment'))
-    # We reuse meta.csv splits (simple approach); for production consider stratified split reuse.
-    dataset = PlantDataset(data['root'], data['meta_csv'], list(range(cfg['model']['num_classes'])), transform=train_tf)  # placeholder class names numeric
-    # Quick naive split 90/10 (since original splitter in train.py not reused; could import logic)
-    indices = list(range(len(dataset)))
-    random.shuffle(indices)
-    split = int(len(indices)*0.9)
-    train_idx, val_idx = indices[:split], indices[split:]
-    from torch.utils.data import Subset
-    train_ds = Subset(dataset, train_idx)
-    val_ds = Subset(dataset, val_idx)
-    train_loader = DataLoader(train_ds, batch_size=cfg['train']['batch_size'], shuffle=True, num_workers=cfg['train']['num_workers'])
-    val_loader = DataLoader(val_ds, batch_size=cfg['train']['batch_size'], shuffle=False, num_workers=cfg['train']['num_workers'])
+    # Gleiche Splits wie train.py/eval.py (data.split_index bzw. Hash-Split nach plant_id); Test bleibt unberührt
+    decode_size = int(cfg['model']['image_size'] * 1.15) if data.get('jpeg_draft', True) else None
+    split_ds, split_meta = build_split_datasets(data['root'], data['meta_csv'], CLASS_NAMES, data,
+                                                {'train': train_tf, 'val': val_tf}, decode_size=decode_size, splits=('train', 'val'))
+    train_ds, val_ds = split_ds['train'], split_ds['val']
+    print(f"[SPLIT] {split_meta.get('strategy')}: train={len(train_ds)} val={len(val_ds)}")
+    train_loader = build_loader(train_ds, cfg['train']['batch_size'], cfg['train'], str(device), shuffle=True)
+    val_loader = build_loader(val_ds, cfg['train']['batch_size'], cfg['train'], str(device))
 
     # Student
     student = build_model(cfg['model']['name'], cfg['model']['num_classes']).to(device)
@@ -213,11 +221,8 @@ def main():
         t_arch = distill_cfg.get('teacher_arch', cfg['model']['name'])
         teacher = build_model(t_arch, cfg['model']['num_classes']).to(device)
         state = torch.load(teacher_ckpt, map_location='cpu')
-        # Accept both plain state_dict or checkpoint dict
-        if 'model_state' in state:
-            teacher.load_state_dict(state['model_state'])
-        else:
-            teacher.load_state_dict(state)
+        # plain state_dict oder Checkpoint (train.py: 'model', distill.py: 'model_state'); geprunte Teacher via prune_spec
+        teacher = load_pruned_checkpoint(teacher, state)
         print(f'[INFO] Teacher geladen: {t_arch} von {teacher_ckpt}')
     else:
         print('[WARN] Kein Teacher Checkpoint gefunden – Distillation degradiert zu normalem Training')
@@ -227,6 +232,37 @@ def main():
         for p in teacher.parameters():
             p.requires_grad_(False)
 
+    # Teacher Logits Cache: Teacher läuft einmal über train (K Views) statt in jedem Batch jeder Epoche
+    teacher_cache = None
+    cache_info = None
+    use_cache = args.cache_teacher_logits or distill_cfg.get('cache_teacher_logits', False)
+    if use_cache and teacher is not None and not distill_cfg.get('freeze_teacher', True):
+        print('[WARN] cache_teacher_logits benötigt freeze_teacher=true – Teacher läuft online')
+        use_cache = False
+    train_sampler = None
+    if use_cache and teacher is not None:
+        views = int(args.teacher_views or distill_cfg.get('teacher_views', 1))
+        seed = exp.get('seed', 42)
+        cache_dir = Path(distill_cfg.get('teacher_cache_dir') or out_dir / 'teacher_cache')
+        view_ds = ViewDataset(train_ds, seed)
+        sig = cache_signature(teacher_ckpt, distill_cfg.get('teacher_arch', cfg['model']['name']), views, seed,
+                              cfg['model']['image_size'], cfg.get('augment'))
+        teacher_cache = TeacherLogitCache.open(cache_dir, view_ds.ids, sig)
+        build_s = 0.0
+        if teacher_cache is None:
+            teacher_cache, build_s = build_teacher_cache(
+                teacher, view_ds,
+                lambda sampler: build_loader(view_ds, cfg['train']['batch_size'], cfg['train'], str(device), sampler=sampler, persistent=False),
+                cache_dir, sig, device, cfg['model']['num_classes'], views,
+                autocast=lambda: torch.cuda.amp.autocast(enabled=exp.get('mixed_precision', False) and device.type == 'cuda'))
+            print(f"[KD-CACHE] {views} View(s) x {len(view_ds)} Samples -> {cache_dir} ({build_s:.1f}s)")
+        else:
+            print(f"[KD-CACHE] Wiederverwendet: {cache_dir}")
+        cache_info = {'dir': cache_dir.as_posix(), 'views': views, 'reused': build_s == 0.0, 'build_s': round(build_s, 3)}
+        teacher = teacher.cpu()  # nicht mehr benötigt -> Gerätespeicher frei
+        train_sampler = ViewSampler(len(view_ds), views, seed)
+        train_loader = build_loader(view_ds, cfg['train']['batch_size'], cfg['train'], str(device), sampler=train_sampler)
+
     # Optimizer
     opt_cfg = cfg['optimizer']
     optimizer = torch.optim.AdamW(student.parameters(), lr=opt_cfg['lr'], weight_decay=opt_cfg.get('weight_decay',0.01), betas=tuple(opt_cfg.get('betas',[0.9,0.999])))
@@ -241,11 +277,17 @@ def main():
     patience = cfg['train'].get('early_stop_patience', 5)
     bad_epochs = 0
 
+    train_time = 0.0
     for epoch in range(1, epochs+1):
         t0 = time.time()
-        train_stats = train_one_epoch(student, teacher, train_loader, optimizer, device, scaler, distill_cfg, ce_loss, exp.get('mixed_precision', False))
-        val_metrics = evaluate(student, val_loader, device)
-        macro_f1 = val_metrics['macro_f1']
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
+        train_stats = train_one_epoch(student, teacher, train_loader, optimizer, device, scaler, distill_cfg, ce_loss,
+                                      exp.get('mixed_precision', False), teacher_cache=teacher_cache)
+        train_stats['time_s'] = round(time.time() - t0, 3)
+        train_time += train_stats['time_s']
+        val_metrics = evaluate(student, val_loader, device, cfg['model']['num_classes'])
+        macro_f1 = val_metrics.macro_f1
         improved = macro_f1 > best_f1
         if improved:
             best_f1 = macro_f1
@@ -264,7 +306,8 @@ def main():
     with open(out_dir / 'metrics_final.json', 'w', encoding='utf-8') as f:
         json.dump({'history': history, 'best_macro_f1': best_f1}, f, indent=2)
     with open(out_dir / 'distill_meta.json', 'w', encoding='utf-8') as f:
-        json.dump({'distillation': distill_cfg}, f, indent=2)
+        json.dump({'distillation': distill_cfg, 'teacher_cache': cache_info,
+                   'train_time_s': round(train_time, 3)}, f, indent=2)
     print('[DONE] Distillation abgeschlossen. Artefakte gespeichert.')
 
 if __name__ == '__main__':
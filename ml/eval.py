@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 """Evaluation Script for LeafSense Models.
 
-Loads the dataset & config, reconstructs train/val/test split with identical logic
-(random_split + same seed), loads best checkpoint, and computes metrics on
-validation & test sets. Writes results to eval_results.json.
+Loads the dataset & config, reconstructs the val/test split with identical logic
+(data.split_index or the stable hash split from ml/splits.py), loads best checkpoint,
+and computes metrics on validation & test sets. Writes results to eval_results.json.
 
 Usage:
   python ml/eval.py --config ml/configs/baseline.yaml --meta datasets/plant_v1/meta.csv \
@@ -12,6 +12,9 @@ Usage:
 Notes:
 - Consistency requires identical meta.csv and class list as training.
 - If multi-label in Zukunft: adjust dataset & metrics accordingly.
+- --streaming: constant memory for very large eval sets – logits are never
+  collected, MetricsTracker accumulates top-k / ECE / log-loss and per-class
+  score histograms (PR/ROC curves on the k/score_bins threshold grid).
 """
 from __future__ import annotations
 import argparse, json, os
@@ -21,13 +24,16 @@ import numpy as np
 
 try:
     import torch
-    from torch.utils.data import random_split, DataLoader
+    from torch.utils.data import DataLoader
     from torch import nn
 except ImportError:
     raise SystemExit("torch nicht installiert – eval nicht möglich.")
 
-from dataset import PlantDataset, build_transforms
+from dataset import build_split_datasets, build_transforms, build_loader
 from metrics import MetricsTracker
+from prune import load_pruned_checkpoint
+from inference_results import collect_inference
+from curves import macro_pr_curve, macro_roc_curve
 import yaml
 
 def load_config(path: str):
@@ -59,6 +65,9 @@ def main():
     ap.add_argument('--meta', required=True)
     ap.add_argument('--checkpoint', required=True)
     ap.add_argument('--out', required=True, help='Output directory (will write eval_results.json)')
+    ap.add_argument('--curves', action='store_true', help='Add macro PR/ROC curves (ml/curves.py) to val/test results')
+    ap.add_argument('--streaming', action='store_true', help='Konstanter Speicher: keine Logits sammeln, Metriken/Kurven aus Streaming-Akkumulatoren')
+    ap.add_argument('--score-bins', type=int, default=100, help='Histogramm-Bins je Klasse für --streaming --curves (Threshold-Raster k/bins)')
     args = ap.parse_args()
 
     cfg = load_config(args.config)
@@ -68,27 +77,16 @@ def main():
     else:
         device = device_pref
 
-    train_tf, val_tf = build_transforms(image_size=cfg.get('model', {}).get('image_size', 224), augment_cfg=cfg.get('augment'))
-    full_ds = PlantDataset(args.root, args.meta, CLASS_NAMES, transform=train_tf)
-
-    # replicate split ratios (must match train.py)
-    val_ratio = 0.15
-    test_ratio = 0.15
-    n = len(full_ds)
-    n_val = int(n * val_ratio)
-    n_test = int(n * test_ratio)
-    n_train = n - n_val - n_test
-    g = torch.Generator().manual_seed(42)
-    train_ds, val_ds, test_ds = random_split(full_ds, [n_train, n_val, n_test], generator=g)
-    # apply validation transforms for val/test
-    if val_tf:
-        val_ds.dataset.transform = val_tf  # type: ignore
-        test_ds.dataset.transform = val_tf  # type: ignore
+    _, val_tf = build_transforms(image_size=cfg.get('model', {}).get('image_size', 224), augment_cfg=cfg.get('augment'))
+    # gleiche Split-Definition wie train.py (data.split_index bzw. Hash-Split), nur Val/Test Zeilen laden
+    split_ds, split_meta = build_split_datasets(args.root, args.meta, CLASS_NAMES, cfg.get('data', {}),
+                                                {'val': val_tf, 'test': val_tf}, splits=('val', 'test'))
+    val_ds, test_ds = split_ds['val'], split_ds['test']
 
     batch_size = cfg.get('train', {}).get('batch_size', 32)
-    num_workers = cfg.get('train', {}).get('num_workers', 2)
-    val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, num_workers=num_workers)
-    test_loader = DataLoader(test_ds, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+    # one-shot Loader: Worker-Optionen aus train-Block, aber ohne persistente Worker
+    val_loader = build_loader(val_ds, batch_size, cfg.get('train', {}), device, persistent=False)
+    test_loader = build_loader(test_ds, batch_size, cfg.get('train', {}), device, persistent=False)
 
     model_name = cfg.get('model', {}).get('name', 'mobilenet_v3_small')
     num_classes = cfg.get('model', {}).get('num_classes', len(CLASS_NAMES))
@@ -98,29 +96,60 @@ def main():
     if not ckpt_path.exists():
         raise SystemExit(f"Checkpoint nicht gefunden: {ckpt_path}")
     state = torch.load(ckpt_path, map_location=device)
-    sd = state.get('model', state)
-    model.load_state_dict(sd, strict=False)
+    model = load_pruned_checkpoint(model, state)  # prune_spec / qat -> Architektur, dann strict load
 
-    criterion = torch.nn.CrossEntropyLoss()
+    criterion = torch.nn.CrossEntropyLoss(reduction='none')
+    topk = cfg.get('metrics', {}).get('topk', (1, 3)) or ()
+    ece_bins = int(cfg.get('metrics', {}).get('ece_bins', 15) or 0)
 
-    def run(loader):
+    def make_tracker(score_bins: int = 0):
+        return MetricsTracker(num_classes, topk=topk, score_bins=score_bins, ece_bins=ece_bins, log_loss=True)
+
+    def run_streaming(loader):
+        # kein Logit-Array: Speicher unabhängig von der Anzahl Bilder
+        tracker = make_tracker(args.score_bins if args.curves else 0)
+        loss_sum = torch.zeros((), dtype=torch.float64, device=device)
+        n = 0
         model.eval()
-        tracker = MetricsTracker(num_classes)
-        total_loss = 0.0
         with torch.no_grad():
             for x, y in loader:
-                x, y = x.to(device), y.to(device)
-                out = model(x)
-                loss = criterion(out, y)
-                total_loss += float(loss.item()) * x.size(0)
-                tracker.update(out, y)
+                x, y = x.to(device, non_blocking=True), y.to(device, non_blocking=True)
+                logits = model(x).float()
+                loss_sum += criterion(logits, y).sum().double()
+                tracker.update(logits, y)
+                n += y.numel()
         res = tracker.compute()
-        return {
-            'loss': total_loss / len(loader.dataset),
+        result = {
+            'loss': float(loss_sum.item()) / max(1, n),
             'macro_f1': res.macro_f1,
             'per_class': res.per_class,
-            'confusion': res.confusion.tolist()
+            'confusion': res.confusion.tolist(),
+            **res.streaming_summary(),
         }
+        if 'pr_curve' in result:
+            result['pr_curve']['score_bins'] = args.score_bins
+        return result
+
+    def run(loader):
+        # one pass: logits/labels/losses cached, metrics & curves computed from the arrays
+        inf = collect_inference(model, loader, device, criterion)
+        tracker = make_tracker()
+        tracker.update(inf.logits, inf.labels)
+        res = tracker.compute()
+        result = {
+            'loss': inf.mean_loss(),
+            'macro_f1': res.macro_f1,
+            'per_class': res.per_class,
+            'confusion': res.confusion.tolist(),
+            **res.streaming_summary(),
+        }
+        if args.curves:
+            result['pr_curve'] = macro_pr_curve(inf.probs, inf.labels)
+            result['roc_curve'] = macro_roc_curve(inf.probs, inf.labels)
+        return result
+
+    if args.streaming:
+        run = run_streaming
 
     val_metrics = run(val_loader)
     test_metrics = run(test_loader)
@@ -130,6 +159,8 @@ def main():
     results = {
         'checkpoint': str(ckpt_path),
         'device': device,
+        'split': split_meta,
+        'streaming': args.streaming,
         'val': val_metrics,
         'test': test_metrics
     }
@@ -137,6 +168,11 @@ def main():
         json.dump(results, f, indent=2)
     print('[EVAL] Ergebnisse gespeichert ->', out_dir / 'eval_results.json')
     print(f"[VAL] macro_f1={val_metrics['macro_f1']:.4f}  [TEST] macro_f1={test_metrics['macro_f1']:.4f}")
+    if 'ece' in val_metrics:
+        topk_str = ' '.join(f"top{k}={v:.4f}" for k, v in val_metrics.get('topk_accuracy', {}).items())
+        print(f"[VAL] {topk_str} ece={val_metrics['ece']:.4f} log_loss={val_metrics['log_loss']:.4f}")
+    if args.curves:
+        print(f"[VAL] macro_pr_auc={val_metrics['pr_curve']['macro_pr_auc']:.4f} macro_roc_auc={val_metrics['roc_curve']['macro_roc_auc']:.4f}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,200 @@
+"""Decode-once evaluation tensor cache for the TFLite tools (torch-free).
+
+compare_tflite_accuracy.py evaluates several model variants (fp32, int8_dynamic,
+int8_full, ...) on the same images. Instead of re-running open / resize / crop for
+every variant (and every CI run), the eval set is preprocessed once into:
+
+- pixels.u8: uint8 memmap [N, H, W, 3] (resize 1.15x -> center crop, NHWC, before normalization)
+- labels.npy: int64 [N]
+- meta.json: key fields, count, build time
+
+Normalization ((x/255 - mean) / std) is applied per batch on read; float32 values are
+bit-identical to ``preprocess_image`` and the uint8 array stays 4x smaller than float32.
+Quantized-input models (uint8 / int8) skip the float round trip: ``input_lut`` maps the
+cached pixels through a [256, 3] table built from the input's scale / zero point.
+
+Cache directory: ``<cache_root>/<key>`` where key = sha1 over meta.csv content, data
+root, per-image path/size/mtime (like representative_set.repr_cache_key: images replaced
+in place under the same name), class list, image_size, normalization, JPEG draft flag and
+preprocessing version. Any change -> new key -> rebuild. ci_gate.py and quantize_ptq.py (auto-compare) pass
+the same ``--eval-cache`` root, so all variants and repeated runs share one decode.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from image_io import draft_enabled, open_rgb
+
+PREPROCESS_VERSION = 1  # erhöhen, wenn sich load_pixels ändert
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+PIXELS_FILE = 'pixels.u8'
+LABELS_FILE = 'labels.npy'
+META_FILE = 'meta.json'
+
+
+def load_pixels(path: Union[str, Path], image_size: int) -> np.ndarray:
+    """Resize 1.15x then center crop like eval transforms -> uint8 HWC."""
+    target = int(image_size * 1.15)
+    img = open_rgb(path, target)
+    img = img.resize((target, target))
+    left = (target - image_size) // 2
+    top = (target - image_size) // 2
+    img = img.crop((left, top, left + image_size, top + image_size))
+    return np.asarray(img, dtype=np.uint8)
+
+
+def normalize(pixels: np.ndarray) -> np.ndarray:
+    """uint8 (..., 3) -> ImageNet-normalized float32 (same ops as training/eval)."""
+    arr = pixels.astype(np.float32) / 255.0
+    return ((arr - MEAN) / STD).astype(np.float32)
+
+
+def quantize_input(x: np.ndarray, quantization: Tuple[float, int], dtype) -> np.ndarray:
+    """Float path: normalized float32 NHWC -> model input dtype (uint8 / int8).
+
+    scale > 0: q = clip(round(x / scale) + zero_point) (TFLite input quantization).
+    scale == 0 (no params, legacy models): de-normalize to [0,1] and scale to 0..255.
+    """
+    scale, zero = quantization
+    info = np.iinfo(dtype)
+    if scale:
+        q = np.round(x / np.float32(scale)) + np.float32(zero)
+        return np.clip(q, info.min, info.max).astype(dtype)
+    x = np.clip(x * STD + MEAN, 0, 1) * 255.0
+    return np.clip(x, info.min, info.max).astype(dtype)
+
+
+def input_lut(quantization: Tuple[float, int], dtype) -> np.ndarray:
+    """[256, 3] table pixel -> quantized input per channel.
+
+    Normalization and quantization are per-pixel, per-channel functions of the uint8
+    value, so ``apply_lut(pixels, lut)`` is bit-exact to
+    ``quantize_input(normalize(pixels))`` without any float intermediate per image.
+    """
+    values = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+    return quantize_input(normalize(values), quantization, dtype)
+
+
+def apply_lut(pixels: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    out = np.empty(pixels.shape, dtype=lut.dtype)
+    for c in range(3):  # np.take je Kanal ~2x schneller als Fancy-Indexing lut[pixels, [0, 1, 2]]
+        np.take(lut[:, c], pixels[..., c], out=out[..., c])
+    return out
+
+
+def eval_cache_key(meta_csv: Union[str, Path], data_root: Union[str, Path], class_names: List[str],
+                   image_size: int, paths: Sequence[Path] = ()) -> str:
+    h = hashlib.sha1()
+    h.update(Path(meta_csv).read_bytes())
+    for p in paths:
+        st = Path(p).stat()
+        h.update(f'{Path(p).resolve().as_posix()}|{st.st_size}|{st.st_mtime_ns}\n'.encode('utf-8'))
+    h.update(json.dumps({
+        'data_root': Path(data_root).resolve().as_posix(),
+        'classes': list(class_names),
+        'image_size': int(image_size),
+        'mean': MEAN.tolist(),
+        'std': STD.tolist(),
+        'draft': draft_enabled(),
+        'version': PREPROCESS_VERSION,
+    }, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def _write_chunk(args) -> int:
+    pixels_path, n, image_size, start, paths = args
+    mm = np.memmap(pixels_path, dtype=np.uint8, mode='r+', shape=(n, image_size, image_size, 3))
+    for i, p in enumerate(paths):
+        mm[start + i] = load_pixels(p, image_size)
+    mm.flush()
+    return len(paths)
+
+
+class EvalCache:
+    """Preprocessed eval set; memmap opened read-only (page cache shared across processes)."""
+
+    def __init__(self, cache_dir: Union[str, Path]):
+        self.cache_dir = Path(cache_dir)
+        meta_path = self.cache_dir / META_FILE
+        if not meta_path.exists():
+            raise FileNotFoundError(f'Eval Cache unvollständig / fehlt: {self.cache_dir}')
+        self.meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        s = int(self.meta['image_size'])
+        self.labels = np.load(self.cache_dir / LABELS_FILE)
+        self.pixels = np.memmap(self.cache_dir / PIXELS_FILE, dtype=np.uint8, mode='r',
+                                shape=(len(self.labels), s, s, 3))
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def iter_batches(self, batch_size: int, start: int = 0, stop: Optional[int] = None,
+                     normalized: bool = True) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield (x NHWC, labels) for samples [start, stop); x float32 normalized or raw uint8 pixels."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for s in range(start, stop, batch_size):
+            e = min(s + batch_size, stop)
+            x = np.asarray(self.pixels[s:e])
+            yield (normalize(x) if normalized else x), self.labels[s:e]
+
+
+def build_eval_cache(samples: List[Tuple[Path, int]], image_size: int, out_dir: Union[str, Path],
+                     workers: int = 0, meta: Optional[Dict] = None) -> EvalCache:
+    """Decode ``samples`` once (process pool, disjoint memmap slices) and write the cache."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / META_FILE).unlink(missing_ok=True)  # unvollständiger Cache wird nie geöffnet
+    t0 = time.perf_counter()
+    n = len(samples)
+    pixels_path = out_dir / PIXELS_FILE
+    np.memmap(pixels_path, dtype=np.uint8, mode='w+', shape=(max(n, 1), image_size, image_size, 3)).flush()
+    paths = [p.as_posix() for p, _ in samples]
+    workers = workers or (os.cpu_count() or 1)
+    chunk = max(1, (n + workers * 4 - 1) // (workers * 4))
+    jobs = [(pixels_path, max(n, 1), image_size, s, paths[s:s + chunk]) for s in range(0, n, chunk)]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            done = sum(ex.map(_write_chunk, jobs))
+    else:
+        done = sum(_write_chunk(j) for j in jobs)
+    np.save(out_dir / LABELS_FILE, np.asarray([l for _, l in samples], dtype=np.int64))
+    info = {
+        **(meta or {}),
+        'image_size': int(image_size),
+        'count': int(done),
+        'layout': 'uint8 NHWC (vor Normalisierung)',
+        'mean': MEAN.tolist(),
+        'std': STD.tolist(),
+        'build_s': round(time.perf_counter() - t0, 3),
+    }
+    (out_dir / META_FILE).write_text(json.dumps(info, indent=2), encoding='utf-8')
+    return EvalCache(out_dir)
+
+
+def open_or_build_eval_cache(cache_root: Union[str, Path], samples: List[Tuple[Path, int]],
+                             meta_csv: Union[str, Path], data_root: Union[str, Path],
+                             class_names: List[str], image_size: int, workers: int = 0) -> EvalCache:
+    key = eval_cache_key(meta_csv, data_root, class_names, image_size, [p for p, _ in samples])
+    cache_dir = Path(cache_root) / key
+    if (cache_dir / META_FILE).exists():
+        cache = EvalCache(cache_dir)
+        if len(cache) == len(samples):
+            print(f"[CACHE] Eval Cache wiederverwendet: {cache_dir} ({len(cache)} Bilder)")
+            return cache
+    print(f"[CACHE] Baue Eval Cache: {cache_dir} ({len(samples)} Bilder, {image_size}px)")
+    cache = build_eval_cache(samples, image_size, cache_dir, workers=workers, meta={
+        'key': key,
+        'meta_csv': Path(meta_csv).resolve().as_posix(),
+        'data_root': Path(data_root).resolve().as_posix(),
+        'classes': list(class_names),
+    })
+    print(f"[CACHE] {len(cache)} Bilder in {cache.meta['build_s']:.1f}s")
+    return cache
@@ -10,6 +10,8 @@ import torch
 from torchvision import models
 import numpy as np
 
+from prune import load_pruned_checkpoint
+
 
 def load_model(ckpt: Path, labels_json: Path):
     labels = json.loads(labels_json.read_text())
@@ -17,11 +19,7 @@ def load_model(ckpt: Path, labels_json: Path):
     in_f = m.classifier[0].in_features
     m.classifier[-1] = torch.nn.Linear(in_f, len(labels))
     state = torch.load(ckpt, map_location='cpu')
-    key = 'model' if 'model' in state else None
-    if key:
-        m.load_state_dict(state[key])
-    else:
-        m.load_state_dict(state)
+    m = load_pruned_checkpoint(m, state)  # prune_spec / qat (falls vorhanden) + strict load
     m.eval()
     return m, labels
 
@@ -2,7 +2,11 @@
 """Generate leafsense_model.json manifest.
 
 Combines information from:
-- Selected model variant (priority: model_int8_full.tflite > model_int8_dynamic.tflite > model_fp32.tflite > leafsense_model.tflite)
+- Selected model variant:
+  - with a Pareto report (pareto_report.py, --pareto or <models-dir>/pareto_report.json): the fastest
+    variant (p50 latency) whose macro F1 / accuracy drop vs fp32 stays within --max-drop
+  - otherwise fallback priority model_int8_full > model_int8_dynamic > model_float16 > model_int16x8 >
+    model_fp32 > leafsense_model, skipping variants the comparison report marks outside the drop threshold
 - Optional comparison report (latest artifacts/quant_eval/*_tflite_eval.json)
 - Optional class list (labels file or provided via --classes)
 
@@ -17,6 +21,7 @@ Optional:
   --input-size 224
   --comparison artifacts/quant_eval/20250929_120000_tflite_eval.json
   --version 2025-09-29_mnetv3s_int8f
+  --pareto ml/outputs/run_001/quant/pareto_report.json --max-drop 3.0
 
 If comparison not provided, tries newest *_tflite_eval.json.
 """
@@ -25,17 +30,51 @@ import argparse, json, time, hashlib
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
-PRIORITY = ["model_int8_full.tflite","model_int8_dynamic.tflite","model_fp32.tflite","leafsense_model.tflite"]
+PRIORITY = ["model_int8_full.tflite","model_int8_dynamic.tflite","model_float16.tflite","model_int16x8.tflite",
+            "model_fp32.tflite","leafsense_model.tflite"]
+VARIANT_MAP = {
+    'model_int8_full.tflite': 'int8_full',
+    'model_int8_dynamic.tflite': 'int8_dynamic',
+    'model_float16.tflite': 'float16',
+    'model_int16x8.tflite': 'int16x8',
+    'model_fp32.tflite': 'fp32',
+    'leafsense_model.tflite': 'fp32'  # treat as baseline
+}
 
 def load_labels(path: Path) -> List[str]:
     return [l.strip() for l in path.read_text(encoding='utf-8').splitlines() if l.strip()]
 
-def find_model(models_dir: Path) -> str | None:
+def find_model(models_dir: Path, excluded: set | None = None) -> str | None:
     for name in PRIORITY:
-        if (models_dir / name).exists():
+        if (models_dir / name).exists() and VARIANT_MAP.get(name) not in (excluded or set()):
             return name
     return None
 
+def pareto_choice(pareto_path: Path, models_dir: Path, max_drop: float | None) -> Dict[str, Any] | None:
+    """Fastest variant within max_drop from a pareto_report.json (re-evaluated if --max-drop given)."""
+    from pareto_report import select_variant
+    try:
+        report = json.loads(pareto_path.read_text(encoding='utf-8'))
+    except Exception:
+        return None
+    rows = [r for r in report.get('rows', []) if (models_dir / r['file']).exists()]
+    drop = report.get('max_drop_pct', 3.0) if max_drop is None else max_drop
+    selected = select_variant(rows, drop)
+    if selected is None:
+        return None
+    row = next(r for r in rows if r['variant'] == selected)
+    return {'model_file': row['file'], 'strategy': 'fastest_within_max_drop', 'max_drop_pct': drop,
+            'latency_p50_ms': row['p50_ms'], 'pareto': report.get('pareto'), 'report': pareto_path.as_posix()}
+
+def variants_outside_drop(report_path: Path | None) -> set:
+    if report_path is None:
+        return set()
+    try:
+        reports = json.loads(report_path.read_text(encoding='utf-8')).get('reports', {})
+    except Exception:
+        return set()
+    return {k for k, v in reports.items() if v.get('within_max_drop') is False}
+
 def latest_comparison(report_glob: str) -> Optional[Path]:
     paths = sorted(Path('.').glob(report_glob))
     return paths[-1] if paths else None
@@ -46,13 +85,7 @@ def extract_metrics(report_path: Path, model_file: str) -> Dict[str, Any]:
     except Exception:
         return {}
     reports = data.get('reports', {})
-    variant_map = {
-        'model_int8_full.tflite': 'int8_full',
-        'model_int8_dynamic.tflite': 'int8_dynamic',
-        'model_fp32.tflite': 'fp32',
-        'leafsense_model.tflite': 'fp32'  # treat as baseline
-    }
-    sel_key = variant_map.get(model_file)
+    sel_key = VARIANT_MAP.get(model_file)
     if not sel_key:
         return {}
     chosen = reports.get(sel_key, {})
@@ -76,6 +109,8 @@ def main():
     ap.add_argument('--comparison', help='Pfad zu *_tflite_eval.json')
     ap.add_argument('--comparison-glob', default='artifacts/quant_eval/*_tflite_eval.json')
     ap.add_argument('--version', help='Modellversion Tag; default: timestamp + filename')
+    ap.add_argument('--pareto', help='pareto_report.json (Default: <models-dir>/pareto_report.json falls vorhanden)')
+    ap.add_argument('--max-drop', type=float, help='Max. Drop in Prozent für die Auswahl (Default: Wert aus dem Pareto Report)')
     # Knowledge base (optional)
     ap.add_argument('--kb-version', help='Knowledge base version tag (optional)')
     ap.add_argument('--kb-merged', help='Path to merged knowledge JSONL (e.g. knowledge/build/merged.jsonl)')
@@ -84,7 +119,14 @@ def main():
     args = ap.parse_args()
 
     models_dir = Path(args.models_dir)
-    model_file = find_model(models_dir)
+    comparison_path = Path(args.comparison) if args.comparison else latest_comparison(args.comparison_glob)
+    pareto_path = Path(args.pareto) if args.pareto else models_dir / 'pareto_report.json'
+    selection = pareto_choice(pareto_path, models_dir, args.max_drop) if pareto_path.exists() else None
+    if selection:
+        model_file = selection['model_file']
+    else:
+        model_file = find_model(models_dir, variants_outside_drop(comparison_path))
+        selection = {'model_file': model_file, 'strategy': 'priority'}
     if not model_file:
         raise SystemExit('Kein Modell gefunden (erwartet TFLite Varianten).')
 
@@ -95,7 +137,6 @@ def main():
     else:
         raise SystemExit('Klassen nicht gefunden: --classes oder --labels angeben.')
 
-    comparison_path = Path(args.comparison) if args.comparison else latest_comparison(args.comparison_glob)
     metrics = extract_metrics(comparison_path, model_file) if comparison_path else {}
 
     version = args.version or time.strftime('%Y%m%d_%H%M%S') + '_' + model_file.replace('.tflite','')
@@ -118,7 +159,8 @@ def main():
         'model_sha256': sha256,
         'input_size': args.input_size,
         'format': 'tflite',
-        'quantization': ('int8_full' if 'int8_full' in model_file else 'int8_dynamic' if 'int8_dynamic' in model_file else 'fp32'),
+        'quantization': VARIANT_MAP.get(model_file, 'fp32'),
+        'selection': {k: v for k, v in selection.items() if k != 'model_file'},
         'classes': classes,
         'normalization': {
             'mean': [0.485,0.456,0.406],
@@ -157,6 +199,7 @@ def main():
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
     print('[OK] Manifest geschrieben:', out_path)
+    print(f"[INFO] Variante: {model_file} (Auswahl: {selection['strategy']})")
     if metrics:
         print('[INFO] Enthaltene Metriken:', {k: metrics[k] for k in metrics.keys() if 'macro' in k or 'accuracy' in k})
 
@@ -23,6 +23,9 @@ from torch import nn
 from PIL import Image
 import numpy as np
 
+from image_io import open_rgb
+from prune import checkpoint_state_dict, load_pruned_checkpoint
+
 try:
     import torchvision.transforms as T
     from torchvision import models
@@ -34,10 +37,10 @@ def load_model(checkpoint: str, num_classes: int | None = None):
     ckpt = torch.load(checkpoint, map_location='cpu')
     # Assume MobileNetV3 Small architecture by default
     model = models.mobilenet_v3_small(weights=None)
-    if num_classes is not None:
-        model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
-    sd = ckpt.get('model', ckpt)
-    model.load_state_dict(sd, strict=False)
+    if num_classes is None:  # Klassenzahl aus dem Checkpoint statt 1000er ImageNet Kopf
+        num_classes = checkpoint_state_dict(ckpt)['classifier.3.weight'].shape[0]
+    model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
+    model = load_pruned_checkpoint(model, ckpt)  # prune_spec / qat (falls vorhanden) + strict load
     model.eval()
     return model
 
@@ -61,7 +64,7 @@ def preprocess_image(path: Path, image_size: int = 224):
         T.ToTensor(),
         T.Normalize(mean=[0.485,0.456,0.406], std=[0.229,0.224,0.225])
     ])
-    img = Image.open(path).convert('RGB')
+    img = open_rgb(path, int(image_size * 1.15))
     return tf(img), img
 
 
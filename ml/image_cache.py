@@ -0,0 +1,206 @@
+"""Read-only preprocessed image cache (``data.cache``) shared by train.py / sweep trials.
+
+Every image listed in meta.csv is decoded once (``open_rgb`` incl. JPEG draft),
+resized so that its shorter edge equals ``min_side`` (same ``Resize`` as the
+first step of the train / val transforms) and stored as raw uint8 HWC pixels in
+one flat memmap. Aspect ratio is kept (no crop) so RandomResizedCrop still sees
+the whole image.
+
+- ``min_side = int(image_size * 1.15)``: the transform's own Resize becomes a
+  no-op -> cached samples are pixel-identical to the decode path.
+- Smaller train resolutions (progressive resizing) resize down from the cache.
+- Requests for a larger decode size than ``min_side`` fall back to disk decode.
+
+Files (``<dir>/``):
+- pixels.u8: flat uint8 memmap (all images back to back)
+- index.npz: sample_ids (uint64, sorted), offsets (int64), shapes (int32 [N, 2] = h, w)
+- meta.json: min_side, draft, count, bytes, source meta.csv
+
+Build (parallel, process pool writes disjoint slices):
+    python ml/image_cache.py --root ml/data/images --meta ml/data/meta.csv --min-side 257 --out ml/cache/img257
+Workers open the memmap lazily (the cache object pickles as its path only), so
+DataLoader workers / sweep trials share the page cache instead of copying pixels.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from image_io import draft_enabled, open_rgb
+from splits import DEFAULT_KEY_COL, row_key, sample_id
+
+PIXELS_FILE = 'pixels.u8'
+INDEX_FILE = 'index.npz'
+META_FILE = 'meta.json'
+
+
+def _resolve_path(root: Path, row: Dict[str, str]) -> Optional[Path]:
+    """Same lookup as PlantDataset: <root>/<label>/<filename>, fallback <root>/<filename>."""
+    fname = row['filename'].strip()
+    p = root / row['label'].strip() / fname
+    if not p.exists():
+        p = root / fname
+    return p if p.exists() else None
+
+
+def resized_shape(path: Path, min_side: int, draft: bool) -> Tuple[int, int]:
+    """(h, w) after draft decode + Resize(min_side) – from the header only, no pixel decode."""
+    from PIL import Image
+    with Image.open(path) as img:
+        if draft and img.format == 'JPEG' and draft_enabled():
+            img.draft('RGB', (min_side, min_side))
+        w, h = img.size
+    if w <= h:
+        return int(min_side * h / w), min_side
+    return min_side, int(min_side * w / h)
+
+
+def _decode(path: Path, min_side: int, draft: bool) -> np.ndarray:
+    import torchvision.transforms as T
+    img = open_rgb(path, min_side if draft else None)
+    return np.asarray(T.Resize(min_side)(img), dtype=np.uint8)
+
+
+def _write_chunk(args) -> int:
+    pixels_path, total, jobs, min_side, draft = args
+    mm = np.memmap(pixels_path, dtype=np.uint8, mode='r+', shape=(total,))
+    for path, offset, h, w in jobs:
+        arr = _decode(Path(path), min_side, draft)
+        if arr.shape[:2] != (h, w):
+            raise RuntimeError(f'Unerwartete Größe {arr.shape[:2]} != {(h, w)}: {path}')
+        mm[offset:offset + h * w * 3] = arr.reshape(-1)
+    mm.flush()
+    return len(jobs)
+
+
+def build_image_cache(data_root: Union[str, Path], meta_csv: Union[str, Path], out_dir: Union[str, Path],
+                      min_side: int, draft: bool = True, key_col: str = DEFAULT_KEY_COL,
+                      workers: int = 0) -> Dict:
+    data_root, out_dir = Path(data_root), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / META_FILE).unlink(missing_ok=True)  # unvollständiger Cache wird nie geöffnet
+    t0 = time.perf_counter()
+    entries = {}
+    with Path(meta_csv).open('r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            p = _resolve_path(data_root, row)
+            if p is not None:
+                entries[sample_id(row_key(row, key_col))] = p
+    ids = np.asarray(sorted(entries), dtype=np.uint64)
+    shapes = np.asarray([resized_shape(entries[int(i)], min_side, draft) for i in ids], dtype=np.int32).reshape(-1, 2)
+    sizes = shapes[:, 0].astype(np.int64) * shapes[:, 1] * 3
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    total = int(sizes.sum())
+    pixels_path = out_dir / PIXELS_FILE
+    np.memmap(pixels_path, dtype=np.uint8, mode='w+', shape=(max(total, 1),)).flush()
+    jobs = [(entries[int(i)].as_posix(), int(o), int(h), int(w)) for i, o, (h, w) in zip(ids, offsets, shapes)]
+    workers = workers or (os.cpu_count() or 1)
+    chunk = max(1, (len(jobs) + workers * 4 - 1) // (workers * 4))
+    chunks = [(pixels_path, max(total, 1), jobs[i:i + chunk], min_side, draft) for i in range(0, len(jobs), chunk)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            done = sum(ex.map(_write_chunk, chunks))
+    else:
+        done = sum(_write_chunk(c) for c in chunks)
+    np.savez(out_dir / INDEX_FILE, sample_ids=ids, offsets=offsets, shapes=shapes)
+    meta = {
+        'min_side': int(min_side),
+        'draft': bool(draft),
+        'count': int(done),
+        'bytes': total,
+        'key_col': key_col,
+        'meta_csv': Path(meta_csv).resolve().as_posix(),
+        'build_s': round(time.perf_counter() - t0, 3),
+    }
+    (out_dir / META_FILE).write_text(json.dumps(meta, indent=2), encoding='utf-8')
+    return meta
+
+
+class ImageCache:
+    """Lookup ``sample_id -> PIL.Image``; memmap opened lazily per process."""
+
+    def __init__(self, cache_dir: Union[str, Path]):
+        self.cache_dir = Path(cache_dir)
+        meta_path = self.cache_dir / META_FILE
+        if not meta_path.exists():
+            raise FileNotFoundError(f'Image Cache unvollständig / fehlt: {self.cache_dir}')
+        self.meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        with np.load(self.cache_dir / INDEX_FILE) as z:
+            self.ids = z['sample_ids']
+            self.offsets = z['offsets']
+            self.shapes = z['shapes']
+        self._pixels = None
+
+    @property
+    def min_side(self) -> int:
+        return int(self.meta['min_side'])
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_pixels'] = None  # DataLoader Worker öffnen den Memmap selbst (keine Pixel-Kopie beim Pickeln)
+        return state
+
+    def __contains__(self, sid: int) -> bool:
+        return self._row(sid) is not None
+
+    def _row(self, sid: int) -> Optional[int]:
+        i = int(np.searchsorted(self.ids, np.uint64(sid)))
+        return i if i < len(self.ids) and int(self.ids[i]) == int(sid) else None
+
+    def get(self, sid: int):
+        from PIL import Image
+        i = self._row(sid)
+        if i is None:
+            return None
+        if self._pixels is None:
+            self._pixels = np.memmap(self.cache_dir / PIXELS_FILE, dtype=np.uint8, mode='r')
+        h, w = (int(v) for v in self.shapes[i])
+        o = int(self.offsets[i])
+        return Image.fromarray(np.asarray(self._pixels[o:o + h * w * 3]).reshape(h, w, 3), 'RGB')
+
+    def covers(self, resize_size: int, draft: bool, key_col: str = DEFAULT_KEY_COL) -> bool:
+        """Usable for transforms whose first step is Resize(resize_size)? (equal -> pixel-identical)"""
+        return (resize_size <= self.min_side and bool(self.meta.get('draft')) == bool(draft)
+                and self.meta.get('key_col', DEFAULT_KEY_COL) == key_col)
+
+
+def open_image_cache(data_cfg: Dict, resize_size: int) -> Optional[ImageCache]:
+    """``data.cache`` (path) -> ImageCache if usable for ``resize_size``, else None (Decode von Disk)."""
+    path = data_cfg.get('cache')
+    if not path or path is True:
+        return None
+    cache = ImageCache(path)
+    if not cache.covers(resize_size, data_cfg.get('jpeg_draft', True), data_cfg.get('key_col', DEFAULT_KEY_COL)):
+        print(f"[CACHE][WARN] Image Cache {path} (min_side={cache.min_side}, draft={cache.meta.get('draft')}, "
+              f"key_col={cache.meta.get('key_col')}) passt nicht zu Resize {resize_size} / data Config – Decode von Disk")
+        return None
+    print(f"[CACHE] Image Cache: {path} ({cache.meta['count']} Bilder, min_side={cache.min_side})")
+    return cache
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Vorverarbeiteten uint8 Image Cache (data.cache) bauen')
+    ap.add_argument('--root', required=True, help='data.root')
+    ap.add_argument('--meta', required=True, help='data.meta_csv')
+    ap.add_argument('--out', required=True)
+    ap.add_argument('--min-side', type=int, default=None, help='kürzere Kante (Default int(image_size*1.15))')
+    ap.add_argument('--image-size', type=int, default=224)
+    ap.add_argument('--no-draft', action='store_true', help='volle Auflösung dekodieren (wie data.jpeg_draft: false)')
+    ap.add_argument('--key-col', default=DEFAULT_KEY_COL)
+    ap.add_argument('--workers', type=int, default=0, help='Prozesse (0 = alle Kerne)')
+    args = ap.parse_args()
+    min_side = args.min_side or int(args.image_size * 1.15)
+    meta = build_image_cache(args.root, args.meta, args.out, min_side, draft=not args.no_draft,
+                             key_col=args.key_col, workers=args.workers)
+    print(f"[CACHE] {meta['count']} Bilder, {meta['bytes'] / 1e6:.1f} MB, {meta['build_s']:.1f}s -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Single-pass inference collector for post-hoc reports.
+
+Runs a model once over a loader and keeps logits, labels and per-sample losses as
+numpy arrays. Test metrics, PR/ROC curves and misclassification exports are then
+computed from this cache instead of re-running (and re-decoding) the loader.
+
+Usage:
+res = collect_inference(model, val_loader, device, loss_fn=nn.CrossEntropyLoss(reduction='none'))
+res.save(out_dir / 'inference', 'val')   # val_logits.npy, val_labels.npy, val_losses.npy
+res = InferenceResults.load(out_dir / 'inference', 'val')
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+
+@dataclass
+class InferenceResults:
+    logits: np.ndarray  # (N, C) float32
+    labels: np.ndarray  # (N,) int64
+    losses: np.ndarray  # (N,) float32, per-sample loss (NaN if no loss_fn)
+
+    def __len__(self) -> int:
+        return int(self.labels.shape[0])
+
+    @property
+    def probs(self) -> np.ndarray:
+        z = self.logits - self.logits.max(axis=1, keepdims=True)
+        e = np.exp(z)
+        return e / e.sum(axis=1, keepdims=True)
+
+    @property
+    def preds(self) -> np.ndarray:
+        return self.logits.argmax(axis=1)
+
+    def mean_loss(self) -> float:
+        return float(self.losses.mean()) if len(self) else 0.0
+
+    def save(self, out_dir: Path, prefix: str):
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        np.save(out_dir / f'{prefix}_logits.npy', self.logits)
+        np.save(out_dir / f'{prefix}_labels.npy', self.labels)
+        np.save(out_dir / f'{prefix}_losses.npy', self.losses)
+
+    @classmethod
+    def load(cls, out_dir: Path, prefix: str) -> 'InferenceResults':
+        out_dir = Path(out_dir)
+        return cls(
+            logits=np.load(out_dir / f'{prefix}_logits.npy'),
+            labels=np.load(out_dir / f'{prefix}_labels.npy'),
+            losses=np.load(out_dir / f'{prefix}_losses.npy'),
+        )
+
+
+def collect_inference(model, loader, device, loss_fn: Optional[Callable] = None,
+                      max_batches: Optional[int] = None) -> InferenceResults:
+    """Run ``model`` once over ``loader`` (eval mode, no grad).
+
+    loss_fn must return per-sample losses (``reduction='none'``).
+    Outputs stay on the device until the end -> one host transfer per pass.
+    """
+    import torch  # local import for optional dependency
+    model.eval()
+    logits, labels, losses = [], [], []
+    with torch.no_grad():
+        for i, (x, y) in enumerate(loader):
+            if max_batches is not None and i >= max_batches:
+                break
+            x, y = x.to(device), y.to(device)
+            out = model(x).float()
+            logits.append(out)
+            labels.append(y)
+            if loss_fn is not None:
+                losses.append(loss_fn(out, y).float())
+    if not logits:
+        return InferenceResults(np.zeros((0, 0), np.float32), np.zeros((0,), np.int64), np.zeros((0,), np.float32))
+    logits_np = torch.cat(logits).cpu().numpy().astype(np.float32)
+    labels_np = torch.cat(labels).cpu().numpy().astype(np.int64)
+    if losses:
+        losses_np = torch.cat(losses).cpu().numpy().astype(np.float32)
+    else:
+        losses_np = np.full(labels_np.shape, np.nan, dtype=np.float32)
+    return InferenceResults(logits_np, labels_np, losses_np)
@@ -0,0 +1,154 @@
+"""DataLoader autotuning (``train.py --autotune-loader``).
+
+Benchmarks combinations of ``num_workers`` x ``batch_size`` with the real
+dataset, transforms and model (forward + backward, no optimizer step -> weights
+stay untouched) for a fixed number of steps each and picks the highest img/s.
+
+Only the steady state is timed: the first ``num_workers * prefetch_factor`` batches
+(worker spin-up + filling the prefetch queue, which hides loader cost) are warmup,
+then ``steps`` (default 200) batches are measured.
+
+Outputs (in the run dir):
+- loader_autotune.json: all candidates (img/s, data-wait share, worker startup time) + best
+- config_tuned.yaml: copy of the config with train.num_workers / train.batch_size replaced
+  (line-based, comments stay intact); ``--autotune-write-config`` updates the config in place
+
+Hinweis: batch_size beeinflusst die Optimierung (LR / Regularisierung) – ein größerer
+Batch mit höherem Durchsatz ist nicht automatisch das bessere Training. Mit
+``--autotune-batch-sizes <bs>`` wird nur die Worker-Anzahl getunt.
+"""
+from __future__ import annotations
+import os
+import re
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Kandidaten innerhalb von 3% des Bestwerts -> weniger Worker bevorzugen (RAM, Fork-Overhead)
+TIE_TOLERANCE = 0.03
+
+
+def candidate_workers(max_workers: Optional[int] = None) -> List[int]:
+    cpus = os.cpu_count() or 1
+    limit = cpus if max_workers is None else min(max_workers, cpus)
+    cands = {0}
+    w = 1
+    while w <= limit:
+        cands.add(w)
+        w *= 2
+    cands.add(limit)
+    return sorted(cands)
+
+
+def parse_int_list(spec: Optional[str]) -> Optional[List[int]]:
+    if not spec:
+        return None
+    return [int(v) for v in spec.split(',') if v.strip()]
+
+
+DEFAULT_STEPS = 200
+MIN_WARMUP = 3
+
+
+def warmup_steps(num_workers: int, prefetch_factor: int = 2) -> int:
+    """Batches until the prefetch queue is drained once (then the loader runs at steady state)."""
+    return max(MIN_WARMUP, num_workers * max(1, prefetch_factor) + 1)
+
+
+def benchmark_loader(make_loader: Callable[[int, int], object], step_fn: Callable, num_workers: int, batch_size: int,
+                     steps: int = DEFAULT_STEPS, warmup: Optional[int] = None, prefetch_factor: int = 2) -> Dict:
+    """Time ``steps`` batches (after ``warmup``, default: one prefetch window) of loader(num_workers, batch_size)."""
+    if warmup is None:
+        warmup = warmup_steps(num_workers, prefetch_factor)
+    loader = make_loader(num_workers, batch_size)
+    t0 = time.perf_counter()
+    it = iter(loader)
+    startup = None
+    wait = compute = 0.0
+    images = 0
+    done = 0
+    t_last = time.perf_counter()
+    while done < warmup + steps:
+        try:
+            x, y = next(it)
+        except StopIteration:
+            it = iter(loader)  # kleines Dataset: weitere Epoche
+            continue
+        t_data = time.perf_counter()
+        if startup is None:
+            startup = t_data - t0
+        step_fn(x, y)
+        t_done = time.perf_counter()
+        if done >= warmup:
+            wait += t_data - t_last
+            compute += t_done - t_data
+            images += x.size(0)
+        t_last = t_done
+        done += 1
+    del it, loader  # Worker beenden bevor der nächste Kandidat startet
+    total = wait + compute
+    return {
+        'num_workers': num_workers,
+        'batch_size': batch_size,
+        'img_per_s': images / total if total > 0 else 0.0,
+        'data_wait_share': wait / total if total > 0 else 0.0,
+        'startup_s': startup,
+        'steps': steps,
+        'warmup_steps': warmup,
+    }
+
+
+def autotune(make_loader: Callable[[int, int], object], step_fn: Callable, workers: Sequence[int],
+             batch_sizes: Sequence[int], steps: int = DEFAULT_STEPS, prefetch_factor: int = 2) -> Dict:
+    results = []
+    for bs in batch_sizes:
+        for nw in workers:
+            try:
+                r = benchmark_loader(make_loader, step_fn, nw, bs, steps, prefetch_factor=prefetch_factor)
+                print(f"[AUTOTUNE] workers={nw:>2} batch={bs:>4} -> {r['img_per_s']:.1f} img/s (data_wait {r['data_wait_share']*100:.0f}%, startup {r['startup_s']:.2f}s)")
+            except Exception as e:  # z.B. OOM bei großem Batch
+                r = {'num_workers': nw, 'batch_size': bs, 'img_per_s': 0.0, 'error': str(e)}
+                print(f"[AUTOTUNE][WARN] workers={nw} batch={bs} fehlgeschlagen: {e}")
+            results.append(r)
+    ok = [r for r in results if r['img_per_s'] > 0]
+    best = None
+    if ok:
+        top = max(r['img_per_s'] for r in ok)
+        near = [r for r in ok if r['img_per_s'] >= top * (1 - TIE_TOLERANCE)]
+        best = min(near, key=lambda r: (r['num_workers'], -r['img_per_s']))
+    return {'results': results, 'best': best, 'steps_per_candidate': steps}
+
+
+def update_yaml_section(text: str, section: str, updates: Dict[str, object]) -> str:
+    """Replace ``section.key`` scalars in YAML text line-by-line (keeps comments & layout)."""
+    lines = text.splitlines(keepends=True)
+    start = None
+    for i, line in enumerate(lines):
+        if re.match(rf'^{re.escape(section)}:\s*(#.*)?$', line.rstrip('\n')):
+            start = i
+            break
+    if start is None:
+        block = f'\n{section}:\n' + ''.join(f'  {k}: {v}\n' for k, v in updates.items())
+        return text.rstrip('\n') + '\n' + block
+    end = len(lines)
+    for j in range(start + 1, len(lines)):
+        if lines[j].strip() and not lines[j].startswith((' ', '\t', '#')):
+            end = j
+            break
+    pending = dict(updates)
+    for j in range(start + 1, end):
+        m = re.match(r'^(\s+)([A-Za-z0-9_]+):(\s*)([^#\n]*?)(\s*#.*)?(\n?)$', lines[j])
+        if m and m.group(2) in pending:
+            indent, key, sp, _, comment, nl = m.groups()
+            lines[j] = f"{indent}{key}:{sp or ' '}{pending.pop(key)}{comment or ''}{nl}"
+    if pending:
+        insert = ''.join(f'  {k}: {v}\n' for k, v in pending.items())
+        lines.insert(start + 1, insert)
+    return ''.join(lines)
+
+
+def write_tuned_config(config_path: Path, out_path: Path, best: Dict) -> Path:
+    text = Path(config_path).read_text(encoding='utf-8')
+    tuned = update_yaml_section(text, 'train', {'num_workers': best['num_workers'], 'batch_size': best['batch_size']})
+    Path(out_path).write_text(tuned, encoding='utf-8')
+    return Path(out_path)
@@ -5,41 +5,233 @@ tracker = MetricsTracker(num_classes)
 for batch:
     tracker.update(preds, labels)
 print(tracker.compute())
+
+update() never leaves the device: torch inputs are scattered into a pending
+confusion-count tensor on the same device, which is copied to the host once
+when ``cm`` / ``compute()`` is read (i.e. one sync per epoch, not per batch).
+
+Streaming accumulators (opt-in, constant memory – no logits are kept):
+tracker = MetricsTracker(num_classes, topk=(1, 3), score_bins=100, ece_bins=15, log_loss=True)
+- topk: top-k accuracy counters
+- score_bins: per-class histograms of the class score for positives / negatives
+  -> macro PR curve on the threshold grid k/score_bins (identical to
+  curves.macro_pr_curve with that grid) and approximate macro ROC AUC
+- ece_bins: reliability bins (count, summed confidence, correct) -> ECE
+- log_loss: summed negative log-likelihood of the true class
+Inputs are logits by default (``inputs='probs'`` for softmax outputs, e.g. TFLite).
+Index predictions (1-D) only update the confusion matrix.
 """
 from __future__ import annotations
 import numpy as np
 from dataclasses import dataclass
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Sequence
 
 @dataclass
 class MetricsResult:
     macro_f1: float
     per_class: Dict[int, Dict[str, float]]
     confusion: np.ndarray
+    topk: Optional[Dict[int, float]] = None
+    log_loss: Optional[float] = None
+    ece: Optional[float] = None
+    reliability: Optional[Dict[str, list]] = None
+    pr_curve: Optional[Dict[str, Any]] = None
+    roc_curve: Optional[Dict[str, Any]] = None
+
+    def streaming_summary(self) -> Dict[str, Any]:
+        """JSON-fähige Streaming-Metriken (nur gesetzte Felder)."""
+        out: Dict[str, Any] = {}
+        if self.topk is not None:
+            out['topk_accuracy'] = {str(k): v for k, v in self.topk.items()}
+        for key in ('log_loss', 'ece', 'reliability', 'pr_curve', 'roc_curve'):
+            if getattr(self, key) is not None:
+                out[key] = getattr(self, key)
+        return out
 
 class MetricsTracker:
-    def __init__(self, num_classes: int):
+    def __init__(self, num_classes: int, topk: Sequence[int] = (), score_bins: int = 0, ece_bins: int = 0,
+                 log_loss: bool = False, inputs: str = 'logits'):
         self.num_classes = num_classes
-        self.cm = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self._cm = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self._pending = None  # torch tensor (C*C+1,) on the prediction device; last bin = invalid pairs
+        self.topk = tuple(sorted({int(k) for k in topk if int(k) >= 1}))
+        self.score_bins = int(score_bins)
+        self.ece_bins = int(ece_bins)
+        self.log_loss = bool(log_loss)
+        self.inputs = inputs
+        self._acc = self._empty_acc()
+        self._pending_acc = None  # dict of torch tensors on the prediction device
+
+    @property
+    def streaming(self) -> bool:
+        return bool(self.topk or self.score_bins or self.ece_bins or self.log_loss)
+
+    def _empty_acc(self) -> Dict[str, np.ndarray]:
+        acc = {'n': np.zeros(1, dtype=np.int64)}
+        if self.topk:
+            acc['topk'] = np.zeros(len(self.topk), dtype=np.int64)
+        if self.score_bins:
+            # [Klasse, neg/pos, Bin]; Bin score_bins = Score exakt 1.0
+            acc['hist'] = np.zeros((self.num_classes, 2, self.score_bins + 1), dtype=np.int64)
+        if self.ece_bins:
+            acc['ece_count'] = np.zeros(self.ece_bins, dtype=np.int64)
+            acc['ece_conf'] = np.zeros(self.ece_bins, dtype=np.float64)
+            acc['ece_correct'] = np.zeros(self.ece_bins, dtype=np.int64)
+        if self.log_loss:
+            acc['nll'] = np.zeros(1, dtype=np.float64)
+        return acc
+
+    def accumulators(self) -> Dict[str, np.ndarray]:
+        """All additive state (confusion + streaming) – e.g. for all_reduce under DDP."""
+        self._flush()
+        return {'cm': self._cm, **self._acc}
+
+    def set_accumulators(self, acc: Dict[str, np.ndarray]):
+        # wie der cm Setter: ausstehende Device-Zähler gehören zum ersetzten Zustand
+        self._pending = None
+        self._pending_acc = None
+        self._cm = np.asarray(acc['cm'], dtype=np.int64)
+        self._acc = {k: np.asarray(v, dtype=self._acc[k].dtype).reshape(self._acc[k].shape) for k, v in acc.items() if k != 'cm'}
+
+    @property
+    def cm(self) -> np.ndarray:
+        self._flush()
+        return self._cm
+
+    @cm.setter
+    def cm(self, value):
+        # Setzt nur die Confusion -> Streaming-Zähler (geflusht oder nicht) passen nicht mehr dazu und
+        # werden geleert; vollständiger Restore inkl. Streaming über set_accumulators
+        self._pending = None
+        self._pending_acc = None
+        self._cm = np.asarray(value, dtype=np.int64)
+        self._acc = self._empty_acc()
+
+    def reset(self):
+        self._pending = None
+        self._cm = np.zeros((self.num_classes, self.num_classes), dtype=np.int64)
+        self._pending_acc = None
+        self._acc = self._empty_acc()
 
     def update(self, preds, labels):
         # preds: tensor (N, num_classes) logits or probs OR shape (N,) indices
         # labels: (N,)
+        # numpy inputs are counted directly via np.bincount(t*C+p)
+        n_cls = self.num_classes
+        if isinstance(preds, np.ndarray):
+            pred_idx = preds.argmax(axis=1) if preds.ndim == 2 else preds
+            t = np.asarray(labels, dtype=np.int64).reshape(-1)
+            p = np.asarray(pred_idx, dtype=np.int64).reshape(-1)
+            valid = (t >= 0) & (t < n_cls) & (p >= 0) & (p < n_cls)
+            self._cm += np.bincount(t[valid] * n_cls + p[valid], minlength=n_cls * n_cls).reshape(n_cls, n_cls)
+            if self.streaming and preds.ndim == 2:
+                self._update_streaming_np(np.asarray(preds, dtype=np.float64)[valid], t[valid])
+            return
         import torch  # local import for optional dependency
-        if preds.dim() == 2:
-            pred_idx = preds.argmax(dim=1)
+        pred_idx = preds.argmax(dim=1) if preds.dim() == 2 else preds
+        t = labels.detach().reshape(-1).long()
+        p = pred_idx.detach().reshape(-1).long().to(t.device)
+        valid = (t >= 0) & (t < n_cls) & (p >= 0) & (p < n_cls)
+        # Ungültige Paare in Überlauf-Bin statt Boolean-Indexing (das würde einen Device Sync erzwingen)
+        flat = torch.where(valid, t * n_cls + p, torch.full_like(t, n_cls * n_cls))
+        if self._pending is None or self._pending.device != flat.device:
+            self._flush()
+            self._pending = torch.zeros(n_cls * n_cls + 1, dtype=torch.int64, device=flat.device)
+        self._pending.scatter_add_(0, flat, torch.ones_like(flat))
+        if self.streaming and preds.dim() == 2:
+            self._update_streaming_torch(preds.detach(), t.to(preds.device), valid.to(preds.device))
+
+    def _update_streaming_np(self, scores: np.ndarray, t: np.ndarray):
+        acc = self._acc
+        if scores.shape[0] == 0:
+            return
+        if self.inputs == 'logits':
+            z = scores - scores.max(axis=1, keepdims=True)
+            logp = z - np.log(np.exp(z).sum(axis=1, keepdims=True))
+            probs = np.exp(logp)
         else:
-            pred_idx = preds
-        pred_idx = pred_idx.detach().cpu().numpy()
-        labels_np = labels.detach().cpu().numpy()
-        for p, t in zip(pred_idx, labels_np):
-            if 0 <= t < self.num_classes and 0 <= p < self.num_classes:
-                self.cm[t, p] += 1
+            probs = scores
+            logp = np.log(np.clip(scores, 1e-12, None))
+        rows = np.arange(t.size)
+        acc['n'] += t.size
+        if self.topk:
+            k_max = min(max(self.topk), self.num_classes)
+            top = np.argsort(-probs, axis=1, kind='stable')[:, :k_max]
+            hit = np.cumsum(top == t[:, None], axis=1) > 0
+            acc['topk'] += np.asarray([hit[:, min(k, k_max) - 1].sum() for k in self.topk], dtype=np.int64)
+        if self.score_bins:
+            b = np.clip(np.floor(probs * self.score_bins).astype(np.int64), 0, self.score_bins)
+            pos = (t[:, None] == np.arange(self.num_classes)[None, :]).astype(np.int64)
+            idx = (np.arange(self.num_classes)[None, :] * 2 + pos) * (self.score_bins + 1) + b
+            acc['hist'] += np.bincount(idx.ravel(), minlength=acc['hist'].size).reshape(acc['hist'].shape)
+        if self.ece_bins:
+            conf = probs.max(axis=1)
+            correct = probs.argmax(axis=1) == t
+            b = np.clip((conf * self.ece_bins).astype(np.int64), 0, self.ece_bins - 1)
+            acc['ece_count'] += np.bincount(b, minlength=self.ece_bins)
+            acc['ece_conf'] += np.bincount(b, weights=conf, minlength=self.ece_bins)
+            acc['ece_correct'] += np.bincount(b, weights=correct, minlength=self.ece_bins).astype(np.int64)
+        if self.log_loss:
+            acc['nll'] += -logp[rows, t].sum()
+
+    def _update_streaming_torch(self, scores, t, valid):
+        import torch
+        dev = scores.device
+        fdt = torch.float32 if dev.type == 'mps' else torch.float64  # MPS kennt kein float64
+        if self._pending_acc is None:
+            self._pending_acc = {k: torch.zeros(v.shape, dtype=torch.int64 if v.dtype == np.int64 else fdt, device=dev)
+                                 for k, v in self._acc.items()}
+        acc = self._pending_acc
+        scores = scores.float()
+        if self.inputs == 'logits':
+            logp = torch.log_softmax(scores, dim=1)
+            probs = logp.exp()
+        else:
+            probs = scores
+            logp = scores.clamp_min(1e-12).log()
+        tc = t.clamp(0, self.num_classes - 1)
+        vi = valid.long()
+        acc['n'] += vi.sum()
+        if self.topk:
+            k_max = min(max(self.topk), self.num_classes)
+            top = probs.topk(k_max, dim=1).indices
+            hit = (top == tc[:, None]).long().cumsum(dim=1).clamp_max(1) * vi[:, None]
+            acc['topk'] += hit[:, [min(k, k_max) - 1 for k in self.topk]].sum(dim=0)
+        if self.score_bins:
+            nb = self.score_bins + 1
+            b = (probs * self.score_bins).floor().long().clamp(0, self.score_bins)
+            cls = torch.arange(self.num_classes, device=dev)
+            pos = (tc[:, None] == cls[None, :]).long()
+            idx = (cls[None, :] * 2 + pos) * nb + b
+            flat = acc['hist'].view(-1)
+            flat.scatter_add_(0, idx.reshape(-1), vi[:, None].expand_as(idx).reshape(-1))
+        if self.ece_bins:
+            conf, pred = probs.max(dim=1)
+            b = (conf * self.ece_bins).long().clamp(0, self.ece_bins - 1)
+            acc['ece_count'].scatter_add_(0, b, vi)
+            acc['ece_conf'].scatter_add_(0, b, conf.to(fdt) * vi)
+            acc['ece_correct'].scatter_add_(0, b, (pred == tc).long() * vi)
+        if self.log_loss:
+            nll = -logp.gather(1, tc[:, None]).squeeze(1)
+            acc['nll'] += (nll.to(fdt) * vi).sum()
+
+    def _flush(self):
+        if self._pending_acc is not None:
+            for k, v in self._pending_acc.items():
+                self._acc[k] += v.cpu().numpy().astype(self._acc[k].dtype)
+            self._pending_acc = None
+        if self._pending is None:
+            return
+        n_cls = self.num_classes
+        counts = self._pending[:n_cls * n_cls].cpu().numpy().reshape(n_cls, n_cls)
+        self._pending = None
+        self._cm += counts
 
     def compute(self) -> MetricsResult:
-        tp = np.diag(self.cm).astype(float)
-        fp = self.cm.sum(axis=0) - tp
-        fn = self.cm.sum(axis=1) - tp
+        cm = self.cm
+        tp = np.diag(cm).astype(float)
+        fp = cm.sum(axis=0) - tp
+        fn = cm.sum(axis=1) - tp
         precision = np.divide(tp, tp + fp + 1e-9)
         recall = np.divide(tp, tp + fn + 1e-9)
         f1 = 2 * precision * recall / (precision + recall + 1e-9)
@@ -48,8 +240,28 @@ class MetricsTracker:
                 'precision': float(precision[i]),
                 'recall': float(recall[i]),
                 'f1': float(f1[i]),
-                'support': int(self.cm[i].sum())
+                'support': int(cm[i].sum())
             } for i in range(self.num_classes)
         }
         macro_f1 = float(np.nanmean(f1))
-        return MetricsResult(macro_f1=macro_f1, per_class=per_class, confusion=self.cm.copy())
+        res = MetricsResult(macro_f1=macro_f1, per_class=per_class, confusion=cm.copy())
+        n = int(self._acc['n'][0])
+        if not self.streaming or n == 0:
+            return res
+        acc = self._acc
+        if self.topk:
+            res.topk = {k: float(c) / n for k, c in zip(self.topk, acc['topk'])}
+        if self.log_loss:
+            res.log_loss = float(acc['nll'][0]) / n
+        if self.ece_bins:
+            cnt = acc['ece_count']
+            nz = cnt > 0
+            conf = np.where(nz, acc['ece_conf'] / np.maximum(cnt, 1), 0.0)
+            accu = np.where(nz, acc['ece_correct'] / np.maximum(cnt, 1), 0.0)
+            res.ece = float(np.sum(np.abs(accu - conf) * cnt) / n)
+            res.reliability = {'count': cnt.tolist(), 'confidence': conf.tolist(), 'accuracy': accu.tolist()}
+        if self.score_bins:
+            from curves import macro_pr_from_histograms, macro_roc_from_histograms
+            res.pr_curve = macro_pr_from_histograms(acc['hist'][:, 1], acc['hist'][:, 0])
+            res.roc_curve = macro_roc_from_histograms(acc['hist'][:, 1], acc['hist'][:, 0])
+        return res
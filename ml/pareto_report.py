@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Latency / accuracy Pareto report over the PTQ variants.
+
+Joins per variant:
+- accuracy from a compare_tflite_accuracy.py report (macro_f1, accuracy, deltas vs fp32)
+- latency from tflite_benchmark.benchmark_model (p50 / mean ms, random input, --threads)
+
+and writes ``pareto_report.json`` (+ ``pareto_report.md``):
+- ``pareto``: variants not dominated by another one (at most as slow AND at least as accurate, one strictly)
+- ``selected``: fastest variant (p50) whose macro F1 and accuracy drop vs fp32 stay within --max-drop (%)
+  -> used by generate_manifest.py instead of a fixed priority list
+
+Usage:
+  python ml/pareto_report.py --models-dir ml/outputs/run_001/quant \
+    --comparison artifacts/quant_eval/20250929_120000_tflite_eval.json --max-drop 3.0
+"""
+from __future__ import annotations
+import argparse, json, time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+VARIANT_FILES = {
+    'fp32': 'model_fp32.tflite',
+    'int8_dynamic': 'model_int8_dynamic.tflite',
+    'int8_full': 'model_int8_full.tflite',
+    'float16': 'model_float16.tflite',
+    'int16x8': 'model_int16x8.tflite',
+}
+
+
+def latest_comparison(report_glob: str) -> Optional[Path]:
+    paths = sorted(Path('.').glob(report_glob))
+    return paths[-1] if paths else None
+
+
+def within_drop(row: Dict, max_drop: float) -> bool:
+    if row['variant'] == 'fp32':
+        return True
+    d_f1, d_acc = row.get('delta_macro_f1_pct'), row.get('delta_accuracy_pct')
+    return d_f1 is not None and d_acc is not None and d_f1 >= -abs(max_drop) and d_acc >= -abs(max_drop)
+
+
+def pareto_front(rows: List[Dict], latency_key: str = 'p50_ms', score_key: str = 'macro_f1') -> List[str]:
+    """Variants not dominated in (lower latency, higher score)."""
+    front = []
+    for r in rows:
+        dominated = any(
+            o is not r and o[latency_key] <= r[latency_key] and o[score_key] >= r[score_key]
+            and (o[latency_key] < r[latency_key] or o[score_key] > r[score_key])
+            for o in rows)
+        if not dominated:
+            front.append(r['variant'])
+    return front
+
+
+def select_variant(rows: List[Dict], max_drop: float, latency_key: str = 'p50_ms') -> Optional[str]:
+    ok = [r for r in rows if within_drop(r, max_drop) and r.get(latency_key) is not None]
+    if not ok:
+        return None
+    return min(ok, key=lambda r: (r[latency_key], -r['macro_f1']))['variant']
+
+
+def build_rows(models_dir: Path, comparison: Dict, benchmark, warmup: int, iters: int, threads: int) -> List[Dict]:
+    rows = []
+    for variant, fname in VARIANT_FILES.items():
+        path = models_dir / fname
+        rep = comparison.get('reports', {}).get(variant)
+        if not path.exists() or rep is None:
+            continue
+        print(f'[PARETO] Benchmark {variant} ({fname}) ...')
+        lat = benchmark(path, warmup=warmup, iters=iters, num_threads=threads)
+        rows.append({
+            'variant': variant,
+            'file': fname,
+            'size_kb': round(path.stat().st_size / 1024, 2),
+            'macro_f1': rep['macro_f1'],
+            'accuracy': rep['accuracy'],
+            'delta_macro_f1_pct': rep.get('delta_macro_f1_pct', 0.0 if variant == 'fp32' else None),
+            'delta_accuracy_pct': rep.get('delta_accuracy_pct', 0.0 if variant == 'fp32' else None),
+            'p50_ms': round(lat['p50_ms'], 3),
+            'mean_ms': round(lat['mean_ms'], 3),
+            'p90_ms': round(lat['p90_ms'], 3),
+        })
+    return rows
+
+
+def to_markdown(report: Dict) -> str:
+    lines = ['| Variante | p50 ms | mean ms | Macro F1 | ΔF1 % | ΔAcc % | KB | Pareto | in Drop |',
+             '| --- | --- | --- | --- | --- | --- | --- | --- | --- |']
+    for r in sorted(report['rows'], key=lambda r: r['p50_ms']):
+        mark = ' **(gewählt)**' if r['variant'] == report['selected'] else ''
+        lines.append(f"| {r['variant']}{mark} | {r['p50_ms']:.2f} | {r['mean_ms']:.2f} | {r['macro_f1']:.4f} | "
+                     f"{r['delta_macro_f1_pct']} | {r['delta_accuracy_pct']} | {r['size_kb']} | "
+                     f"{'ja' if r['pareto'] else ''} | {'ja' if r['within_max_drop'] else 'nein'} |")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Latenz/Genauigkeit Pareto-Report der PTQ Varianten')
+    ap.add_argument('--models-dir', required=True)
+    ap.add_argument('--comparison', help='Pfad zu *_tflite_eval.json (Default: neuester unter --comparison-glob)')
+    ap.add_argument('--comparison-glob', default='artifacts/quant_eval/*_tflite_eval.json')
+    ap.add_argument('--max-drop', type=float, default=3.0, help='Max. Macro-F1 / Accuracy Drop in Prozent für die Auswahl')
+    ap.add_argument('--warmup', type=int, default=10)
+    ap.add_argument('--iters', type=int, default=50)
+    ap.add_argument('--threads', type=int, default=1, help='Interpreter Threads (1 ~ Mobile-Einzelkern)')
+    ap.add_argument('--out', default=None, help='Default: <models-dir>/pareto_report.json')
+    args = ap.parse_args()
+
+    models_dir = Path(args.models_dir)
+    comparison_path = Path(args.comparison) if args.comparison else latest_comparison(args.comparison_glob)
+    if comparison_path is None or not comparison_path.exists():
+        raise SystemExit('Kein Vergleichsreport gefunden – zuerst compare_tflite_accuracy.py ausführen.')
+    comparison = json.loads(comparison_path.read_text(encoding='utf-8'))
+
+    from tflite_benchmark import benchmark_model
+    rows = build_rows(models_dir, comparison, benchmark_model, args.warmup, args.iters, args.threads)
+    if not rows:
+        raise SystemExit('Keine Varianten mit Modell-Datei und Genauigkeitswerten gefunden.')
+    front = pareto_front(rows)
+    for r in rows:
+        r['pareto'] = r['variant'] in front
+        r['within_max_drop'] = within_drop(r, args.max_drop)
+    selected = select_variant(rows, args.max_drop)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'comparison': comparison_path.as_posix(),
+        'max_drop_pct': args.max_drop,
+        'latency': {'metric': 'p50_ms', 'threads': args.threads, 'warmup': args.warmup, 'iters': args.iters},
+        'rows': rows,
+        'pareto': front,
+        'selected': selected,
+        'selected_file': VARIANT_FILES.get(selected) if selected else None,
+    }
+    out = Path(args.out) if args.out else models_dir / 'pareto_report.json'
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    out.with_suffix('.md').write_text(to_markdown(report), encoding='utf-8')
+    print(to_markdown(report))
+    print(f'[PARETO] Auswahl: {selected} -> {out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Opt-in training performance modes (experiment config).
+
+experiment:
+  compile: false        # torch.compile des Modells (Fallback: eager)
+  compile_mode: default # default | reduce-overhead | max-autotune
+  channels_last: false  # NHWC Memory Format für Modell + Eingaben
+  cpu_bf16: false       # torch.autocast('cpu', bfloat16) – nur auf AVX512-BF16 / AMX Hosts
+
+Every mode degrades gracefully: if it is not supported (old torch, no compiler
+toolchain, CPU without BF16 instructions, CUDA device) it is switched off with a
+log line and the run continues in eager fp32. ``PerfModes.summary()`` lands in
+metrics_final.json together with the measured step time.
+
+Usage:
+modes = setup_performance(model, device, cfg.raw.get('experiment', {}))
+net = modes.wrap(model)            # forward via net, state_dict/export via model
+with modes.autocast():
+    out = net(modes.prepare_input(x))
+"""
+from __future__ import annotations
+import contextlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+BF16_CPU_FLAGS = ('avx512_bf16', 'amx_bf16')
+
+
+def cpu_flags() -> set:
+    """CPU feature flags from /proc/cpuinfo (empty set if unavailable, e.g. Windows/macOS)."""
+    try:
+        with open('/proc/cpuinfo', 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return set(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def cpu_supports_bf16() -> bool:
+    flags = cpu_flags()
+    if any(f in flags for f in BF16_CPU_FLAGS):
+        return True
+    if not flags:
+        # Kein /proc/cpuinfo -> oneDNN fragen (falls vorhanden)
+        try:
+            import torch
+            return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+        except Exception:
+            return False
+    return False
+
+
+@dataclass
+class PerfModes:
+    compile: bool = False
+    compile_mode: str = 'default'
+    channels_last: bool = False
+    cpu_bf16: bool = False
+    requested: Dict[str, Any] = field(default_factory=dict)
+    fallbacks: List[str] = field(default_factory=list)
+
+    def prepare_input(self, x):
+        if self.channels_last and x.dim() == 4:
+            return x.contiguous(memory_format=_torch().channels_last)
+        return x
+
+    def autocast(self):
+        if self.cpu_bf16:
+            return _torch().autocast(device_type='cpu', dtype=_torch().bfloat16)
+        return contextlib.nullcontext()
+
+    def wrap(self, model):
+        """Forward callable: compiled model (with eager fallback) or the model itself."""
+        if not self.compile:
+            return model
+        try:
+            return _CompiledForward(model, self)
+        except Exception as e:
+            print(f"[PERF][WARN] torch.compile nicht möglich – eager: {e}")
+            self.compile = False
+            self.fallbacks.append(f'compile: {type(e).__name__}')
+            return model
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'compile': self.compile,
+            'compile_mode': self.compile_mode if self.compile else None,
+            'channels_last': self.channels_last,
+            'cpu_bf16': self.cpu_bf16,
+            'requested': self.requested,
+            'fallbacks': self.fallbacks,
+        }
+
+
+def _torch():
+    import torch  # local import for optional dependency
+    return torch
+
+
+class _CompiledForward:
+    """Calls torch.compile(model); on the first compile/runtime error switches to eager for good.
+
+    Kein nn.Module -> model.state_dict() / Export bleiben unverändert (keine '_orig_mod.' Keys).
+    """
+
+    def __init__(self, model, modes: PerfModes):
+        self.model = model
+        self.modes = modes
+        self.compiled = _torch().compile(model, mode=modes.compile_mode)
+
+    def __call__(self, x):
+        if self.compiled is not None:
+            try:
+                return self.compiled(x)
+            except Exception as e:
+                print(f"[PERF][WARN] torch.compile fehlgeschlagen – Fallback auf eager: {type(e).__name__}: {e}")
+                self.compiled = None
+                self.modes.compile = False
+                self.modes.fallbacks.append(f'compile: {type(e).__name__}')
+        return self.model(x)
+
+
+def setup_performance(model, device: str, exp_cfg: Dict[str, Any]) -> PerfModes:
+    """Resolve requested modes against host/torch capabilities; applies channels_last to ``model``."""
+    torch = _torch()
+    requested = {
+        'compile': bool(exp_cfg.get('compile', False)),
+        'channels_last': bool(exp_cfg.get('channels_last', False)),
+        'cpu_bf16': bool(exp_cfg.get('cpu_bf16', False)),
+    }
+    modes = PerfModes(compile_mode=str(exp_cfg.get('compile_mode', 'default')), requested=requested)
+
+    if requested['channels_last']:
+        try:
+            model.to(memory_format=torch.channels_last)
+            modes.channels_last = True
+            print('[PERF] channels_last aktiviert')
+        except Exception as e:
+            modes.fallbacks.append(f'channels_last: {type(e).__name__}')
+            print(f"[PERF][WARN] channels_last nicht möglich: {e}")
+
+    if requested['cpu_bf16']:
+        if device != 'cpu':
+            modes.fallbacks.append('cpu_bf16: device != cpu')
+            print(f"[PERF][INFO] cpu_bf16 nur für device=cpu (aktuell {device}) – deaktiviert.")
+        elif not cpu_supports_bf16():
+            modes.fallbacks.append('cpu_bf16: no avx512_bf16/amx_bf16')
+            print('[PERF][INFO] CPU ohne AVX512-BF16/AMX – bf16 Autocast deaktiviert (Fallback fp32).')
+        else:
+            modes.cpu_bf16 = True
+            print('[PERF] CPU bfloat16 Autocast aktiviert')
+
+    if requested['compile']:
+        if not hasattr(torch, 'compile'):
+            modes.fallbacks.append('compile: torch < 2.0')
+            print('[PERF][INFO] torch.compile nicht verfügbar (torch < 2.0) – eager.')
+        else:
+            modes.compile = True
+            print(f"[PERF] torch.compile aktiviert (mode={modes.compile_mode}, kompiliert beim ersten Schritt)")
+    return modes
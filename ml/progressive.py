@@ -0,0 +1,61 @@
+"""Progressive resizing schedule for train.py (``train.progressive_resize``).
+
+Early epochs train at low resolution (cheap: cost ~ size^2), later epochs at the
+final ``model.image_size``. Validation / best.pt / export always use the final
+size, so metrics stay comparable across phases.
+
+Config:
+    train:
+      progressive_resize:
+        - {epoch: 1, size: 128, batch_size: 64}   # batch_size optional (Default train.batch_size)
+        - {epoch: 12, size: 160}
+        - {epoch: 24, size: 224}
+
+Per phase change train.py rebuilds the train transform (RandomResizedCrop /
+Resize target), the JPEG draft decode size and the train DataLoader (persistent
+workers hold a copy of the dataset and would keep the old transform).
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class ResizePhase:
+    epoch: int
+    size: int
+    batch_size: Optional[int] = None
+
+
+def parse_resize_schedule(train_cfg: Optional[Dict], image_size: int) -> List[ResizePhase]:
+    """Sorted phases; empty list = schedule disabled (always ``image_size``)."""
+    spec = (train_cfg or {}).get('progressive_resize') or []
+    phases = []
+    for entry in spec:
+        phases.append(ResizePhase(int(entry['epoch']), int(entry['size']),
+                                  int(entry['batch_size']) if entry.get('batch_size') else None))
+    phases.sort(key=lambda p: p.epoch)
+    if phases and phases[0].epoch > 1:
+        phases.insert(0, ResizePhase(1, phases[0].size, phases[0].batch_size))
+    for p in phases:
+        if p.size > image_size:
+            raise ValueError(f'progressive_resize: size {p.size} > model.image_size {image_size}')
+    return phases
+
+
+def phase_for_epoch(phases: List[ResizePhase], epoch: int) -> Optional[ResizePhase]:
+    current = None
+    for p in phases:
+        if p.epoch <= epoch:
+            current = p
+    return current
+
+
+def relative_cost(phases: List[ResizePhase], epochs: int, image_size: int) -> float:
+    """Approx. train compute vs. always ``image_size`` (pixels per epoch, 1.0 = no savings)."""
+    if not phases or epochs <= 0:
+        return 1.0
+    total = 0.0
+    for e in range(1, epochs + 1):
+        total += (phase_for_epoch(phases, e).size / image_size) ** 2
+    return total / epochs
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""Structured channel pruning for mobilenet_v3_small (physical removal, export-ready).
+
+Prunable groups (block inputs/outputs and residual widths stay untouched):
+- expansion channels of every InvertedResidual with an expand conv
+  (expand 1x1 conv + BN -> depthwise conv + BN -> SE fc1 in / fc2 out -> project 1x1 conv in)
+- hidden units of the classifier (classifier[0] out -> classifier[3] in)
+
+Importance per channel (``prune.importance``):
+- ``l1``: L1 norm of the expand conv filter (classifier: row of classifier[0])
+- ``bn``: |gamma| of the BN after the expand conv (classifier: falls back to l1)
+
+Per group the ``ratio`` least important channels are removed; the kept count is rounded up
+to a multiple of ``round_to`` (SIMD friendly widths for XNNPACK / TFLite). Layers are rebuilt
+with the kept channels only, so the exported ONNX / TFLite graph is actually smaller – no masks,
+no zero weights.
+
+The result is described by a ``prune_spec`` ({group name: kept channel count}); checkpoints of
+pruned runs store it next to the weights. Every checkpoint consumer (eval, benchmark_infer,
+export_model, grad_cam, distill teacher) goes through ``load_pruned_checkpoint``: it rebuilds the
+architecture with ``apply_prune_spec`` and loads strictly, so a mismatch fails instead of
+silently leaving layers at their init weights.
+
+Fine-tuning runs through the normal training loop:
+    python ml/train.py --config ml/configs/baseline.yaml --out ml/outputs/run_001_pruned \
+        --prune-from ml/outputs/run_001/best.pt
+One-shot (no fine-tuning) + report only:
+    python ml/prune.py --config ml/configs/baseline.yaml --checkpoint ml/outputs/run_001/best.pt \
+        --ratio 0.3 --out ml/outputs/run_001_pruned_oneshot
+"""
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+IMPORTANCE = ('l1', 'bn')
+
+
+def _block_layers(block: nn.Module) -> Optional[Tuple[nn.Conv2d, nn.BatchNorm2d, nn.Conv2d, nn.BatchNorm2d,
+                                                      Optional[nn.Module], nn.Conv2d]]:
+    """(expand conv, expand bn, dw conv, dw bn, se, project conv) or None if the block has no expand conv."""
+    layers = list(block.block)
+    if len(layers) < 3:
+        return None
+    expand, dw = layers[0], layers[1]
+    if not (isinstance(expand[0], nn.Conv2d) and expand[0].groups == 1 and expand[0].kernel_size == (1, 1)):
+        return None
+    if not (isinstance(dw[0], nn.Conv2d) and dw[0].groups == dw[0].in_channels > 1):
+        return None
+    se = layers[2] if hasattr(layers[2], 'fc1') else None
+    project = layers[-1]
+    return expand[0], expand[1], dw[0], dw[1], se, project[0]
+
+
+def prunable_groups(model: nn.Module) -> Dict[str, int]:
+    """Group name -> current channel count."""
+    groups: Dict[str, int] = {}
+    for i, block in enumerate(getattr(model, 'features', [])):
+        if hasattr(block, 'block') and _block_layers(block) is not None:
+            groups[f'features.{i}'] = _block_layers(block)[0].out_channels
+    cls = getattr(model, 'classifier', None)
+    if isinstance(cls, nn.Sequential) and len(cls) == 4 and isinstance(cls[0], nn.Linear):
+        groups['classifier'] = cls[0].out_features
+    return groups
+
+
+def channel_importance(model: nn.Module, group: str, importance: str = 'l1') -> torch.Tensor:
+    if importance not in IMPORTANCE:
+        raise ValueError(f'Unbekannte Importance {importance!r} (erlaubt: {IMPORTANCE})')
+    if group == 'classifier':
+        return model.classifier[0].weight.detach().abs().sum(dim=1)
+    conv, bn = _block_layers(model.get_submodule(group))[:2]
+    if importance == 'bn':
+        return bn.weight.detach().abs()
+    return conv.weight.detach().abs().flatten(1).sum(dim=1)
+
+
+def kept_count(channels: int, ratio: float, round_to: int = 8, min_channels: int = 8) -> int:
+    keep = channels * (1.0 - ratio)
+    if round_to > 1:
+        keep = -(-int(round(keep)) // round_to) * round_to
+    return int(min(channels, max(min_channels, keep)))
+
+
+def _slice_conv(conv: nn.Conv2d, out_idx: Optional[torch.Tensor] = None, in_idx: Optional[torch.Tensor] = None,
+                depthwise: bool = False) -> nn.Conv2d:
+    w = conv.weight.detach()
+    b = conv.bias.detach() if conv.bias is not None else None
+    if out_idx is not None:
+        w = w[out_idx]
+        b = b[out_idx] if b is not None else None
+    if in_idx is not None and not depthwise:
+        w = w[:, in_idx]
+    out_ch = w.shape[0]
+    in_ch = out_ch if depthwise else w.shape[1]
+    new = nn.Conv2d(in_ch, out_ch, conv.kernel_size, stride=conv.stride, padding=conv.padding,
+                    dilation=conv.dilation, groups=out_ch if depthwise else 1, bias=b is not None)
+    new.weight.data.copy_(w)
+    if b is not None:
+        new.bias.data.copy_(b)
+    return new.to(conv.weight.device)
+
+
+def _slice_bn(bn: nn.BatchNorm2d, idx: torch.Tensor) -> nn.BatchNorm2d:
+    new = nn.BatchNorm2d(len(idx), eps=bn.eps, momentum=bn.momentum).to(bn.weight.device)
+    for name in ('weight', 'bias'):
+        getattr(new, name).data.copy_(getattr(bn, name).detach()[idx])
+    new.running_mean.copy_(bn.running_mean[idx])
+    new.running_var.copy_(bn.running_var[idx])
+    new.num_batches_tracked.copy_(bn.num_batches_tracked)
+    return new.train(bn.training)
+
+
+def _slice_linear(lin: nn.Linear, out_idx: Optional[torch.Tensor] = None,
+                  in_idx: Optional[torch.Tensor] = None) -> nn.Linear:
+    w = lin.weight.detach()
+    b = lin.bias.detach() if lin.bias is not None else None
+    if out_idx is not None:
+        w = w[out_idx]
+        b = b[out_idx] if b is not None else None
+    if in_idx is not None:
+        w = w[:, in_idx]
+    new = nn.Linear(w.shape[1], w.shape[0], bias=b is not None).to(lin.weight.device)
+    new.weight.data.copy_(w)
+    if b is not None:
+        new.bias.data.copy_(b)
+    return new
+
+
+def prune_group(model: nn.Module, group: str, keep_idx: torch.Tensor) -> None:
+    """Physically keep only ``keep_idx`` channels of ``group`` (in place)."""
+    keep_idx = torch.sort(keep_idx).values
+    if group == 'classifier':
+        model.classifier[0] = _slice_linear(model.classifier[0], out_idx=keep_idx)
+        model.classifier[3] = _slice_linear(model.classifier[3], in_idx=keep_idx)
+        return
+    layers = model.get_submodule(group).block
+    expand, dw = layers[0], layers[1]
+    expand[0] = _slice_conv(expand[0], out_idx=keep_idx)
+    expand[1] = _slice_bn(expand[1], keep_idx)
+    dw[0] = _slice_conv(dw[0], out_idx=keep_idx, depthwise=True)
+    dw[1] = _slice_bn(dw[1], keep_idx)
+    if hasattr(layers[2], 'fc1'):
+        se = layers[2]
+        se.fc1 = _slice_conv(se.fc1, in_idx=keep_idx)
+        se.fc2 = _slice_conv(se.fc2, out_idx=keep_idx)
+    project = layers[len(layers) - 1]
+    project[0] = _slice_conv(project[0], in_idx=keep_idx)
+
+
+def prune_model(model: nn.Module, ratio: float, importance: str = 'l1', round_to: int = 8,
+                min_channels: int = 8, skip: Optional[List[str]] = None) -> Dict[str, int]:
+    """Structured pruning of all prunable groups by ``ratio``; returns the prune_spec."""
+    spec: Dict[str, int] = {}
+    for group, channels in prunable_groups(model).items():
+        if group in (skip or []):
+            continue
+        keep = kept_count(channels, ratio, round_to, min_channels)
+        if keep < channels:
+            scores = channel_importance(model, group, importance)
+            prune_group(model, group, torch.topk(scores, keep).indices)
+        spec[group] = keep
+    return spec
+
+
+def apply_prune_spec(model: nn.Module, spec: Dict[str, int]) -> nn.Module:
+    """Rebuild the pruned architecture (weights are placeholders until load_state_dict)."""
+    groups = prunable_groups(model)
+    for group, keep in spec.items():
+        if group not in groups:
+            raise KeyError(f'prune_spec Gruppe {group!r} passt nicht zum Modell')
+        if keep < groups[group]:
+            prune_group(model, group, torch.arange(keep))
+    return model
+
+
+def count_params(model: nn.Module) -> int:
+    return int(sum(p.numel() for p in model.parameters()))
+
+
+def cpu_latency_ms(model: nn.Module, image_size: int, iters: int = 50, warmup: int = 10,
+                   threads: int = 1) -> Dict[str, float]:
+    """Batch-1 CPU latency of a deep copy on CPU (perf_counter, ``threads`` intra-op threads)."""
+    import copy
+    m = copy.deepcopy(model).cpu().eval()
+    x = torch.randn(1, 3, image_size, image_size)
+    prev = torch.get_num_threads()
+    torch.set_num_threads(max(1, threads))
+    try:
+        with torch.inference_mode():
+            for _ in range(warmup):
+                m(x)
+            times = []
+            for _ in range(iters):
+                t0 = time.perf_counter()
+                m(x)
+                times.append((time.perf_counter() - t0) * 1000)
+    finally:
+        torch.set_num_threads(prev)
+    times.sort()
+    return {'p50_ms': round(statistics.median(times), 3), 'mean_ms': round(statistics.fmean(times), 3),
+            'p90_ms': round(times[int(0.9 * (len(times) - 1))], 3), 'threads': threads, 'iters': iters}
+
+
+def export_sizes(model: nn.Module, image_size: int, out_dir: Path, tflite: bool = True) -> Dict[str, Optional[float]]:
+    """ONNX export (+ fp32 TFLite via quantize_ptq if onnx2tf / tensorflow are installed) -> sizes in KB."""
+    import copy
+    out_dir.mkdir(parents=True, exist_ok=True)
+    onnx_path = out_dir / 'model.onnx'
+    m = copy.deepcopy(model).cpu().eval()
+    torch.onnx.export(m, torch.randn(1, 3, image_size, image_size), onnx_path.as_posix(),
+                      input_names=['input'], output_names=['logits'], opset_version=17)
+    sizes: Dict[str, Optional[float]] = {'onnx_kb': round(onnx_path.stat().st_size / 1024, 2), 'tflite_kb': None,
+                                         'tflite_error': None}
+    if not tflite:
+        return sizes
+    try:
+        from quantize_ptq import convert_variant, get_saved_model
+        saved_model, _ = get_saved_model(onnx_path, out_dir, '')
+        _, res = convert_variant(('fp32', saved_model.as_posix(), (out_dir / 'model_fp32.tflite').as_posix(), None))
+        sizes['tflite_kb'], sizes['tflite_error'] = res['size_kb'], res['error']
+    except BaseException as e:  # onnx2tf fehlt -> onnx_to_saved_model beendet mit SystemExit
+        sizes['tflite_error'] = str(e) or type(e).__name__
+    return sizes
+
+
+def model_stats(model: nn.Module, image_size: int, work_dir: Path, tflite: bool = True,
+                latency_iters: int = 50, threads: int = 1) -> Dict:
+    stats = {'params': count_params(model)}
+    try:
+        stats.update(export_sizes(model, image_size, work_dir, tflite=tflite))
+    except Exception as e:
+        stats['export_error'] = str(e)
+    stats['cpu_latency'] = cpu_latency_ms(model, image_size, iters=latency_iters, threads=threads)
+    return stats
+
+
+def compare_stats(before: Dict, after: Dict) -> Dict:
+    def ratio(a, b):
+        return round(b / a, 4) if a and b is not None else None
+    return {
+        'params_ratio': ratio(before['params'], after['params']),
+        'onnx_size_ratio': ratio(before.get('onnx_kb'), after.get('onnx_kb')),
+        'tflite_size_ratio': ratio(before.get('tflite_kb'), after.get('tflite_kb')),
+        'latency_speedup': ratio(after['cpu_latency']['p50_ms'], before['cpu_latency']['p50_ms']),
+    }
+
+
+def print_report(report: Dict) -> None:
+    b, a, c = report['before'], report['after'], report['change']
+    print(f"[PRUNE] Parameter: {b['params']:,} -> {a['params']:,} (x{c['params_ratio']})")
+    if b.get('onnx_kb') is not None and a.get('onnx_kb') is not None:
+        print(f"[PRUNE] ONNX: {b['onnx_kb']:.1f} KB -> {a['onnx_kb']:.1f} KB")
+    if b.get('tflite_kb') is not None and a.get('tflite_kb') is not None:
+        print(f"[PRUNE] TFLite fp32: {b['tflite_kb']:.1f} KB -> {a['tflite_kb']:.1f} KB")
+    else:
+        reason = a.get('export_error') or a.get('tflite_error') or b.get('tflite_error') or 'deaktiviert'
+        print(f"[PRUNE] TFLite Größe nicht gemessen ({reason})")
+    print(f"[PRUNE] CPU Latenz p50: {b['cpu_latency']['p50_ms']:.2f} ms -> {a['cpu_latency']['p50_ms']:.2f} ms "
+          f"(Speedup x{c['latency_speedup']})")
+
+
+def prune_config(cfg_raw: Dict) -> Dict:
+    p = dict(cfg_raw.get('prune', {}) or {})
+    return {
+        'ratio': float(p.get('ratio', 0.3)),
+        'importance': p.get('importance', 'l1'),
+        'round_to': int(p.get('round_to', 8)),
+        'min_channels': int(p.get('min_channels', 8)),
+        'skip': list(p.get('skip', []) or []),
+        'finetune_epochs': int(p.get('finetune_epochs', 8)),
+        'lr': p.get('lr'),
+        'report_tflite': bool(p.get('report_tflite', True)),
+        'latency_iters': int(p.get('latency_iters', 50)),
+        'latency_threads': int(p.get('latency_threads', 1)),
+    }
+
+
+def build_model(num_classes: int) -> nn.Module:
+    from torchvision import models
+    model = models.mobilenet_v3_small(weights=None)
+    model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
+    return model
+
+
+def checkpoint_state_dict(ckpt: Dict) -> Dict[str, torch.Tensor]:
+    """Weights of a checkpoint dict (train.py: 'model', distill.py: 'model_state') or a plain state_dict."""
+    for key in ('model', 'model_state'):
+        if isinstance(ckpt.get(key), dict):
+            return ckpt[key]
+    return ckpt
+
+
+def load_pruned_checkpoint(model: nn.Module, ckpt: Dict) -> nn.Module:
+    """Apply ``ckpt['prune_spec']`` (if any) and load the weights (strict).
+
+    QAT checkpoints (``ckpt['qat']``) return a new prepared module (qat.load_qat_checkpoint) –
+    always use the return value.
+    """
+    if ckpt.get('prune_spec'):
+        apply_prune_spec(model, ckpt['prune_spec'])
+    if ckpt.get('qat'):
+        from qat import load_qat_checkpoint
+        return load_qat_checkpoint(model, ckpt, checkpoint_state_dict(ckpt))
+    model.load_state_dict(checkpoint_state_dict(ckpt))
+    return model
+
+
+def main():
+    import yaml
+    ap = argparse.ArgumentParser(description='Strukturiertes Channel-Pruning (One-Shot) + Größen/Latenz Report')
+    ap.add_argument('--config', required=True)
+    ap.add_argument('--checkpoint', required=True, help='best.pt des Ausgangsmodells')
+    ap.add_argument('--out', required=True)
+    ap.add_argument('--ratio', type=float, default=None, help='Override prune.ratio')
+    ap.add_argument('--importance', choices=IMPORTANCE, default=None, help='Override prune.importance')
+    ap.add_argument('--no-tflite', action='store_true', help='TFLite Größe nicht messen')
+    args = ap.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        raw = yaml.safe_load(f)
+    pcfg = prune_config(raw)
+    if args.ratio is not None:
+        pcfg['ratio'] = args.ratio
+    if args.importance:
+        pcfg['importance'] = args.importance
+    image_size = raw.get('model', {}).get('image_size', 224)
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    ckpt = torch.load(args.checkpoint, map_location='cpu')
+    if ckpt.get('qat'):
+        raise SystemExit('[PRUNE] Float-Checkpoint erwartet (QAT best.pt: erst prunen, dann QAT)')
+    num_classes = checkpoint_state_dict(ckpt)['classifier.3.weight'].shape[0]
+    model = load_pruned_checkpoint(build_model(num_classes), ckpt).eval()
+    tflite = pcfg['report_tflite'] and not args.no_tflite
+    with tempfile.TemporaryDirectory() as tmp:
+        before = model_stats(model, image_size, Path(tmp), tflite, pcfg['latency_iters'], pcfg['latency_threads'])
+    spec = prune_model(model, pcfg['ratio'], pcfg['importance'], pcfg['round_to'], pcfg['min_channels'], pcfg['skip'])
+    after = model_stats(model, image_size, out_dir, tflite, pcfg['latency_iters'], pcfg['latency_threads'])
+    torch.save({'model': model.state_dict(), 'prune_spec': spec, 'epoch': 0}, out_dir / 'pruned.pt')
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'source': args.checkpoint, 'finetuned': False,
+              'config': pcfg, 'prune_spec': spec, 'before': before, 'after': after,
+              'change': compare_stats(before, after)}
+    (out_dir / 'prune_report.json').write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print_report(report)
+    print(f"[PRUNE] Ohne Fine-Tuning -> {out_dir / 'pruned.pt'}; Fine-Tuning: train.py --prune-from {args.checkpoint}")
+
+
+if __name__ == '__main__':
+    main()
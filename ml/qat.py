@@ -0,0 +1,156 @@
+"""Quantization-aware training (QAT) for train.py --qat-from.
+
+Flow:
+1. Trained checkpoint (optionally pruned, ``prune_spec`` is honoured) is loaded into the float model.
+2. ``prepare_qat`` (torch.ao FX graph mode) fuses Conv+BN(+ReLU) and inserts FakeQuantize modules:
+   activations per-tensor uint8 (0..255), weights int8 symmetric (per-channel by default, like
+   TFLite full-int8). Backend ``qnnpack`` (ARM / mobile) or ``fbgemm`` (x86) selects the
+   operator patterns of the default QAT qconfig mapping and ``torch.backends.quantized.engine``.
+3. The regular train.py loop fine-tunes ``qat.epochs`` epochs; ``update_qat_state`` freezes BN
+   statistics and observers (scale / zero point) at the configured epochs.
+4. ``export_qat_onnx``:
+   - ``model.onnx``: float graph (fake quant off) with the QAT weights -> quantize_ptq.py int8_full
+     calibrates it like before, but the weights are already robust to int8 rounding.
+     This is the deployment input (TFLite int8 via quantize_ptq / compare_tflite_accuracy).
+   - ``model_qat_qdq.onnx``: QuantizeLinear/DequantizeLinear graph with the learned scales
+     (ONNX Runtime / QDQ-aware converters)
+
+QAT checkpoints (best.pt with ``qat``) hold the state_dict of the prepared GraphModule;
+``load_qat_checkpoint`` (used by ``prune.load_pruned_checkpoint``) re-runs ``prepare_qat`` with the
+stored config before a strict load.
+
+Plain ``FakeQuantize`` is used instead of the fused default (FusedMovingAvgObsFakeQuantize),
+because only the former exports to ONNX.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+import torch.nn as nn
+
+QAT_BACKENDS = ('qnnpack', 'fbgemm')
+
+
+def qat_config(cfg_raw: Dict) -> Dict:
+    q = dict(cfg_raw.get('qat', {}) or {})
+    backend = q.get('backend', 'qnnpack')
+    if backend not in QAT_BACKENDS:
+        raise ValueError(f'qat.backend {backend!r} nicht unterstützt (erlaubt: {QAT_BACKENDS})')
+    return {
+        'backend': backend,
+        'epochs': int(q.get('epochs', 3)),
+        'lr': q.get('lr', 0.0001),
+        'per_channel': bool(q.get('per_channel', True)),
+        'freeze_bn_epoch': int(q.get('freeze_bn_epoch', 2)),
+        'freeze_observer_epoch': int(q.get('freeze_observer_epoch', 3)),
+        'export_qdq': bool(q.get('export_qdq', True)),
+    }
+
+
+def qat_qconfig(per_channel: bool = True):
+    from torch.ao.quantization import (FakeQuantize, MovingAverageMinMaxObserver,
+                                       MovingAveragePerChannelMinMaxObserver, QConfig)
+    activation = FakeQuantize.with_args(observer=MovingAverageMinMaxObserver, quant_min=0, quant_max=255,
+                                        dtype=torch.quint8, qscheme=torch.per_tensor_affine)
+    if per_channel:
+        weight = FakeQuantize.with_args(observer=MovingAveragePerChannelMinMaxObserver, quant_min=-128, quant_max=127,
+                                        dtype=torch.qint8, qscheme=torch.per_channel_symmetric, ch_axis=0)
+    else:
+        weight = FakeQuantize.with_args(observer=MovingAverageMinMaxObserver, quant_min=-128, quant_max=127,
+                                        dtype=torch.qint8, qscheme=torch.per_tensor_symmetric)
+    return QConfig(activation=activation, weight=weight)
+
+
+def qconfig_mapping(backend: str, per_channel: bool = True):
+    """Default QAT mapping of ``backend`` with every fused default qconfig replaced by ``qat_qconfig``.
+
+    Fixed-qparams ops (hardsigmoid, sigmoid, ...) keep their fixed scales.
+    """
+    from torch.ao.quantization import get_default_qat_qconfig, get_default_qat_qconfig_mapping
+    mapping = get_default_qat_qconfig_mapping(backend)
+    default = get_default_qat_qconfig(backend)
+    qconfig = qat_qconfig(per_channel)
+    for op, qc in list(mapping.object_type_qconfigs.items()):
+        if qc is not None and qc == default:
+            mapping.set_object_type(op, qconfig)
+    return mapping.set_global(qconfig)
+
+
+def prepare_qat(model: nn.Module, backend: str, per_channel: bool, example_input: torch.Tensor) -> nn.Module:
+    from torch.ao.quantization.quantize_fx import prepare_qat_fx
+    if backend in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = backend
+    else:
+        print(f'[QAT][WARN] Backend {backend} auf diesem Host nicht verfügbar – nur Fake-Quant Simulation')
+    model.train()
+    return prepare_qat_fx(model, qconfig_mapping(backend, per_channel), (example_input,))
+
+
+def count_fake_quant(model: nn.Module) -> int:
+    from torch.ao.quantization import FakeQuantizeBase
+    return sum(1 for m in model.modules() if isinstance(m, FakeQuantizeBase))
+
+
+def update_qat_state(model: nn.Module, epoch: int, qcfg: Dict) -> List[str]:
+    """Freeze BN statistics / observers once ``epoch`` (1-based) reaches the configured epoch (0 = never)."""
+    from torch.ao.nn.intrinsic.qat import freeze_bn_stats
+    from torch.ao.quantization import disable_observer
+    done = []
+    if qcfg['freeze_bn_epoch'] and epoch >= qcfg['freeze_bn_epoch']:
+        model.apply(freeze_bn_stats)
+        done.append('bn_stats')
+    if qcfg['freeze_observer_epoch'] and epoch >= qcfg['freeze_observer_epoch']:
+        model.apply(disable_observer)
+        done.append('observer')
+    return done
+
+
+def load_qat_checkpoint(model: nn.Module, ckpt: Dict, state_dict: Dict, image_size: int = 224) -> nn.Module:
+    """Float ``model`` (prune_spec already applied) -> prepared QAT model with the checkpoint weights (strict).
+
+    Observers and BN statistics are frozen, the model is in eval mode: inference sees exactly the
+    scales of the end of training (fake quant on, like model_qat_qdq.onnx).
+    """
+    from torch.ao.nn.intrinsic.qat import freeze_bn_stats
+    from torch.ao.quantization import disable_observer
+    qcfg = ckpt['qat']
+    device = next(model.parameters()).device
+    prepared = prepare_qat(model, qcfg['backend'], qcfg['per_channel'],
+                           torch.randn(1, 3, image_size, image_size, device=device))
+    prepared.load_state_dict(state_dict)
+    prepared.apply(disable_observer)
+    prepared.apply(freeze_bn_stats)
+    return prepared.eval()
+
+
+def _onnx_export(model: nn.Module, dummy: torch.Tensor, path: Path) -> None:
+    kwargs = dict(input_names=['input'], output_names=['logits'], opset_version=17)
+    try:
+        torch.onnx.export(model, dummy, path.as_posix(), dynamo=False, **kwargs)  # FakeQuantize -> Q/DQ nur im TorchScript Exporter
+    except TypeError:  # torch < 2.5 kennt kein dynamo Argument
+        torch.onnx.export(model, dummy, path.as_posix(), **kwargs)
+
+
+def export_qat_onnx(model: nn.Module, dummy: torch.Tensor, out_dir: Path, export_qdq: bool = True) -> Dict:
+    """model_qat_qdq.onnx (fake quant on) + model.onnx (fake quant off); observers stay frozen."""
+    from torch.ao.quantization import disable_fake_quant, disable_observer, enable_fake_quant
+    model.eval()
+    model.apply(disable_observer)
+    files = {}
+    with torch.no_grad():
+        if export_qdq:
+            qdq = out_dir / 'model_qat_qdq.onnx'
+            try:
+                _onnx_export(model, dummy, qdq)
+                files['qdq'] = qdq.name
+                print(f'[QAT] ONNX (QuantizeLinear/DequantizeLinear): {qdq}')
+            except Exception as e:
+                print(f'[QAT][WARN] QDQ Export fehlgeschlagen: {e}')
+        model.apply(disable_fake_quant)
+        try:
+            _onnx_export(model, dummy, out_dir / 'model.onnx')
+            files['float'] = 'model.onnx'
+        finally:
+            model.apply(enable_fake_quant)
+    return files
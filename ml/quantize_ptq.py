@@ -4,9 +4,15 @@
 Pipeline (configurable):
 1. Input ONNX model (optionally simplified)
 2. Convert ONNX -> TensorFlow (onnx2tf) OR abort with message if missing
-3. Convert TF SavedModel -> TFLite FP32
-4. Dynamic Range Quantization (int8 weights, float activations)
-5. (Optional) Full Int8 PTQ with representative dataset
+   - content-addressed cache (--conversion-cache): key = ONNX sha256 + onnx2tf/tensorflow/onnx
+     versions; unchanged models skip onnx2tf entirely
+3. Variant matrix from the one shared SavedModel, each variant in its own process (--jobs):
+   - fp32
+   - int8_dynamic (int8 weights, float activations)
+   - int8_full (representative dataset, uint8 in/out)
+   - float16 (float16 weights)
+   - int16x8 (int16 activations, int8 weights; representative dataset)
+   Select with --variants (default: all); per-variant conversion time in ptq_report.json
 
 Usage Example:
   python ml/quantize_ptq.py \
@@ -17,21 +23,24 @@ Usage Example:
 
 Notes:
 - Requires: onnx, onnx2tf, tensorflow (>=2.10), Pillow
-- Representative dataset: small subset of real preprocessed images (unaltered original resolution ok; resized inside script)
+- Representative dataset: stratified per class (ml/representative_set.py), preprocessed in parallel
+  and cached as .npy keyed by file list + image size (--repr-cache), streamed to the converter
 - For performance-critical mobile deployment, verify accuracy drop < ~3% macro F1.
 """
 from __future__ import annotations
-import argparse, os, sys, json, random
+import argparse, os, sys, json, hashlib, multiprocessing, shutil, time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 try:
     import numpy as np
-    from PIL import Image
 except ImportError:
-    print('[ERROR] Benötigt numpy & Pillow')
+    print('[ERROR] Benötigt numpy')
     sys.exit(1)
 
+from representative_set import load_or_build, representative_gen, select_stratified
+
 # Optional deps; we guard imports
 try:
     import onnx
@@ -39,45 +48,164 @@ except ImportError:
     onnx = None  # type: ignore
 
 
-def collect_images(root: Path, limit: int) -> List[Path]:
-    img_ext = {'.jpg','.jpeg','.png','.bmp','.webp'}
-    all_imgs = []
-    for p in root.rglob('*'):
-        if p.suffix.lower() in img_ext:
-            all_imgs.append(p)
-    random.shuffle(all_imgs)
-    return all_imgs[:limit]
+# Varianten-Matrix: Name -> Dateiname (Namen wie in compare_tflite_accuracy / generate_manifest)
+VARIANT_FILES = {
+    'fp32': 'model_fp32.tflite',
+    'int8_dynamic': 'model_int8_dynamic.tflite',
+    'int8_full': 'model_int8_full.tflite',
+    'float16': 'model_float16.tflite',
+    'int16x8': 'model_int16x8.tflite',
+}
+NEEDS_REPR = {'int8_full', 'int16x8'}
+DEFAULT_VARIANTS = 'fp32,int8_dynamic,int8_full,float16,int16x8'
+CONVERSION_VERSION = 1  # erhöhen, wenn sich die onnx2tf Aufrufparameter ändern
 
 
-def build_representative_gen(image_paths: List[Path], image_size: int):
-    def gen():
-        import tensorflow as tf  # delayed import
-        for p in image_paths:
-            try:
-                img = Image.open(p).convert('RGB')
-                img = img.resize((image_size, image_size))
-                arr = np.array(img).astype(np.float32) / 255.0
-                # Use same normalization as training (ImageNet stats)
-                mean = np.array([0.485,0.456,0.406])
-                std = np.array([0.229,0.224,0.225])
-                arr = (arr/1.0 - mean) / std
-                arr = np.expand_dims(np.transpose(arr, (2,0,1)), 0)  # NCHW -> convert to expected? Need NHWC for TF
-                # TFLite expects NHWC typically
-                arr = np.transpose(arr, (0,2,3,1))
-                yield [arr.astype(np.float32)]
-            except Exception:
-                continue
-    return gen
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open('rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def converter_versions() -> dict:
+    from importlib.metadata import version, PackageNotFoundError
+    out = {}
+    for pkg in ('onnx2tf', 'tensorflow', 'onnx'):
+        try:
+            out[pkg] = version(pkg)
+        except PackageNotFoundError:
+            out[pkg] = None
+    return out
+
+
+def saved_model_key(onnx_sha: str, versions: dict) -> str:
+    payload = json.dumps({'onnx_sha256': onnx_sha, 'versions': versions, 'v': CONVERSION_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def onnx_to_saved_model(onnx_path: Path, target: Path):
+    # onnx2tf CLI style invocation programmatically:
+    from onnx2tf import convert
+    convert(
+        input_onnx_file_path=onnx_path.as_posix(),
+        output_folder_path=target.as_posix(),
+        copy_onnx_input_output_names_to_tflite=True,
+        non_verbose=True
+    )
+
+
+def get_saved_model(onnx_path: Path, out_dir: Path, cache_root: str) -> Tuple[Path, dict]:
+    """ONNX -> TF SavedModel, content-addressed by ONNX sha256 + converter versions.
+
+    Cache hit: no onnx2tf run at all. Without cache root: convert into <out>/tf_model (old behaviour).
+    """
+    t0 = time.perf_counter()
+    onnx_sha = file_sha256(onnx_path)
+    versions = converter_versions()
+    info = {'onnx_sha256': onnx_sha, 'versions': versions, 'cache_hit': False}
+    if not cache_root:
+        target = out_dir / 'tf_model'
+        if target.exists():
+            print('[WARN] Überschreibe bestehendes tf_model Verzeichnis')
+        onnx_to_saved_model(onnx_path, target)
+        info['seconds'] = round(time.perf_counter() - t0, 2)
+        return target, info
+    key = saved_model_key(onnx_sha, versions)
+    entry = Path(cache_root) / key
+    target = entry / 'tf_model'
+    info['key'] = key
+    if (entry / 'done.json').exists():
+        info['cache_hit'] = True
+        info['seconds'] = round(time.perf_counter() - t0, 2)
+        print(f'[CACHE] SavedModel wiederverwendet: {target}')
+        return target, info
+    tmp = Path(cache_root) / f'{key}.tmp{os.getpid()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    onnx_to_saved_model(onnx_path, tmp / 'tf_model')
+    (tmp / 'done.json').write_text(json.dumps({'onnx': onnx_path.resolve().as_posix(), **info}, indent=2), encoding='utf-8')
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp, entry)  # atomar: halbfertige Konvertierungen werden nie gefunden
+    info['seconds'] = round(time.perf_counter() - t0, 2)
+    return target, info
+
+
+def convert_variant(args) -> Tuple[str, dict]:
+    """One TFLite variant from the shared SavedModel (runs in its own process)."""
+    variant, saved_model, out_path, repr_npy = args
+    t0 = time.perf_counter()
+    try:
+        import tensorflow as tf
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model)
+        if variant != 'fp32':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if variant in NEEDS_REPR:
+            converter.representative_dataset = representative_gen(np.load(repr_npy, mmap_mode='r'))
+        if variant == 'int8_full':
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.uint8
+            converter.inference_output_type = tf.uint8
+        elif variant == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == 'int16x8':
+            # int16 Aktivierungen / int8 Gewichte, Ein-/Ausgabe bleiben float32
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.EXPERIMENTAL_TFLITE_BUILTINS_ACTIVATIONS_INT16_WEIGHTS_INT8]
+        Path(out_path).write_bytes(converter.convert())
+        return variant, {'file': Path(out_path).name, 'size_kb': round(Path(out_path).stat().st_size / 1024, 2),
+                         'convert_seconds': round(time.perf_counter() - t0, 2), 'error': None}
+    except Exception as e:
+        return variant, {'file': None, 'size_kb': None, 'convert_seconds': round(time.perf_counter() - t0, 2),
+                         'error': str(e)}
+
+
+def run_variant_matrix(variants: List[str], saved_model: Path, out_dir: Path, repr_npy: Optional[str],
+                       jobs: int) -> Dict[str, dict]:
+    tasks = [(v, saved_model.as_posix(), (out_dir / VARIANT_FILES[v]).as_posix(), repr_npy) for v in variants]
+    if jobs <= 1 or len(tasks) <= 1:
+        return dict(convert_variant(t) for t in tasks)
+    # spawn: jeder Prozess lädt TF + SavedModel selbst (TF ist nicht fork-sicher)
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as ex:
+        return dict(ex.map(convert_variant, tasks))
+
+
+def prepare_representative(args, out_dir: Path) -> Optional[str]:
+    """Path to a float32 NHWC .npy for converters needing calibration (cached or <out>/representative.npy)."""
+    if not args.repr_dir:
+        return None
+    rep_dir = Path(args.repr_dir)
+    if not rep_dir.exists():
+        print('[WARN] repr-dir nicht gefunden, überspringe kalibrierte Varianten.')
+        return None
+    imgs = select_stratified(rep_dir, args.count, args.repr_seed, args.repr_meta)
+    if not imgs:
+        print('[WARN] Keine repräsentativen Bilder gefunden.')
+        return None
+    arr = load_or_build(imgs, args.image_size, args.repr_cache or None, args.repr_workers)
+    if not len(arr):
+        return None
+    if isinstance(arr, np.memmap):
+        return Path(arr.filename).as_posix()
+    path = out_dir / 'representative.npy'
+    np.save(path, arr)
+    return path.as_posix()
 
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--onnx', required=True, help='Pfad zum (vereinfachten) ONNX Modell')
-    ap.add_argument('--repr-dir', help='Verzeichnis mit Repräsentativbildern (optional für Full Int8)')
+    ap.add_argument('--repr-dir', help='Verzeichnis mit Repräsentativbildern (optional für Full Int8 / int16x8)')
     ap.add_argument('--count', type=int, default=128, help='Max Anzahl Repräsentativbilder')
+    ap.add_argument('--repr-meta', help='optional meta.csv (filename,label) für stratifizierte Auswahl je Klasse (sonst Unterordner von --repr-dir)')
+    ap.add_argument('--repr-seed', type=int, default=0, help='Seed für die Auswahl je Klasse')
+    ap.add_argument('--repr-cache', default='ml/cache/repr', help='Cache für vorverarbeitete Repräsentativbilder (.npy); "" = aus')
+    ap.add_argument('--repr-workers', type=int, default=0, help='Prozesse für das Preprocessing (0 = alle Kerne)')
     ap.add_argument('--image-size', type=int, default=224)
     ap.add_argument('--out', required=True, help='Ausgabeverzeichnis')
     ap.add_argument('--no-dynamic', action='store_true', help='Dynamic Range Quantization überspringen')
+    ap.add_argument('--variants', default=DEFAULT_VARIANTS, help=f'Komma-Liste aus {",".join(VARIANT_FILES)}')
+    ap.add_argument('--jobs', type=int, default=0, help='Parallele Konvertierungs-Prozesse (0 = min(Varianten, Kerne), 1 = seriell)')
+    ap.add_argument('--conversion-cache', default='ml/cache/onnx2tf', help='Cache für onnx2tf SavedModels (Key: ONNX sha256 + Versionen); "" = aus')
     # Optional: direkt nach PTQ Genauigkeitsvergleich ausführen
     ap.add_argument('--compare-meta', help='meta.csv für Test/Val zur automatischen Genauigkeitsprüfung (optional)')
     ap.add_argument('--compare-data-root', help='Wurzelverzeichnis der Bilder für Vergleich')
@@ -85,6 +213,7 @@ def main():
     ap.add_argument('--compare-max-drop', type=float, default=3.0, help='Max Macro-F1 Drop (Prozent) für Auto-Vergleich')
     ap.add_argument('--compare-script', default='ml/compare_tflite_accuracy.py', help='Pfad zum Vergleichsskript')
     ap.add_argument('--compare-strict', action='store_true', help='Fehlercode wenn Schwelle überschritten')
+    ap.add_argument('--compare-eval-cache', default='ml/cache/eval_tflite', help='Dekodierter Eval Cache für den Vergleich (gleicher Default wie ci_gate.py)')
     args = ap.parse_args()
 
     onnx_path = Path(args.onnx)
@@ -95,88 +224,66 @@ def main():
     out_dir = Path(args.out)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # STEP 1: Convert ONNX -> TF (onnx2tf)
+    variants = [v.strip() for v in args.variants.split(',') if v.strip()]
+    unknown = [v for v in variants if v not in VARIANT_FILES]
+    if unknown:
+        print('[ERROR] Unbekannte Varianten:', ', '.join(unknown))
+        sys.exit(1)
+    if args.no_dynamic and 'int8_dynamic' in variants:
+        variants.remove('int8_dynamic')
+
+    # STEP 1: Convert ONNX -> TF (onnx2tf), content-addressed Cache
     try:
         import onnx2tf  # type: ignore
     except ImportError:
         print('[ERROR] onnx2tf nicht installiert. Install: pip install onnx2tf tensorflow')
         sys.exit(1)
+    try:
+        import tensorflow as tf  # noqa: F401 – Verfügbarkeit prüfen, Konvertierung in Worker-Prozessen
+    except ImportError:
+        print('[ERROR] tensorflow nicht installiert.')
+        sys.exit(1)
 
     print('[INFO] Konvertiere ONNX -> TF SavedModel ...')
-    tf_model_dir = out_dir / 'tf_model'
-    if tf_model_dir.exists():
-        print('[WARN] Überschreibe bestehendes tf_model Verzeichnis')
-    # onnx2tf CLI style invocation programmatically:
     try:
-        from onnx2tf import convert
-        convert(
-            input_onnx_file_path=onnx_path.as_posix(),
-            output_folder_path=tf_model_dir.as_posix(),
-            copy_onnx_input_output_names_to_tflite=True,
-            non_verbose=True
-        )
+        tf_model_dir, sm_info = get_saved_model(onnx_path, out_dir, args.conversion_cache)
     except Exception as e:
         print('[ERROR] ONNX->TF Konvertierung fehlgeschlagen:', e)
         sys.exit(1)
+    source = 'Cache' if sm_info['cache_hit'] else f"{sm_info['seconds']}s"
+    print(f'[OK] SavedModel: {tf_model_dir} ({source})')
 
-    # STEP 2: TF -> TFLite (FP32)
-    try:
-        import tensorflow as tf
-    except ImportError:
-        print('[ERROR] tensorflow nicht installiert.')
-        sys.exit(1)
-    print('[INFO] Konvertiere TF -> TFLite (FP32) ...')
-    converter = tf.lite.TFLiteConverter.from_saved_model(tf_model_dir.as_posix())
-    tflite_fp32 = converter.convert()
-    fp32_path = out_dir / 'model_fp32.tflite'
-    fp32_path.write_bytes(tflite_fp32)
-    print(f'[OK] FP32 TFLite gespeichert: {fp32_path.name} ({fp32_path.stat().st_size/1024:.1f} KB)')
-
-    results = {
-        'fp32_size_kb': round(fp32_path.stat().st_size/1024,2),
-        'int8_dynamic_size_kb': None,
-        'int8_full_size_kb': None
-    }
-
-    # STEP 3: Dynamic Range Quantization (optional skip)
-    if not args.no_dynamic:
-        print('[INFO] Dynamic Range Quantization ...')
-        converter = tf.lite.TFLiteConverter.from_saved_model(tf_model_dir.as_posix())
-        converter.optimizations = [tf.lite.Optimize.DEFAULT]
-        try:
-            tflite_dr = converter.convert()
-            dr_path = out_dir / 'model_int8_dynamic.tflite'
-            dr_path.write_bytes(tflite_dr)
-            results['int8_dynamic_size_kb'] = round(dr_path.stat().st_size/1024,2)
-            print(f'[OK] Dynamic Int8 gespeichert: {dr_path.name} ({results['int8_dynamic_size_kb']} KB)')
-        except Exception as e:
-            print('[WARN] Dynamic Quant fehlgeschlagen:', e)
-
-    # STEP 4: Full Int8 (Representative) wenn Verzeichnis vorhanden
-    if args.repr_dir:
-        rep_dir = Path(args.repr_dir)
-        if rep_dir.exists():
-            imgs = collect_images(rep_dir, args.count)
-            if imgs:
-                print(f'[INFO] Full Int8 PTQ mit {len(imgs)} repr. Bildern ...')
-                converter = tf.lite.TFLiteConverter.from_saved_model(tf_model_dir.as_posix())
-                converter.optimizations = [tf.lite.Optimize.DEFAULT]
-                converter.representative_dataset = build_representative_gen(imgs, args.image_size)
-                converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
-                converter.inference_input_type = tf.uint8
-                converter.inference_output_type = tf.uint8
-                try:
-                    tflite_full = converter.convert()
-                    full_path = out_dir / 'model_int8_full.tflite'
-                    full_path.write_bytes(tflite_full)
-                    results['int8_full_size_kb'] = round(full_path.stat().st_size/1024,2)
-                    print(f'[OK] Full Int8 gespeichert: {full_path.name} ({results['int8_full_size_kb']} KB)')
-                except Exception as e:
-                    print('[WARN] Full Int8 Quant fehlgeschlagen:', e)
-            else:
-                print('[WARN] Keine repräsentativen Bilder gefunden für Full Int8.')
+    # STEP 2: Kalibrierdaten (nur für int8_full / int16x8)
+    repr_npy = prepare_representative(args, out_dir) if NEEDS_REPR & set(variants) else None
+    if repr_npy is None:
+        skipped = [v for v in variants if v in NEEDS_REPR]
+        if skipped:
+            print(f"[WARN] Ohne repräsentatives Set übersprungen: {', '.join(skipped)}")
+        variants = [v for v in variants if v not in NEEDS_REPR]
+
+    # STEP 3: Varianten-Matrix parallel aus demselben SavedModel
+    jobs = args.jobs or min(len(variants), os.cpu_count() or 1)
+    print(f"[INFO] Konvertiere Varianten {', '.join(variants)} ({jobs} Prozesse) ...")
+    t_matrix = time.perf_counter()
+    variant_results = run_variant_matrix(variants, tf_model_dir, out_dir, repr_npy, jobs)
+    for name, r in variant_results.items():
+        if r['error']:
+            print(f"[WARN] {name} fehlgeschlagen: {r['error']}")
         else:
-            print('[WARN] repr-dir nicht gefunden, überspringe Full Int8.')
+            print(f"[OK] {name}: {r['file']} ({r['size_kb']} KB, {r['convert_seconds']}s)")
+    if variant_results.get('fp32', {}).get('error') or 'fp32' not in variant_results:
+        print('[ERROR] FP32 Konvertierung fehlgeschlagen – Baseline fehlt.')
+        sys.exit(1)
+
+    results = {f'{v}_size_kb': variant_results.get(v, {}).get('size_kb') for v in ('fp32', 'int8_dynamic', 'int8_full')}
+    results.update({
+        'variants': variant_results,
+        'saved_model': {**sm_info, 'dir': tf_model_dir.as_posix()},
+        'matrix_wall_seconds': round(time.perf_counter() - t_matrix, 2),
+        'jobs': jobs,
+    })
+    if repr_npy is not None:
+        results['representative_count'] = int(len(np.load(repr_npy, mmap_mode='r')))
 
     with open(out_dir / 'ptq_report.json', 'w', encoding='utf-8') as f:
         json.dump(results, f, indent=2)
@@ -198,7 +305,8 @@ def main():
                 '--classes', args.compare_classes,
                 '--image-size', str(args.image_size),
                 '--max-macro-f1-drop', str(args.compare_max_drop),
-                '--max-accuracy-drop', str(args.compare_max_drop)
+                '--max-accuracy-drop', str(args.compare_max_drop),
+                '--eval-cache', args.compare_eval_cache
             ]
             if args.compare_strict:
                 cmd.append('--strict')
@@ -0,0 +1,179 @@
+"""Representative dataset for Full Int8 PTQ: stratified selection + cached preprocessing.
+
+Selection (``select_stratified``):
+- Class of an image = label column of ``--repr-meta`` (meta.csv) if given, otherwise its
+  first directory below ``--repr-dir`` (``<root>/<label>/<file>``); files directly in the
+  root form one group.
+- Each class list is sorted and shuffled with a fixed seed, then classes are drawn
+  round-robin until ``count`` images are selected -> every class is represented
+  (up to its size) and the same inputs give the same set on every run.
+
+Preprocessing cache (``load_or_build``):
+- Images are decoded / resized / normalized in a process pool into one float32 NHWC
+  array ``<cache_dir>/<key>.npy`` (+ ``<key>.json`` with the file list).
+- key = sha1 over the selected file list (path, size, mtime), image_size, normalization
+  and preprocessing version -> unchanged images skip decoding entirely.
+- Calibration images are always decoded at full resolution (no JPEG draft, independent of
+  LEAFSENSE_JPEG_DRAFT): the int8 scales are derived from exactly the pixels of the former
+  inline generator.
+- ``representative_gen`` streams batches from the memory-mapped array to the TFLite converter.
+
+Standalone:
+    python ml/representative_set.py --repr-dir datasets/plant_v1/images --count 256 --image-size 224
+"""
+from __future__ import annotations
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from image_io import open_rgb
+
+IMG_EXT = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+PREPROCESS_VERSION = 2  # erhöhen, wenn sich preprocess_repr ändert (2: Full-Decode statt JPEG Draft)
+MEAN = np.array([0.485, 0.456, 0.406])
+STD = np.array([0.229, 0.224, 0.225])
+
+
+def group_by_class(root: Path, meta_csv: Optional[Path] = None) -> Dict[str, List[Path]]:
+    groups: Dict[str, List[Path]] = {}
+    if meta_csv is not None:
+        with Path(meta_csv).open('r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                label, fname = row['label'].strip(), row['filename'].strip()
+                p = root / label / fname
+                if not p.exists():
+                    p = root / fname
+                if p.exists() and p.suffix.lower() in IMG_EXT:
+                    groups.setdefault(label, []).append(p)
+        return groups
+    for p in root.rglob('*'):
+        if p.suffix.lower() in IMG_EXT:
+            rel = p.relative_to(root).parts
+            groups.setdefault(rel[0] if len(rel) > 1 else '', []).append(p)
+    return groups
+
+
+def select_stratified(root: Union[str, Path], count: int, seed: int = 0,
+                      meta_csv: Optional[Union[str, Path]] = None) -> List[Path]:
+    """Round-robin over classes (seeded shuffle per class) until ``count`` images."""
+    groups = group_by_class(Path(root), Path(meta_csv) if meta_csv else None)
+    rng = random.Random(seed)
+    queues = []
+    for label in sorted(groups):
+        paths = sorted(groups[label])
+        rng.shuffle(paths)
+        queues.append(paths)
+    selected: List[Path] = []
+    depth = 0
+    while len(selected) < count and any(depth < len(q) for q in queues):
+        for q in queues:
+            if depth < len(q) and len(selected) < count:
+                selected.append(q[depth])
+        depth += 1
+    return selected
+
+
+def preprocess_repr(path: Union[str, Path], image_size: int) -> np.ndarray:
+    """Same transform as the former inline generator: resize to square, ImageNet normalization, HWC float32."""
+    img = open_rgb(path)  # volle Auflösung, kein Draft -> identische Pixel wie der alte Generator
+    img = img.resize((image_size, image_size))
+    arr = np.array(img).astype(np.float32) / 255.0
+    arr = (arr / 1.0 - MEAN) / STD
+    return arr.astype(np.float32)
+
+
+def _preprocess_safe(args) -> Optional[np.ndarray]:
+    path, image_size = args
+    try:
+        return preprocess_repr(path, image_size)
+    except Exception:
+        return None  # unlesbare Bilder werden wie bisher übersprungen
+
+
+def repr_cache_key(paths: List[Path], image_size: int) -> str:
+    h = hashlib.sha1()
+    for p in paths:
+        st = p.stat()
+        h.update(f'{p.resolve().as_posix()}|{st.st_size}|{st.st_mtime_ns}\n'.encode('utf-8'))
+    h.update(json.dumps({'image_size': int(image_size), 'mean': MEAN.tolist(), 'std': STD.tolist(),
+                         'version': PREPROCESS_VERSION}, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def build_array(paths: List[Path], image_size: int, workers: int = 0) -> Tuple[np.ndarray, List[Path]]:
+    workers = workers or (os.cpu_count() or 1)
+    jobs = [(p.as_posix(), image_size) for p in paths]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            arrays = list(ex.map(_preprocess_safe, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        arrays = [_preprocess_safe(j) for j in jobs]
+    kept = [(p, a) for p, a in zip(paths, arrays) if a is not None]
+    if not kept:
+        return np.zeros((0, image_size, image_size, 3), dtype=np.float32), []
+    return np.stack([a for _, a in kept]), [p for p, _ in kept]
+
+
+def load_or_build(paths: List[Path], image_size: int, cache_dir: Optional[Union[str, Path]] = None,
+                  workers: int = 0) -> np.ndarray:
+    """Float32 [N, H, W, 3]; from ``<cache_dir>/<key>.npy`` (memmap) if present, else built in parallel."""
+    if cache_dir is None:
+        arr, _ = build_array(paths, image_size, workers)
+        return arr
+    cache_dir = Path(cache_dir)
+    key = repr_cache_key(paths, image_size)
+    npy, info = cache_dir / f'{key}.npy', cache_dir / f'{key}.json'
+    if npy.exists() and info.exists():
+        print(f'[REPR] Cache wiederverwendet: {npy}')
+        return np.load(npy, mmap_mode='r')
+    t0 = time.perf_counter()
+    arr, kept = build_array(paths, image_size, workers)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = cache_dir / f'{key}.tmp.npy'
+    np.save(tmp, arr)
+    os.replace(tmp, npy)
+    info.write_text(json.dumps({
+        'image_size': int(image_size),
+        'count': len(kept),
+        'skipped': len(paths) - len(kept),
+        'files': [p.as_posix() for p in kept],
+        'build_s': round(time.perf_counter() - t0, 3),
+    }, indent=2), encoding='utf-8')
+    print(f'[REPR] {len(kept)} Bilder vorverarbeitet ({time.perf_counter() - t0:.1f}s) -> {npy}')
+    return np.load(npy, mmap_mode='r')
+
+
+def representative_gen(array: np.ndarray, batch_size: int = 1) -> Callable:
+    """TFLite ``representative_dataset`` callable streaming NHWC batches from ``array``."""
+    def gen():
+        for s in range(0, len(array), batch_size):
+            yield [np.ascontiguousarray(array[s:s + batch_size], dtype=np.float32)]
+    return gen
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Repräsentatives Set (stratifiziert) vorverarbeiten und cachen')
+    ap.add_argument('--repr-dir', required=True)
+    ap.add_argument('--repr-meta', default=None, help='optional meta.csv (Spalten filename,label) für die Klassenzuordnung')
+    ap.add_argument('--count', type=int, default=128)
+    ap.add_argument('--image-size', type=int, default=224)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--cache-dir', default='ml/cache/repr')
+    ap.add_argument('--workers', type=int, default=0, help='Prozesse (0 = alle Kerne)')
+    args = ap.parse_args()
+    paths = select_stratified(args.repr_dir, args.count, args.seed, args.repr_meta)
+    arr = load_or_build(paths, args.image_size, args.cache_dir, args.workers)
+    print(f'[REPR] {len(arr)} Bilder, Shape {tuple(arr.shape)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Stable, group-aware train/val/test splits via hash bucketing.
+
+Every sample gets a 64-bit id (blake2b of its key, default ``path`` = relative image path;
+meta.csv rows without a ``path`` column use ``<label>/<filename>``, so equal file names in
+different label folders never collide).
+The split of a sample is decided by hashing its group key (default ``plant_id``,
+fallback: sample key) together with a salt (``data.split``, e.g. ``split_v1``):
+
+    u = blake2b(salt + '/' + group) / 2**64  in [0, 1)
+    u < test_ratio                 -> test
+    u < test_ratio + val_ratio     -> val
+    sonst                          -> train
+
+Properties:
+- Stable under dataset growth: adding rows to meta.csv never moves an existing sample.
+- Group-aware: all images of one plant land in the same split (no leakage).
+- Stratified in expectation: the hash is independent of the label, so every class
+  is split ~ratio-wise; ``split_stats`` reports the actual per-class ratios.
+- Memory light: a split index is three uint64 arrays (8 bytes / sample);
+  PlantDataset(ids=...) streams meta.csv and only materializes its own rows.
+
+Files:
+- ``split_index.npz`` (build_splits.py / build_dataset_snapshot.py / ``python ml/splits.py``):
+  arrays train/val/test (uint64 ids) + meta json (salt, ratios, key/group column)
+- alternatively a directory with train.csv/val.csv/test.csv (snapshot) whose key column is hashed on load
+"""
+from __future__ import annotations
+import argparse
+import csv
+import hashlib
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+SPLITS = ('train', 'val', 'test')
+DEFAULT_KEY_COL = 'path'
+DEFAULT_GROUP_COL = 'plant_id'
+
+
+def sample_id(key: str) -> int:
+    """Stable 64-bit id of a sample key (independent of PYTHONHASHSEED / row order)."""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def bucket(group: str, salt: str) -> float:
+    return sample_id(f'{salt}/{group}') / 2.0 ** 64
+
+
+def assign_split(group: str, val_ratio: float, test_ratio: float, salt: str) -> str:
+    u = bucket(group, salt)
+    if u < test_ratio:
+        return 'test'
+    if u < test_ratio + val_ratio:
+        return 'val'
+    return 'train'
+
+
+def row_key(row: Dict[str, str], key_col: str = DEFAULT_KEY_COL) -> str:
+    key = (row.get(key_col) or '').strip()
+    if key:
+        return key
+    fname = (row.get('filename') or '').strip()
+    label = (row.get('label') or '').strip()
+    if key_col == DEFAULT_KEY_COL and fname and label:
+        return f'{label}/{fname}'  # relativer Pfad wie PlantDataset (<root>/<label>/<filename>)
+    return fname or (row.get('path') or '').strip()
+
+
+def row_group(row: Dict[str, str], key_col: str = DEFAULT_KEY_COL, group_col: str = DEFAULT_GROUP_COL) -> str:
+    g = (row.get(group_col) or '').strip()
+    return g if g else row_key(row, key_col)
+
+
+def build_split_index(rows: Iterable[Dict[str, str]], val_ratio: float = 0.15, test_ratio: float = 0.15,
+                      salt: str = 'split_v1', key_col: str = DEFAULT_KEY_COL,
+                      group_col: str = DEFAULT_GROUP_COL) -> Tuple[Dict[str, np.ndarray], Dict]:
+    ids = {s: [] for s in SPLITS}
+    for row in rows:
+        key = row_key(row, key_col)
+        if not key:
+            continue
+        ids[assign_split(row_group(row, key_col, group_col), val_ratio, test_ratio, salt)].append(sample_id(key))
+    arrays = {s: np.unique(np.asarray(v, dtype=np.uint64)) for s, v in ids.items()}
+    meta = {'strategy': 'hash', 'salt': salt, 'val_ratio': val_ratio, 'test_ratio': test_ratio,
+            'key_col': key_col, 'group_col': group_col}
+    return arrays, meta
+
+
+def split_rows(rows: Iterable[Dict[str, str]], val_ratio: float, test_ratio: float, salt: str,
+               key_col: str = DEFAULT_KEY_COL, group_col: str = DEFAULT_GROUP_COL) -> Dict[str, list]:
+    """Rows grouped per split (for tools that write CSV/TXT split files)."""
+    out = {s: [] for s in SPLITS}
+    for row in rows:
+        out[assign_split(row_group(row, key_col, group_col), val_ratio, test_ratio, salt)].append(row)
+    return out
+
+
+def save_split_index(path: Union[str, Path], arrays: Dict[str, np.ndarray], meta: Dict):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, meta=np.array(json.dumps(meta)), **{s: arrays[s] for s in SPLITS})
+
+
+def load_split_index(path: Union[str, Path], key_col: str = DEFAULT_KEY_COL) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Load ``split_index.npz`` or a directory with train/val/test .csv (snapshot) -> id arrays."""
+    path = Path(path)
+    if path.is_dir():
+        arrays = {}
+        for s in SPLITS:
+            csv_path = path / f'{s}.csv'
+            if not csv_path.exists():
+                raise FileNotFoundError(f'Split-Datei fehlt: {csv_path}')
+            with csv_path.open('r', encoding='utf-8') as f:
+                arrays[s] = np.unique(np.asarray([sample_id(row_key(r, key_col)) for r in csv.DictReader(f)], dtype=np.uint64))
+        return arrays, {'strategy': 'files', 'source': path.as_posix(), 'key_col': key_col}
+    with np.load(path) as z:
+        arrays = {s: z[s].astype(np.uint64) for s in SPLITS}
+        meta = json.loads(str(z['meta'])) if 'meta' in z.files else {}
+    return arrays, meta
+
+
+def resolve_split_ids(data_cfg: Dict, meta_csv: Union[str, Path]) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Split ids for the training tools: precomputed ``data.split_index`` or hash split of meta.csv."""
+    key_col = data_cfg.get('key_col', DEFAULT_KEY_COL)
+    index_path = data_cfg.get('split_index')
+    if index_path:
+        arrays, meta = load_split_index(index_path, key_col=key_col)
+        meta = {**meta, 'path': str(index_path)}
+        return arrays, meta
+    with Path(meta_csv).open('r', encoding='utf-8') as f:
+        return build_split_index(
+            csv.DictReader(f),
+            val_ratio=float(data_cfg.get('val_ratio', 0.15)),
+            test_ratio=float(data_cfg.get('test_ratio', 0.15)),
+            salt=str(data_cfg.get('split', 'split_v1')),
+            key_col=key_col,
+            group_col=data_cfg.get('group_col', DEFAULT_GROUP_COL),
+        )
+
+
+def split_stats(rows: Iterable[Dict[str, str]], arrays: Dict[str, np.ndarray], key_col: str = DEFAULT_KEY_COL,
+                label_col: str = 'label') -> Dict:
+    lookup = {}
+    for s in SPLITS:
+        for i in arrays[s].tolist():
+            lookup[i] = s
+    per_class: Dict[str, Counter] = defaultdict(Counter)
+    for row in rows:
+        s = lookup.get(sample_id(row_key(row, key_col)))
+        if s:
+            per_class[row.get(label_col, '?')][s] += 1
+    totals = {s: int(arrays[s].size) for s in SPLITS}
+    n = sum(totals.values()) or 1
+    return {
+        'splits': totals,
+        'ratio_actual': {s: totals[s] / n for s in SPLITS},
+        'per_class': {c: dict(cnt) for c, cnt in sorted(per_class.items())},
+        'classes_missing_in': {s: sorted(c for c, cnt in per_class.items() if cnt.get(s, 0) == 0) for s in SPLITS},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Hash-basierten Split-Index (split_index.npz) aus meta.csv erzeugen')
+    ap.add_argument('--meta', required=True, help='meta.csv (Spalten filename,label[,plant_id])')
+    ap.add_argument('--out', required=True, help='Ziel .npz')
+    ap.add_argument('--val-ratio', type=float, default=0.15)
+    ap.add_argument('--test-ratio', type=float, default=0.15)
+    ap.add_argument('--salt', default='split_v1', help='Split-Name / Salt (wie data.split)')
+    ap.add_argument('--key-col', default=DEFAULT_KEY_COL)
+    ap.add_argument('--group-col', default=DEFAULT_GROUP_COL)
+    args = ap.parse_args()
+    with open(args.meta, 'r', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    arrays, meta = build_split_index(rows, args.val_ratio, args.test_ratio, args.salt, args.key_col, args.group_col)
+    save_split_index(args.out, arrays, meta)
+    stats = split_stats(rows, arrays, args.key_col)
+    print(json.dumps({k: stats[k] for k in ('splits', 'ratio_actual', 'classes_missing_in')}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
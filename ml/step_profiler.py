@@ -0,0 +1,210 @@
+"""Opt-in per-step profiler for the train loop (``train.py --step-profile``).
+
+Per step it records:
+- data_wait: time blocked in ``next(loader)`` (DataLoader workers starved, e.g. JPEG decode)
+- h2d: host -> device copy (+ channels_last conversion)
+- fwd: augmentation (MixUp/CutMix) + forward + loss
+- bwd: backward
+- opt: gradient clipping + optimizer (+ GradScaler) step
+- img/s and the loader queue depth (batches ready in the worker result queue)
+
+On CUDA each phase boundary synchronizes the device, otherwise async kernels
+would be attributed to the wrong phase (only while profiling is on).
+
+Outputs:
+- TensorBoard scalars ``profile/*`` per step (if --log-dir)
+- ``step_profile.json``: per-epoch + overall summary (mean/p50/p90 ms, time share,
+  img/s, queue depth, data_stall_fraction, diagnosis)
+- optional torch.profiler chrome trace for a step window (``--profile-trace 20:25``)
+  -> ``profiler/trace_steps20-25.json`` (chrome://tracing or Perfetto)
+
+Usage:
+prof = StepProfiler(device, tb_writer=tb_writer, trace_window=(20, 25), trace_dir=out_dir / 'profiler')
+prof.start_epoch(epoch)          # startet die Uhr für den ersten next(loader)
+it = iter(loader)
+for x, y in it:
+    prof.mark('data_wait')
+    ...; prof.mark('h2d') ... prof.mark('fwd') ... prof.mark('bwd') ... prof.mark('opt')
+    prof.end_step(x.size(0), queue_depth(it))   # startet die Uhr für den nächsten Batch
+prof.write(out_dir / 'step_profile.json')
+"""
+from __future__ import annotations
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+PHASES = ('data_wait', 'h2d', 'fwd', 'bwd', 'opt')
+
+
+def parse_trace_window(spec: Optional[str]) -> Optional[Tuple[int, int]]:
+    """'20:25' -> (20, 25) (global steps, end exclusive); None/'' -> None."""
+    if not spec:
+        return None
+    start, _, end = spec.partition(':')
+    start_i = int(start)
+    end_i = int(end) if end else start_i + 5
+    if end_i <= start_i:
+        raise ValueError(f'Ungültiges Trace-Fenster: {spec}')
+    return start_i, end_i
+
+
+def queue_depth(loader_iter) -> Optional[int]:
+    """Batches waiting in a multi-worker DataLoader's result queue (None if unknown)."""
+    if getattr(loader_iter, '_num_workers', 0) == 0:
+        return 0
+    try:
+        ready = loader_iter._data_queue.qsize()  # NotImplementedError auf macOS
+    except Exception:
+        return None
+    # außer der Reihe angekommene Batches liegen als (worker_id, data) in _task_info
+    cached = sum(1 for v in getattr(loader_iter, '_task_info', {}).values() if len(v) == 2)
+    return int(ready) + cached
+
+
+def _summary(rows: List[Dict[str, float]]) -> Dict:
+    if not rows:
+        return {'steps': 0}
+    out: Dict = {'steps': len(rows)}
+    step_total = np.array([sum(r[p] for p in PHASES) for r in rows])
+    total = float(step_total.sum()) or 1e-12
+    phases = {}
+    for p in PHASES:
+        v = np.array([r[p] for r in rows]) * 1000.0
+        phases[p] = {
+            'mean_ms': round(float(v.mean()), 3),
+            'p50_ms': round(float(np.percentile(v, 50)), 3),
+            'p90_ms': round(float(np.percentile(v, 90)), 3),
+            'share': round(float(v.sum() / 1000.0 / total), 4),
+        }
+    out['phases'] = phases
+    out['step_ms_mean'] = round(float(step_total.mean() * 1000.0), 3)
+    ips = np.array([r['img_per_s'] for r in rows])
+    out['img_per_s_mean'] = round(float(ips.mean()), 2)
+    out['img_per_s_overall'] = round(float(sum(r['batch'] for r in rows) / total), 2)
+    depths = [r['queue_depth'] for r in rows if r['queue_depth'] is not None]
+    out['queue_depth_mean'] = round(float(np.mean(depths)), 2) if depths else None
+    out['queue_depth_min'] = int(min(depths)) if depths else None
+    out['data_stall_fraction'] = phases['data_wait']['share']
+    out['diagnosis'] = 'loader-bound' if phases['data_wait']['share'] > 0.3 else 'compute-bound'
+    return out
+
+
+class StepProfiler:
+    enabled = True
+
+    def __init__(self, device: str, tb_writer=None, trace_window: Optional[Tuple[int, int]] = None,
+                 trace_dir: Optional[Path] = None):
+        self.cuda = str(device).startswith('cuda')
+        self.tb_writer = tb_writer
+        self.trace_window = trace_window
+        self.trace_dir = Path(trace_dir) if trace_dir else None
+        self.global_step = 0
+        self.epoch = 0
+        self.rows: List[Dict[str, float]] = []
+        self._epoch_rows: Dict[int, List[Dict[str, float]]] = {}
+        self._cur: Dict[str, float] = {}
+        self._t_step = 0.0
+        self._t_last = 0.0
+        self._torch_prof = None
+
+    def _now(self) -> float:
+        if self.cuda:
+            import torch
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def start_epoch(self, epoch: int):
+        self.epoch = epoch
+        self._epoch_rows.setdefault(epoch, [])
+        self._begin_step()
+
+    def _begin_step(self):
+        self._maybe_trace()
+        self._cur = {p: 0.0 for p in PHASES}
+        self._t_step = self._t_last = self._now()
+
+    def mark(self, phase: str):
+        t = self._now()
+        self._cur[phase] += t - self._t_last
+        self._t_last = t
+
+    def end_step(self, batch_size: int, depth: Optional[int] = None):
+        dur = max(self._t_last - self._t_step, 1e-12)
+        row = dict(self._cur)
+        row.update({'batch': batch_size, 'img_per_s': batch_size / dur, 'queue_depth': depth})
+        self.rows.append(row)
+        self._epoch_rows.setdefault(self.epoch, []).append(row)
+        if self.tb_writer:
+            for p in PHASES:
+                self.tb_writer.add_scalar(f'profile/{p}_ms', row[p] * 1000.0, self.global_step)
+            self.tb_writer.add_scalar('profile/img_per_s', row['img_per_s'], self.global_step)
+            if depth is not None:
+                self.tb_writer.add_scalar('profile/queue_depth', depth, self.global_step)
+        if self._torch_prof is not None:
+            self._torch_prof.step()
+        self.global_step += 1
+        self._begin_step()
+
+    def _maybe_trace(self):
+        if not self.trace_window:
+            return
+        start, end = self.trace_window
+        if self.global_step == start and self._torch_prof is None:
+            import torch
+            acts = [torch.profiler.ProfilerActivity.CPU]
+            if self.cuda:
+                acts.append(torch.profiler.ProfilerActivity.CUDA)
+            self._torch_prof = torch.profiler.profile(activities=acts, record_shapes=True, profile_memory=True)
+            self._torch_prof.start()
+            print(f"[PROFILE] torch.profiler Trace Start (Step {start})")
+        elif self.global_step == end and self._torch_prof is not None:
+            self._stop_trace()
+
+    def _stop_trace(self):
+        if self._torch_prof is None:
+            return
+        start, end = self.trace_window  # type: ignore
+        self._torch_prof.stop()
+        try:
+            self.trace_dir.mkdir(parents=True, exist_ok=True)  # type: ignore
+            path = self.trace_dir / f'trace_steps{start}-{min(end, self.global_step)}.json'  # type: ignore
+            self._torch_prof.export_chrome_trace(path.as_posix())
+            print(f"[PROFILE] Trace gespeichert -> {path}")
+        except Exception as e:
+            print(f"[PROFILE][WARN] Trace Export fehlgeschlagen: {e}")
+        self._torch_prof = None
+
+    def summary(self) -> Dict:
+        return {
+            'overall': _summary(self.rows),
+            'per_epoch': {str(e): _summary(r) for e, r in self._epoch_rows.items() if r},
+        }
+
+    def write(self, path: Path) -> Dict:
+        self._stop_trace()
+        summ = self.summary()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summ, f, indent=2)
+        ov = summ['overall']
+        if ov.get('steps'):
+            shares = ', '.join(f"{p}={ov['phases'][p]['share']*100:.0f}%" for p in PHASES)
+            print(f"[PROFILE] {ov['steps']} Steps, {ov['img_per_s_overall']:.1f} img/s, {shares} -> {ov['diagnosis']} ({path.name})")
+        return summ
+
+
+class NullStepProfiler:
+    """Profiling aus: gleiche Schnittstelle, keine Zeitmessung / Syncs."""
+    enabled = False
+
+    def start_epoch(self, epoch: int):
+        pass
+
+    def mark(self, phase: str):
+        pass
+
+    def end_step(self, batch_size: int, depth: Optional[int] = None):
+        pass
+
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Parallel hyper-parameter sweep over a base YAML config.
+
+Expands a search space into trial configs and runs ``train.py`` for each trial
+on a local process pool:
+- P parallel trials (``--parallel``), each pinned to its own disjoint CPU set
+  (Linux ``sched_setaffinity``) with OMP/MKL/torch threads limited to that set
+  (``--threads-per-trial``, default cpu_count // P)
+- one read-only preprocessed image cache (``image_cache.py``) built once and
+  shared by all trials via ``data.cache`` -> no trial re-decodes JPEGs
+- optional ASHA (``--asha``): all trials share one rung directory, weak configs
+  stop after ``asha.min_epochs`` (see asha.py)
+- results aggregated with compare_runs.py (comparison.csv/.md, summary.json,
+  best_by_metric_*.txt) plus one column per swept parameter
+
+Search space (YAML):
+    mode: grid              # grid | random
+    trials: 12              # nur random
+    seed: 0
+    params:
+      optimizer.lr: [3.0e-4, 8.0e-4, 2.0e-3]          # Liste -> Grid / zufällige Auswahl
+      optimizer.weight_decay: {low: 0.005, high: 0.1, log: true}   # nur random
+      augment.mixup.enabled: [false, true]
+
+Usage:
+    python ml/sweep.py --config ml/configs/baseline.yaml --space ml/configs/sweep_space.yaml \\
+        --out ml/outputs/sweep_lr --parallel 4 --image-cache ml/cache/img257 --asha
+    python ml/sweep.py --config ml/configs/baseline.yaml --param optimizer.lr=3e-4,8e-4 --out ml/outputs/sweep_lr
+
+Trial layout: <out>/trials/<trial_id>/{config.yaml, train.log, metrics_final.json, ...};
+finished trials (metrics_final.json present) are skipped when the sweep is restarted.
+"""
+from __future__ import annotations
+import argparse
+import copy
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from compare_runs import HEADERS, KEY_METRICS_DEFAULT, extract_row, write_comparison
+from splits import DEFAULT_KEY_COL
+
+ML_DIR = Path(__file__).resolve().parent
+
+
+def set_dotted(cfg: Dict, key: str, value: Any):
+    node = cfg
+    parts = key.split('.')
+    for p in parts[:-1]:
+        if not isinstance(node.get(p), dict):
+            node[p] = {}
+        node = node[p]
+    node[parts[-1]] = value
+
+
+def parse_param_arg(spec: str):
+    """'optimizer.lr=3e-4,8e-4' -> ('optimizer.lr', [0.0003, 0.0008]) (Werte YAML-geparst)."""
+    key, _, values = spec.partition('=')
+    if not values:
+        raise ValueError(f'--param erwartet key=v1,v2,...: {spec}')
+    return key.strip(), [_parse_value(v) for v in values.split(',')]
+
+
+def _parse_value(text: str):
+    value = yaml.safe_load(text)
+    if isinstance(value, str):
+        try:
+            return float(value)  # YAML 1.1 liest '1e-4' (ohne Punkt) als String
+        except ValueError:
+            pass
+    return value
+
+
+def _sample(spec, rng: random.Random):
+    if isinstance(spec, dict):
+        low, high = float(spec['low']), float(spec['high'])
+        if spec.get('log'):
+            return math.exp(rng.uniform(math.log(low), math.log(high)))
+        return rng.uniform(low, high)
+    return rng.choice(spec)
+
+
+def expand_space(space: Dict) -> List[Dict[str, Any]]:
+    params = space.get('params') or {}
+    mode = space.get('mode', 'grid')
+    if mode == 'grid':
+        keys = list(params)
+        for k in keys:
+            if not isinstance(params[k], list):
+                raise ValueError(f'Grid benötigt Wertelisten: {k}')
+        return [dict(zip(keys, combo)) for combo in itertools.product(*(params[k] for k in keys))]
+    if mode == 'random':
+        rng = random.Random(int(space.get('seed', 0)))
+        return [{k: _sample(v, rng) for k, v in params.items()} for _ in range(int(space.get('trials', 10)))]
+    raise ValueError(f'Unbekannter Sweep-Modus: {mode}')
+
+
+def trial_name(index: int, params: Dict[str, Any]) -> str:
+    def short(v):
+        return f'{v:.3g}' if isinstance(v, float) else str(v)
+    tag = '_'.join(f"{k.split('.')[-1]}{short(v)}" for k, v in params.items())
+    return f't{index:03d}_{tag}'[:80].replace('/', '-')
+
+
+def cpu_slots(parallel: int, threads: Optional[int]) -> List[List[int]]:
+    """Disjoint CPU sets per slot (round robin falls weniger Kerne als parallel * threads)."""
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+    except AttributeError:  # macOS / Windows: kein Pinning
+        cpus = list(range(os.cpu_count() or 1))
+    per = threads or max(1, len(cpus) // parallel)
+    return [[cpus[(s * per + i) % len(cpus)] for i in range(per)] for s in range(parallel)]
+
+
+def launch_trial(cfg_path: Path, out_dir: Path, cpus: List[int], threads: int, extra_args: List[str]):
+    env = dict(os.environ)
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        env[var] = str(threads)
+    cmd = [sys.executable, str(ML_DIR / 'train.py'), '--config', str(cfg_path), '--out', str(out_dir)] + extra_args
+
+    def pin():
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+
+    log = open(out_dir / 'train.log', 'w', encoding='utf-8')
+    proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env,
+                            preexec_fn=pin if os.name == 'posix' else None)
+    return proc, log
+
+
+def run_pool(trials: List[Dict], parallel: int, threads: Optional[int]) -> Dict[str, Dict]:
+    slots = cpu_slots(parallel, threads)
+    pending = list(trials)
+    running: Dict[int, tuple] = {}
+    status: Dict[str, Dict] = {}
+    while pending or running:
+        for slot in range(parallel):
+            if slot not in running and pending:
+                t = pending.pop(0)
+                proc, log = launch_trial(t['config_path'], t['out_dir'], slots[slot], len(slots[slot]), t['args'])
+                running[slot] = (t, proc, log, time.perf_counter())
+                print(f"[SWEEP] Start {t['id']} (CPUs {slots[slot]})")
+        time.sleep(0.5)
+        for slot, (t, proc, log, t0) in list(running.items()):
+            rc = proc.poll()
+            if rc is None:
+                continue
+            log.close()
+            dt = time.perf_counter() - t0
+            status[t['id']] = {'returncode': rc, 'seconds': round(dt, 2)}
+            print(f"[SWEEP] {'OK' if rc == 0 else 'FEHLER'} {t['id']} ({dt:.0f}s){'' if rc == 0 else ' -> ' + str(t['out_dir'] / 'train.log')}")
+            del running[slot]
+    return status
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Paralleler Hyperparameter-Sweep über train.py')
+    ap.add_argument('--config', required=True, help='Basis-Config (YAML)')
+    ap.add_argument('--space', help='Suchraum YAML (mode/trials/seed/params)')
+    ap.add_argument('--param', action='append', default=[], help='Zusätzlicher Grid-Parameter key=v1,v2 (mehrfach)')
+    ap.add_argument('--out', required=True, help='Sweep-Verzeichnis')
+    ap.add_argument('--parallel', type=int, default=1, help='Gleichzeitige Trials')
+    ap.add_argument('--threads-per-trial', type=int, default=None, help='Threads & gepinnte Kerne je Trial (Default cpu_count // parallel)')
+    ap.add_argument('--workers-per-trial', type=int, default=None, help='train.num_workers je Trial überschreiben')
+    ap.add_argument('--image-cache', default=None, help='Gemeinsamer Image Cache (wird gebaut falls nicht vorhanden)')
+    ap.add_argument('--asha', action='store_true', help='ASHA Pruning über <out>/asha')
+    ap.add_argument('--train-args', default='', help='Zusätzliche train.py Argumente (z.B. "--save-inference")')
+    ap.add_argument('--metric', action='append', help='Metrik(en) für best_by_metric (Default wie compare_runs)')
+    ap.add_argument('--dry-run', action='store_true', help='Nur Trial-Configs schreiben')
+    args = ap.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        base = yaml.safe_load(f)
+    space = {'mode': 'grid', 'params': {}}
+    if args.space:
+        with open(args.space, 'r', encoding='utf-8') as f:
+            space = yaml.safe_load(f)
+    for spec in args.param:
+        k, vals = parse_param_arg(spec)
+        space.setdefault('params', {})[k] = vals
+    combos = expand_space(space)
+    if not combos or not space.get('params'):
+        raise SystemExit('Leerer Suchraum (--space oder --param angeben)')
+
+    out = Path(args.out)
+    (out / 'trials').mkdir(parents=True, exist_ok=True)
+    data_cfg = base.get('data', {})
+
+    # Gemeinsamer Image Cache: einmal für die größte Auflösung aller Trials bauen
+    cache_dir = None
+    if args.image_cache:
+        from image_cache import META_FILE, build_image_cache
+        cache_dir = Path(args.image_cache)
+        sizes = [int(c.get('model.image_size', base.get('model', {}).get('image_size', 224))) for c in combos]
+        min_side = int(max(sizes) * 1.15)
+        if not (cache_dir / META_FILE).exists():
+            print(f"[SWEEP] Baue Image Cache (min_side={min_side}) -> {cache_dir}")
+            meta = build_image_cache(data_cfg['root'], data_cfg['meta_csv'], cache_dir, min_side,
+                                     draft=data_cfg.get('jpeg_draft', True), key_col=data_cfg.get('key_col', DEFAULT_KEY_COL))
+            print(f"[SWEEP] Image Cache: {meta['count']} Bilder, {meta['bytes'] / 1e6:.1f} MB, {meta['build_s']:.1f}s")
+        cache_dir = cache_dir.resolve()
+
+    trials = []
+    done_rows = []
+    for i, params in enumerate(combos):
+        tid = trial_name(i, params)
+        t_out = out / 'trials' / tid
+        t_out.mkdir(parents=True, exist_ok=True)
+        cfg = copy.deepcopy(base)
+        for k, v in params.items():
+            set_dotted(cfg, k, v)
+        set_dotted(cfg, 'experiment.id', f"{base.get('experiment', {}).get('id', 'run')}_{tid}")
+        if cache_dir is not None:
+            set_dotted(cfg, 'data.cache', cache_dir.as_posix())
+        if args.workers_per_trial is not None:
+            set_dotted(cfg, 'train.num_workers', args.workers_per_trial)
+        cfg_path = t_out / 'config.yaml'
+        with cfg_path.open('w', encoding='utf-8') as f:
+            yaml.safe_dump(cfg, f, sort_keys=False)
+        extra = args.train_args.split() if args.train_args else []
+        if args.asha:
+            extra += ['--asha-dir', str((out / 'asha').resolve()), '--trial-id', tid]
+        entry = {'id': tid, 'params': params, 'config_path': cfg_path.resolve(), 'out_dir': t_out.resolve(), 'args': extra}
+        if (t_out / 'metrics_final.json').exists():
+            done_rows.append(tid)
+            continue
+        trials.append(entry)
+    (out / 'sweep_plan.json').write_text(json.dumps({
+        'base_config': str(args.config), 'space': space, 'image_cache': cache_dir.as_posix() if cache_dir else None,
+        'parallel': args.parallel, 'asha': args.asha,
+        'trials': [{'id': trial_name(i, p), 'params': p} for i, p in enumerate(combos)],
+    }, indent=2, default=str), encoding='utf-8')
+    print(f"[SWEEP] {len(combos)} Trials ({len(done_rows)} bereits fertig), parallel={args.parallel}")
+    if args.dry_run:
+        return
+
+    t0 = time.perf_counter()
+    status = run_pool(trials, max(1, args.parallel), args.threads_per_trial)
+    wall = time.perf_counter() - t0
+
+    # Aggregation über compare_runs (+ Parameter-Spalten)
+    param_keys = list(space.get('params', {}))
+    rows = []
+    for i, params in enumerate(combos):
+        tid = trial_name(i, params)
+        row = extract_row(out / 'trials' / tid)
+        row.update({k: params[k] for k in param_keys})
+        row['returncode'] = status.get(tid, {}).get('returncode', 0)
+        row['trial_seconds'] = status.get(tid, {}).get('seconds')
+        rows.append(row)
+    write_comparison(rows, HEADERS + param_keys + ['returncode', 'trial_seconds'], out, args.metric or KEY_METRICS_DEFAULT)
+    epochs_total = sum(r['epochs'] or 0 for r in rows)
+    full_epochs = len(rows) * int(base.get('train', {}).get('epochs', 0) or 0)
+    summary = {
+        'wall_seconds': round(wall, 2),
+        'trials': len(rows),
+        'failed': sorted(t for t, s in status.items() if s['returncode'] != 0),
+        'epochs_trained': epochs_total,
+        'epochs_budget_full': full_epochs,
+        'compute_fraction': round(epochs_total / full_epochs, 3) if full_epochs else None,
+    }
+    (out / 'sweep_summary.json').write_text(json.dumps(summary, indent=2), encoding='utf-8')
+    best = max((r for r in rows if r.get('macro_f1') is not None), key=lambda r: r['macro_f1'], default=None)
+    print(f"[SWEEP] Fertig in {wall:.0f}s: {epochs_total}/{full_epochs} Epochen trainiert"
+          + (f", bester Trial {best['run']} macro_f1={best['macro_f1']:.4f}" if best else '') + f" -> {out}")
+
+
+if __name__ == '__main__':
+    main()
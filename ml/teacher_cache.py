@@ -0,0 +1,194 @@
+"""Precomputed teacher logits for distill.py (``distillation.cache_teacher_logits``).
+
+Instead of a teacher forward pass for every batch of every epoch, the frozen
+teacher runs once over the training split for K augmented views; the logits are
+stored as a float16 memmap ``[K, N, C]`` and the student loop only reads them.
+
+Consistency: each (sample, view) pair has a fixed augmentation seed
+(``view_seed``), so the student sees exactly the image the teacher scored
+(same crop / flip / jitter). The ``ViewSampler`` draws one of the K views per
+sample and epoch -> K=1 means the student sees one fixed augmentation of every
+image; larger K restores augmentation diversity at K teacher passes (one time).
+
+Files (``teacher_cache/``, reusable across runs via ``distillation.teacher_cache_dir``):
+- logits.f16: float16 memmap, shape [views, N, num_classes]
+- sample_ids.npy: uint64 sample id per row (row order of the memmap)
+- meta.json: shape, views, seed, teacher checkpoint (size/mtime), image_size, augment config
+
+Lookup is by sample id: a cache built for another ordering / superset of the
+training split is reused as long as every current sample id is contained and
+the meta signature (teacher, views, seed, transforms) matches.
+"""
+from __future__ import annotations
+import json
+import time
+from contextlib import nullcontext as _nullcontext
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import torch
+    from torch.utils.data import Dataset, Sampler
+except ImportError:  # pragma: no cover
+    torch = None  # type: ignore
+    Dataset = object  # type: ignore
+    Sampler = object  # type: ignore
+
+LOGITS_FILE = 'logits.f16'
+IDS_FILE = 'sample_ids.npy'
+META_FILE = 'meta.json'
+_MASK64 = (1 << 64) - 1
+
+
+def view_seed(seed: int, sid: int, view: int) -> int:
+    """Deterministic augmentation seed for (sample id, view) – independent of worker / order."""
+    x = (int(sid) ^ (int(seed) * 0x9E3779B97F4A7C15) ^ (int(view) * 0xBF58476D1CE4E5B9)) & _MASK64
+    x = ((x ^ (x >> 31)) * 0x94D049BB133111EB) & _MASK64
+    return (x ^ (x >> 29)) & 0x7FFFFFFFFFFFFFFF
+
+
+class ViewDataset(Dataset):  # type: ignore
+    """Wraps a PlantDataset; item ``(idx, view)`` -> (img, label, idx, view) with view-seeded augmentation.
+
+    The torch CPU RNG is reseeded per item and restored afterwards, so the global
+    RNG stream (num_workers=0) is not disturbed.
+    """
+
+    def __init__(self, base, seed: int):
+        self.base = base
+        self.seed = int(seed)
+        self.ids = base.sample_ids
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+    def __getitem__(self, key):
+        idx, view = key if isinstance(key, tuple) else (key, 0)
+        state = torch.get_rng_state()
+        torch.random.default_generator.manual_seed(view_seed(self.seed, self.ids[idx], view))
+        try:
+            img, label = self.base[idx]
+        finally:
+            torch.set_rng_state(state)
+        return img, label, idx, view
+
+
+class ViewSampler(Sampler):  # type: ignore
+    """Yields ``(idx, view)``: shuffled indices, one random view in [0, views) per sample and epoch."""
+
+    def __init__(self, n: int, views: int, seed: int, shuffle: bool = True, fixed_view: Optional[int] = None):
+        self.n = n
+        self.views = max(1, int(views))
+        self.seed = int(seed)
+        self.shuffle = shuffle
+        self.fixed_view = fixed_view
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __iter__(self):
+        g = torch.Generator().manual_seed(self.seed + self.epoch)
+        order = torch.randperm(self.n, generator=g).tolist() if self.shuffle else list(range(self.n))
+        if self.fixed_view is not None:
+            views = [self.fixed_view] * self.n
+        else:
+            views = torch.randint(0, self.views, (self.n,), generator=g).tolist()
+        return iter([(i, views[i]) for i in order])
+
+    def __len__(self) -> int:
+        return self.n
+
+
+def _file_sig(path: Optional[str]) -> Optional[Dict]:
+    if not path:
+        return None
+    p = Path(path)
+    st = p.stat()
+    return {'path': p.resolve().as_posix(), 'size': st.st_size, 'mtime': int(st.st_mtime)}
+
+
+def cache_signature(teacher_ckpt: Optional[str], teacher_arch: str, views: int, seed: int,
+                    image_size: int, augment_cfg: Optional[Dict]) -> Dict:
+    return {
+        'teacher': _file_sig(teacher_ckpt),
+        'teacher_arch': teacher_arch,
+        'views': int(views),
+        'seed': int(seed),
+        'image_size': int(image_size),
+        'augment': augment_cfg or {},
+    }
+
+
+class TeacherLogitCache:
+    """Read side: ``lookup(idx, view)`` -> float32 teacher logits for dataset positions."""
+
+    def __init__(self, cache_dir: Path, logits: np.memmap, rows: np.ndarray, meta: Dict):
+        self.cache_dir = Path(cache_dir)
+        self.logits = logits
+        self.rows = rows  # Dataset-Position -> Zeile im Memmap
+        self.meta = meta
+
+    @property
+    def views(self) -> int:
+        return int(self.logits.shape[0])
+
+    def lookup(self, idx, view):
+        idx_np = idx.numpy() if hasattr(idx, 'numpy') else np.asarray(idx)
+        view_np = view.numpy() if hasattr(view, 'numpy') else np.asarray(view)
+        out = self.logits[view_np, self.rows[idx_np]]
+        return torch.from_numpy(np.asarray(out, dtype=np.float32))
+
+    @classmethod
+    def open(cls, cache_dir, dataset_ids: np.ndarray, signature: Dict) -> Optional['TeacherLogitCache']:
+        """Open an existing cache if the signature matches and it covers all ``dataset_ids`` (else None)."""
+        cache_dir = Path(cache_dir)
+        meta_path = cache_dir / META_FILE
+        if not meta_path.exists() or not (cache_dir / LOGITS_FILE).exists():
+            return None
+        meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        if meta.get('signature') != signature:
+            return None
+        cached_ids = np.load(cache_dir / IDS_FILE)
+        order = np.argsort(cached_ids)
+        pos = np.searchsorted(cached_ids, dataset_ids, sorter=order)
+        pos = np.clip(pos, 0, len(cached_ids) - 1)
+        rows = order[pos]
+        if len(cached_ids) == 0 or not np.array_equal(cached_ids[rows], dataset_ids):
+            return None  # Samples fehlen im Cache -> neu berechnen
+        logits = np.memmap(cache_dir / LOGITS_FILE, dtype=np.float16, mode='r', shape=tuple(meta['shape']))
+        return cls(cache_dir, logits, rows.astype(np.int64), meta)
+
+
+def build_teacher_cache(teacher, view_ds: ViewDataset, make_loader, cache_dir, signature: Dict, device,
+                        num_classes: int, views: int, autocast=None) -> Tuple[TeacherLogitCache, float]:
+    """Run the teacher over all (sample, view) pairs once and write the memmap. Returns (cache, seconds)."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    (cache_dir / META_FILE).unlink(missing_ok=True)  # unvollständiger Cache wird nie wiederverwendet
+    n = len(view_ds)
+    shape = (int(views), n, int(num_classes))
+    tmp = cache_dir / (LOGITS_FILE + '.tmp')
+    mm = np.memmap(tmp, dtype=np.float16, mode='w+', shape=shape)
+    teacher.eval()
+    t0 = time.perf_counter()
+    for v in range(views):
+        loader = make_loader(ViewSampler(n, views, signature['seed'], shuffle=False, fixed_view=v))
+        for imgs, _, idx, _ in loader:
+            imgs = imgs.to(device, non_blocking=True)
+            with torch.no_grad(), (autocast() if autocast is not None else _nullcontext()):
+                logits = teacher(imgs)
+            mm[v, idx.numpy()] = logits.float().cpu().numpy().astype(np.float16)
+        print(f"[KD-CACHE] View {v + 1}/{views}: {n} Teacher-Logits berechnet ({time.perf_counter() - t0:.1f}s)")
+    mm.flush()
+    del mm
+    np.save(cache_dir / IDS_FILE, np.asarray(view_ds.ids, dtype=np.uint64))
+    (cache_dir / LOGITS_FILE).unlink(missing_ok=True)
+    tmp.replace(cache_dir / LOGITS_FILE)
+    seconds = time.perf_counter() - t0
+    meta = {'shape': list(shape), 'dtype': 'float16', 'signature': signature, 'build_s': round(seconds, 3)}
+    (cache_dir / META_FILE).write_text(json.dumps(meta, indent=2), encoding='utf-8')
+    logits = np.memmap(cache_dir / LOGITS_FILE, dtype=np.float16, mode='r', shape=shape)
+    return TeacherLogitCache(cache_dir, logits, np.arange(n, dtype=np.int64), meta), seconds
@@ -0,0 +1,7 @@
+"""Make ml/ modules importable the same way the scripts import each other (flat, from ml/)."""
+import sys
+from pathlib import Path
+
+ML_DIR = Path(__file__).resolve().parents[1]
+if str(ML_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_DIR))
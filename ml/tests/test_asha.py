@@ -0,0 +1,27 @@
+from asha import AshaPruner, is_promotable, rung_epochs
+
+
+def test_rung_epochs_geometric_below_max():
+    assert rung_epochs(2, 3, 35) == [2, 6, 18]
+    assert rung_epochs(1, 2, 8) == [1, 2, 4]
+    assert rung_epochs(5, 3, 5) == []
+
+
+def test_promotion_keeps_top_fraction():
+    values = [0.9, 0.8, 0.7, 0.6, 0.5, 0.4]  # 6 Ergebnisse, eta=3 -> Top 2
+    assert is_promotable(0.8, values, 3)
+    assert not is_promotable(0.7, values, 3)
+    # weniger als eta Ergebnisse: nur der bisher Beste läuft weiter
+    assert is_promotable(0.5, [0.5], 3)
+    assert not is_promotable(0.4, [0.5, 0.4], 3)
+
+
+def test_pruner_stops_weak_trial_at_rung(tmp_path):
+    results = {}
+    for i, value in enumerate([0.50, 0.60, 0.55, 0.20]):
+        pruner = AshaPruner(tmp_path, f't{i}', min_epochs=2, reduction_factor=3, max_epochs=20)
+        assert pruner.report(1, value)  # keine Rung-Epoche
+        results[f't{i}'] = pruner.report(2, value)
+    assert results == {'t0': True, 't1': True, 't2': False, 't3': False}
+    assert pruner.pruned_at == 2
+    assert len(list((tmp_path / 'rung_0002').glob('*.json'))) == 4
@@ -0,0 +1,31 @@
+import time
+
+import numpy as np
+
+from benchmark_infer import bootstrap_ci, build_curves, host_key, run_load, summarize_load
+
+
+def test_bootstrap_ci_brackets_mean():
+    values = np.random.default_rng(0).normal(10.0, 1.0, 200)
+    low, high = bootstrap_ci(values)
+    assert low < values.mean() < high
+    assert high - low < 0.5
+    assert bootstrap_ci([1.0]) is None
+
+
+def test_run_load_streams_and_summary():
+    load = run_load(lambda x: time.sleep(0.002), lambda: None, streams=2, duration_s=0.2, warmup=1)
+    summary = summarize_load(load['requests'], load['t0_ns'], batch_size=4, streams=2, windows=4)
+    assert summary['requests'] == len(load['requests']) > 10
+    assert summary['images'] == 4 * summary['requests']
+    assert summary['latency_ms']['p50'] >= 2.0
+    assert summary['throughput_ci'][0] <= summary['throughput_ci'][1]
+    point = {'framework': 'pytorch', 'threads': 1, 'batch_size': 4, **summary}
+    curves = build_curves([point, {**point, 'batch_size': 1}, {**point, 'batch_size': 8, 'error': 'x'}])
+    assert curves['pytorch']['t1_s2']['batch_size'] == [1, 4]
+
+
+def test_host_key_depends_on_cpu():
+    info = {'cpu': 'Intel(R) Xeon(R) Gold 6330', 'logical_cores': 8, 'affinity_cores': 8, 'machine': 'x86_64', 'isa': ['avx2']}
+    assert host_key(info).startswith('intel-r-xeon-r-gold-6330_8c_')
+    assert host_key(info) != host_key({**info, 'isa': ['avx2', 'avx512f']})
@@ -0,0 +1,102 @@
+import numpy as np
+
+from compare_tflite_accuracy import compute_metrics, confusion_counts, merge_shards, reference_gain, shard_ranges, update_confusion
+
+
+def test_shard_ranges_cover_all_samples_once():
+    for n, k in [(10, 3), (5, 8), (1, 4), (100, 16)]:
+        ranges = shard_ranges(n, k)
+        assert ranges[0][0] == 0 and ranges[-1][1] == n
+        assert all(a < b for a, b in ranges)
+        assert all(r[1] == nxt[0] for r, nxt in zip(ranges, ranges[1:]))
+        assert len(ranges) == min(n, k)
+
+
+def test_merged_shards_match_serial_metrics():
+    rng = np.random.default_rng(0)
+    y_true, y_pred = rng.integers(0, 4, 97), rng.integers(0, 4, 97)
+    serial = np.zeros((4, 4), dtype=np.int64)
+    for t, p in zip(y_true, y_pred):
+        update_confusion(serial, t, p)
+    parts = []
+    for a, b in shard_ranges(len(y_true), 5):
+        cm = confusion_counts(y_true[a:b], y_pred[a:b], 4)  # wie evaluate_shard: bincount je Shard
+        parts.append({'cm': cm, 'seconds': 1.0, 'infer_seconds': 0.5, 'batch_size': 1})
+    merged = merge_shards(parts, num_threads=1)
+    ref = compute_metrics(serial)
+    assert merged['confusion'] == ref['confusion']
+    assert merged['macro_f1'] == ref['macro_f1'] and merged['accuracy'] == ref['accuracy']
+    assert merged['throughput']['shards'] == 5
+    # Klassen außerhalb [0, n) werden wie in update_confusion verworfen
+    np.testing.assert_array_equal(confusion_counts([0, 4, 1], [1, 0, -1], 4).sum(), 1)
+
+
+def test_reference_gain_vs_earlier_report():
+    reports = {'fp32': {'macro_f1': 0.90, 'accuracy': 0.92}, 'int8_full': {'macro_f1': 0.89, 'accuracy': 0.91}}
+    reference = {'fp32': {'macro_f1': 0.90, 'accuracy': 0.92}, 'int8_full': {'macro_f1': 0.85, 'accuracy': 0.88}}
+    gain = reference_gain(reports, reference)
+    assert gain['int8_full'] == {'macro_f1_gain_pct': 4.0, 'accuracy_gain_pct': 3.0,
+                                 'delta_macro_f1_vs_reference_fp32_pct': -1.0}
+    assert reference_gain({'float16': reports['fp32']}, reference)['float16']['macro_f1_gain_pct'] is None
+
+
+class _FakeInterpreter:
+    """tf.lite.Interpreter Ersatz: Logits = Pixel (0, 0) je Kanal, prüft die allokierte Input-Shape."""
+
+    def __init__(self, batch: int, dynamic: bool, hw: int = 4):
+        self.shape = np.array([batch, hw, hw, 3])
+        self.signature = np.array([-1 if dynamic else batch, hw, hw, 3])
+        self.allocated = None
+        self.resized = []
+        self.invoked_shapes = []
+        self._x = None
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': self.shape.copy(), 'shape_signature': self.signature, 'dtype': np.float32,
+                 'quantization': (0.0, 0)}]
+
+    def get_output_details(self):
+        return [{'index': 1, 'dtype': np.float32, 'quantization': (0.0, 0)}]
+
+    def resize_tensor_input(self, index, shape):
+        self.resized.append(list(shape))
+        self.shape = np.array(shape)
+
+    def allocate_tensors(self):
+        self.allocated = tuple(int(d) for d in self.shape)
+
+    def set_tensor(self, index, x):
+        assert x.shape == self.allocated and x.dtype == np.float32
+        self._x = x
+
+    def invoke(self):
+        self.invoked_shapes.append(self._x.shape)
+
+    def get_tensor(self, index):
+        return self._x[:, 0, 0, :].copy()
+
+
+def _runner(monkeypatch, fake, batch_size):
+    import compare_tflite_accuracy as cta
+    monkeypatch.setattr(cta, 'load_tflite_interpreter', lambda path, num_threads=None: fake)
+    return cta.TFLiteRunner('model.tflite', batch_size=batch_size)
+
+
+def test_tflite_runner_batches_pads_and_falls_back(monkeypatch):
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(10, 4, 4, 3)).astype(np.float32)
+    expected = np.argmax(x[:, 0, 0, :], axis=1)
+    for batch_size in (5, 4, 16):  # teilt N / teilt N nicht / größer als N
+        fake = _FakeInterpreter(1, dynamic=True)
+        runner = _runner(monkeypatch, fake, batch_size)
+        assert runner.batch_size == batch_size and fake.resized == [[batch_size, 4, 4, 3]]
+        preds = runner.predict(x)
+        np.testing.assert_array_equal(preds, expected)  # Padding-Zeilen fließen nicht ein
+        assert set(fake.invoked_shapes) == {(batch_size, 4, 4, 3)}  # immer dieselbe Allokation
+        assert len(fake.invoked_shapes) == -(-len(x) // batch_size)
+    # feste Shape (Batch 1): kein Resize, Bild für Bild
+    fake = _FakeInterpreter(1, dynamic=False)
+    runner = _runner(monkeypatch, fake, 8)
+    assert runner.batch_size == 1 and fake.resized == []
+    np.testing.assert_array_equal(runner.predict(x), expected)
+    assert fake.invoked_shapes == [(1, 4, 4, 3)] * len(x)
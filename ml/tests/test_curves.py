@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+sklearn_metrics = pytest.importorskip('sklearn.metrics')
+
+from curves import macro_pr_curve, macro_roc_curve, pr_at_thresholds, roc_points, default_grid
+
+
+def _random_probs(n=2000, c=6, seed=0, quantize=None):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, c, size=n)
+    logits = rng.normal(size=(n, c)) + 2.0 * np.eye(c)[labels]
+    if quantize:
+        logits = np.round(logits * quantize) / quantize  # erzeugt Ties
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True), labels
+
+
+@pytest.mark.parametrize('quantize', [None, 4])
+def test_pr_at_sklearn_thresholds_matches(quantize):
+    probs, labels = _random_probs(quantize=quantize)
+    for c in range(probs.shape[1]):
+        y_true = labels == c
+        prec, rec, thr = sklearn_metrics.precision_recall_curve(y_true, probs[:, c])
+        p, r = pr_at_thresholds(y_true, probs[:, c], thr)
+        np.testing.assert_allclose(p, prec[:-1], rtol=0, atol=1e-12)
+        np.testing.assert_allclose(r, rec[:-1], rtol=0, atol=1e-12)
+
+
+def test_pr_above_max_score_is_precision_one_recall_zero():
+    p, r = pr_at_thresholds(np.array([1, 0, 1]), np.array([0.2, 0.5, 0.7]), np.array([0.9]))
+    assert p[0] == 1.0 and r[0] == 0.0
+
+
+@pytest.mark.parametrize('quantize', [None, 4])
+def test_roc_points_match_sklearn(quantize):
+    probs, labels = _random_probs(quantize=quantize)
+    for c in range(probs.shape[1]):
+        y_true = labels == c
+        fpr_ref, tpr_ref, _ = sklearn_metrics.roc_curve(y_true, probs[:, c])
+        fpr, tpr = roc_points(y_true, probs[:, c])
+        np.testing.assert_allclose(fpr, fpr_ref, atol=1e-12)
+        np.testing.assert_allclose(tpr, tpr_ref, atol=1e-12)
+
+
+def test_macro_roc_matches_sklearn_interpolation():
+    probs, labels = _random_probs(n=500, quantize=8)
+    grid = default_grid()
+    tprs = []
+    for c in range(probs.shape[1]):
+        fpr, tpr, _ = sklearn_metrics.roc_curve(labels == c, probs[:, c])
+        tprs.append(np.interp(grid, fpr, tpr))
+    ref_tpr = np.mean(tprs, axis=0)
+    res = macro_roc_curve(probs, labels, grid)
+    np.testing.assert_allclose(res['tpr'], ref_tpr, atol=1e-12)
+    assert res['macro_roc_auc'] == pytest.approx(sklearn_metrics.auc(grid, ref_tpr), abs=1e-12)
+
+
+def test_macro_pr_auc_matches_sklearn_auc():
+    probs, labels = _random_probs()
+    res = macro_pr_curve(probs, labels)
+    assert len(res['macro_precision']) == len(res['thresholds']) == 101
+    assert res['macro_pr_auc'] == pytest.approx(sklearn_metrics.auc(res['macro_recall'], res['macro_precision']), abs=1e-12)
+    assert res['macro_recall'][0] == pytest.approx(1.0)
+
+
+def test_classes_without_positives_are_skipped():
+    probs, labels = _random_probs(c=4)
+    labels = np.where(labels == 3, 0, labels)
+    assert np.isfinite(macro_pr_curve(probs, labels)['macro_pr_auc'])
+    assert np.isfinite(macro_roc_curve(probs, labels)['macro_roc_auc'])
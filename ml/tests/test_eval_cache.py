@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from compare_tflite_accuracy import preprocess_image
+from eval_cache import (MEAN, STD, apply_lut, eval_cache_key, input_lut, normalize, open_or_build_eval_cache,
+                        quantize_input)
+
+
+def _dataset(tmp_path, n=7):
+    rng = np.random.default_rng(0)
+    root = tmp_path / 'images'
+    samples = []
+    for i in range(n):
+        label = ['a', 'b'][i % 2]
+        (root / label).mkdir(parents=True, exist_ok=True)
+        p = root / label / f'{i}.png'
+        Image.fromarray(rng.integers(0, 256, size=(40 + i, 50, 3), dtype=np.uint8)).save(p)
+        samples.append((p, i % 2))
+    meta = tmp_path / 'meta.csv'
+    meta.write_text('filename,label\n' + ''.join(f'{p.name},{["a", "b"][l]}\n' for p, l in samples))
+    return root, meta, samples
+
+
+def test_cache_matches_preprocess_and_is_reused(tmp_path):
+    root, meta, samples = _dataset(tmp_path)
+    cache = open_or_build_eval_cache(tmp_path / 'cache', samples, meta, root, ['a', 'b'], 32, workers=1)
+    x = np.concatenate([b for b, _ in cache.iter_batches(3)])
+    ref = np.concatenate([preprocess_image(p, 32) for p, _ in samples])
+    np.testing.assert_array_equal(x, ref)  # bit-identisch zum Decode-Pfad
+    np.testing.assert_array_equal(cache.labels, [l for _, l in samples])
+    built = (cache.cache_dir / 'meta.json').stat().st_mtime_ns
+    again = open_or_build_eval_cache(tmp_path / 'cache', samples, meta, root, ['a', 'b'], 32, workers=1)
+    assert again.cache_dir == cache.cache_dir
+    assert (again.cache_dir / 'meta.json').stat().st_mtime_ns == built
+
+
+def test_key_depends_on_meta_and_size(tmp_path):
+    root, meta, _ = _dataset(tmp_path, n=2)
+    k = eval_cache_key(meta, root, ['a', 'b'], 32)
+    assert k == eval_cache_key(meta, root, ['a', 'b'], 32)
+    assert k != eval_cache_key(meta, root, ['a', 'b'], 64)
+    assert k != eval_cache_key(meta, root, ['b', 'a'], 32)
+    meta.write_text(meta.read_text() + '0.png,b\n')
+    assert k != eval_cache_key(meta, root, ['a', 'b'], 32)
+
+
+def test_image_replaced_in_place_rebuilds_cache(tmp_path):
+    root, meta, samples = _dataset(tmp_path, n=3)
+    cache = open_or_build_eval_cache(tmp_path / 'cache', samples, meta, root, ['a', 'b'], 32, workers=1)
+    p = samples[0][0]
+    st = p.stat()
+    Image.new('RGB', (40, 50), (255, 0, 0)).save(p)  # gleicher Name, gleiche meta.csv, neue Pixel
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    again = open_or_build_eval_cache(tmp_path / 'cache', samples, meta, root, ['a', 'b'], 32, workers=1)
+    assert again.cache_dir != cache.cache_dir
+    x = next(iter(again.iter_batches(1, normalized=False)))[0]
+    np.testing.assert_array_equal(x[0, 0, 0], [255, 0, 0])
+
+
+def test_quantized_input_lut_is_bit_exact_to_float_path():
+    rng = np.random.default_rng(3)
+    pixels = rng.integers(0, 256, size=(4, 9, 11, 3), dtype=np.uint8)
+    x = normalize(pixels)
+    for quant, dtype in [((0.0, 0), np.uint8),            # ohne Parameter: alter Pfad (x*std+mean -> 0..255)
+                         ((0.018658, 114), np.uint8),     # typische Full-Int8 Input-Parameter
+                         ((0.018658, -14), np.int8)]:
+        fast = apply_lut(pixels, input_lut(quant, dtype))
+        assert fast.dtype == dtype
+        np.testing.assert_array_equal(fast, quantize_input(x, quant, dtype))
+    legacy = (np.clip(x * STD + MEAN, 0, 1) * 255.0).astype(np.uint8)
+    np.testing.assert_array_equal(apply_lut(pixels, input_lut((0.0, 0), np.uint8)), legacy)
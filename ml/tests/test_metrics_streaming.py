@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from curves import macro_pr_curve, macro_roc_curve
+from metrics import MetricsTracker
+
+
+def _logits(n=3000, c=5, seed=1):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, c, size=n)
+    logits = rng.normal(size=(n, c)) + 1.5 * np.eye(c)[labels]
+    return logits, labels
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def _tracker(c):
+    return MetricsTracker(c, topk=(1, 3), score_bins=100, ece_bins=15, log_loss=True)
+
+
+def test_streaming_matches_full_array_metrics():
+    logits, labels = _logits()
+    tr = _tracker(logits.shape[1])
+    for s in range(0, len(labels), 256):  # batchweise wie im Loader
+        tr.update(logits[s:s + 256], labels[s:s + 256])
+    res = tr.compute()
+    probs = _softmax(logits)
+    ranked = np.argsort(-probs, axis=1)
+    assert res.topk[1] == pytest.approx(np.mean(ranked[:, 0] == labels))
+    assert res.topk[3] == pytest.approx(np.mean((ranked[:, :3] == labels[:, None]).any(axis=1)))
+    assert res.log_loss == pytest.approx(-np.mean(np.log(probs[np.arange(len(labels)), labels])))
+    conf, correct = probs.max(axis=1), probs.argmax(axis=1) == labels
+    bins = np.minimum((conf * 15).astype(int), 14)
+    ece = sum(abs(correct[bins == b].mean() - conf[bins == b].mean()) * (bins == b).sum() for b in np.unique(bins)) / len(labels)
+    assert res.ece == pytest.approx(ece)
+    exact_pr = macro_pr_curve(probs, labels, grid=np.linspace(0, 1, 101))
+    np.testing.assert_allclose(res.pr_curve['macro_precision'], exact_pr['macro_precision'], atol=1e-3)
+    assert res.pr_curve['macro_pr_auc'] == pytest.approx(exact_pr['macro_pr_auc'], abs=1e-3)
+    assert res.roc_curve['macro_roc_auc'] == pytest.approx(macro_roc_curve(probs, labels)['macro_roc_auc'], abs=5e-3)
+
+
+def test_torch_and_numpy_paths_agree():
+    torch = pytest.importorskip('torch')
+    logits, labels = _logits(n=500)
+    a, b = _tracker(logits.shape[1]), _tracker(logits.shape[1])
+    a.update(logits, labels)
+    b.update(torch.from_numpy(logits).float(), torch.from_numpy(labels))
+    ra, rb = a.compute(), b.compute()
+    np.testing.assert_array_equal(ra.confusion, rb.confusion)
+    assert ra.topk == rb.topk
+    assert ra.log_loss == pytest.approx(rb.log_loss, rel=1e-5)
+    assert ra.ece == pytest.approx(rb.ece, abs=1e-5)
+    assert ra.pr_curve['macro_pr_auc'] == pytest.approx(rb.pr_curve['macro_pr_auc'], abs=1e-3)
+
+
+def test_accumulators_roundtrip_and_reset():
+    logits, labels = _logits(n=200)
+    tr = _tracker(logits.shape[1])
+    tr.update(logits, labels)
+    acc = {k: v * 2 for k, v in tr.accumulators().items()}  # wie all_reduce über 2 gleiche Ranks
+    before = tr.compute()
+    tr.set_accumulators(acc)
+    after = tr.compute()
+    assert after.topk == before.topk and after.log_loss == pytest.approx(before.log_loss)
+    tr.reset()
+    assert tr.compute().topk is None
+
+
+def test_restore_after_pending_updates_does_not_double_count():
+    torch = pytest.importorskip('torch')
+    logits, labels = _logits(n=300)
+    tr = _tracker(logits.shape[1])
+    tr.update(logits[:100], labels[:100])
+    saved = {k: v.copy() for k, v in tr.accumulators().items()}
+    expected = tr.compute()
+    # Updates liegen noch als Device-Zähler in _pending / _pending_acc
+    tr.update(torch.from_numpy(logits[100:]).float(), torch.from_numpy(labels[100:]))
+    tr.set_accumulators(saved)
+    restored = tr.compute()
+    np.testing.assert_array_equal(restored.confusion, expected.confusion)
+    assert restored.topk == expected.topk and restored.log_loss == pytest.approx(expected.log_loss)
+    # cm Setter leert auch die Streaming-Zähler – unabhängig davon, ob .cm vorher gelesen (geflusht) wurde
+    for read_before in (False, True):
+        tr.update(torch.from_numpy(logits[:100]).float(), torch.from_numpy(labels[:100]))
+        if read_before:
+            tr.cm
+        tr.update(torch.from_numpy(logits[100:]).float(), torch.from_numpy(labels[100:]))
+        tr.cm = np.zeros_like(saved['cm'])
+        acc = tr.accumulators()
+        assert int(acc['cm'].sum()) == 0 and int(acc['n'][0]) == 0 and int(acc['topk'].sum()) == 0
@@ -0,0 +1,25 @@
+from pareto_report import pareto_front, select_variant
+
+
+def _row(variant, p50, f1, d_f1, d_acc):
+    return {'variant': variant, 'p50_ms': p50, 'macro_f1': f1, 'delta_macro_f1_pct': d_f1, 'delta_accuracy_pct': d_acc}
+
+
+ROWS = [
+    _row('fp32', 40.0, 0.90, 0.0, 0.0),
+    _row('float16', 38.0, 0.90, 0.0, 0.0),
+    _row('int8_dynamic', 25.0, 0.88, -2.0, -1.5),
+    _row('int16x8', 30.0, 0.87, -3.0, -2.0),   # langsamer UND schlechter als int8_dynamic
+    _row('int8_full', 12.0, 0.85, -5.0, -4.0),
+]
+
+
+def test_pareto_front_drops_dominated_variants():
+    assert pareto_front(ROWS) == ['float16', 'int8_dynamic', 'int8_full']
+
+
+def test_selects_fastest_within_drop():
+    assert select_variant(ROWS, 3.0) == 'int8_dynamic'
+    assert select_variant(ROWS, 5.0) == 'int8_full'
+    assert select_variant(ROWS, 0.5) == 'float16'
+    assert select_variant([ROWS[0]], 0.0) == 'fp32'
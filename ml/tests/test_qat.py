@@ -0,0 +1,74 @@
+import pytest
+import torch
+from torch.ao.quantization import FakeQuantizeBase
+
+from prune import build_model, load_pruned_checkpoint
+from qat import count_fake_quant, prepare_qat, update_qat_state
+
+QCFG = {'freeze_bn_epoch': 2, 'freeze_observer_epoch': 3}
+
+
+def test_prepare_qat_inserts_exportable_fake_quant_and_freezes():
+    torch.manual_seed(0)
+    x = torch.randn(2, 3, 64, 64)
+    model = prepare_qat(build_model(3), 'qnnpack', True, x)
+    fqs = [m for m in model.modules() if isinstance(m, FakeQuantizeBase)]
+    assert count_fake_quant(model) == len(fqs) > 0
+    assert all(type(m).__name__ != 'FusedMovingAvgObsFakeQuantize' for m in fqs)  # nicht ONNX-exportierbar
+    model(x).sum().backward()
+    assert update_qat_state(model, 1, QCFG) == []
+    assert update_qat_state(model, 2, QCFG) == ['bn_stats']
+    assert update_qat_state(model, 3, QCFG) == ['bn_stats', 'observer']
+    assert all(int(m.observer_enabled[0]) == 0 for m in fqs)
+    model.eval()
+    with torch.no_grad():
+        assert model(x).shape == (2, 3)
+
+
+def _trained_qat_model(x):
+    """Float Modell mit kalibrierten BN Statistiken -> QAT, Observer sehen ein paar Batches, dann eingefroren."""
+    model = build_model(3)
+    for m in model.modules():
+        if isinstance(m, torch.nn.BatchNorm2d):
+            m.momentum = None  # kumulativer Mittelwert
+        elif isinstance(m, torch.nn.Linear):
+            torch.nn.init.normal_(m.weight, 0, 0.2)
+    with torch.no_grad():
+        for _ in range(10):
+            model.train()(x + 0.1 * torch.randn_like(x))
+        model = prepare_qat(model, 'qnnpack', True, x).eval()
+        for _ in range(5):
+            model(x + 0.1 * torch.randn_like(x))
+    update_qat_state(model, 3, QCFG)
+    return model
+
+
+def test_float_export_graph_matches_fake_quant_logits():
+    """model.onnx (Deployment-Input) = QAT Modell mit FakeQuant aus -> Logits nahe am FakeQuant Modell."""
+    from torch.ao.quantization import disable_fake_quant, enable_fake_quant
+    torch.manual_seed(0)
+    x = torch.randn(8, 3, 64, 64)
+    model = _trained_qat_model(x)
+    with torch.no_grad():
+        fq = model(x)
+        model.apply(disable_fake_quant)  # wie export_qat_onnx vor dem Export von model.onnx
+        fp = model(x)
+        model.apply(enable_fake_quant)
+        again = model(x)
+    torch.testing.assert_close(again, fq, rtol=0, atol=0)
+    assert not torch.equal(fp, fq)  # FakeQuant war wirklich aktiv
+    # int8 Rundung eines untrainierten Netzes: Abweichung klein relativ zur Logit-Skala, gleiche Richtung
+    assert float((fp - fq).abs().max()) < 0.2 * float(fq.abs().max())
+    assert float(torch.nn.functional.cosine_similarity(fp.flatten(), fq.flatten(), dim=0)) > 0.97
+
+
+def test_qat_checkpoint_roundtrip_is_strict():
+    torch.manual_seed(0)
+    x = torch.randn(2, 3, 64, 64)
+    model = _trained_qat_model(x)
+    ckpt = {'model': model.state_dict(), 'qat': {'backend': 'qnnpack', 'per_channel': True}}
+    loaded = load_pruned_checkpoint(build_model(3), ckpt)
+    with torch.no_grad():
+        torch.testing.assert_close(loaded(x), model(x), rtol=0, atol=0)
+    with pytest.raises(RuntimeError):  # QAT state_dict in ein Float-Modell -> Fehler statt stillem Teil-Load
+        build_model(3).load_state_dict(ckpt['model'])
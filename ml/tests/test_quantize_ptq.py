@@ -0,0 +1,24 @@
+import quantize_ptq
+
+
+def test_saved_model_cache_is_content_addressed(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_convert(onnx_path, target):
+        calls.append(onnx_path)
+        target.mkdir(parents=True)
+        (target / 'saved_model.pb').write_bytes(onnx_path.read_bytes())
+
+    monkeypatch.setattr(quantize_ptq, 'onnx_to_saved_model', fake_convert)
+    onnx = tmp_path / 'model.onnx'
+    onnx.write_bytes(b'v1')
+    cache = (tmp_path / 'cache').as_posix()
+    first, info1 = quantize_ptq.get_saved_model(onnx, tmp_path / 'out', cache)
+    second, info2 = quantize_ptq.get_saved_model(onnx, tmp_path / 'out', cache)
+    assert first == second and not info1['cache_hit'] and info2['cache_hit']
+    assert len(calls) == 1
+    onnx.write_bytes(b'v2')  # neuer Inhalt -> neuer Key -> neue Konvertierung
+    third, info3 = quantize_ptq.get_saved_model(onnx, tmp_path / 'out', cache)
+    assert third != first and not info3['cache_hit'] and len(calls) == 2
+    assert (third / 'saved_model.pb').read_bytes() == b'v2'
+    assert not list((tmp_path / 'cache').glob('*.tmp*'))
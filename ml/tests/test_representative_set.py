@@ -0,0 +1,44 @@
+import numpy as np
+from PIL import Image
+
+from representative_set import load_or_build, preprocess_repr, representative_gen, select_stratified
+
+
+def _images(root, counts):
+    rng = np.random.default_rng(0)
+    for label, n in counts.items():
+        (root / label).mkdir(parents=True)
+        for i in range(n):
+            Image.fromarray(rng.integers(0, 256, size=(30, 40, 3), dtype=np.uint8)).save(root / label / f'{i}.png')
+
+
+def test_selection_is_stratified_and_deterministic(tmp_path):
+    _images(tmp_path, {'a': 20, 'b': 3, 'c': 8})
+    sel = select_stratified(tmp_path, 12, seed=1)
+    per_class = {c: sum(p.parent.name == c for p in sel) for c in 'abc'}
+    assert per_class == {'a': 5, 'b': 3, 'c': 4}  # kleine Klasse komplett, Rest gleichmäßig
+    assert sel == select_stratified(tmp_path, 12, seed=1)
+    assert len(select_stratified(tmp_path, 100)) == 31
+
+
+def test_cache_matches_serial_preprocessing_and_streams(tmp_path):
+    _images(tmp_path / 'img', {'a': 3, 'b': 2})
+    paths = select_stratified(tmp_path / 'img', 5)
+    arr = load_or_build(paths, 16, tmp_path / 'cache', workers=2)
+    np.testing.assert_array_equal(arr, np.stack([preprocess_repr(p, 16) for p in paths]))
+    assert len(list((tmp_path / 'cache').glob('*.npy'))) == 1
+    again = load_or_build(paths, 16, tmp_path / 'cache', workers=1)
+    assert isinstance(again, np.memmap)
+    batches = list(representative_gen(again)())
+    assert len(batches) == 5 and batches[0][0].shape == (1, 16, 16, 3) and batches[0][0].dtype == np.float32
+
+
+def test_jpeg_calibration_decodes_full_resolution(tmp_path, monkeypatch):
+    monkeypatch.setenv('LEAFSENSE_JPEG_DRAFT', '1')
+    rng = np.random.default_rng(1)
+    p = tmp_path / 'x.jpg'
+    Image.fromarray(rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)).save(p, quality=90)
+    # früherer Inline-Generator: Image.open -> RGB -> resize, ohne Draft
+    ref = np.array(Image.open(p).convert('RGB').resize((32, 32))).astype(np.float32) / 255.0
+    ref = ((ref - np.array([0.485, 0.456, 0.406])) / np.array([0.229, 0.224, 0.225])).astype(np.float32)
+    np.testing.assert_array_equal(preprocess_repr(p, 32), ref)
@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+from PIL import Image
+
+from dataset import PlantDataset
+from splits import build_split_index, row_key, sample_id
+from teacher_cache import IDS_FILE, LOGITS_FILE, META_FILE, TeacherLogitCache
+
+
+def test_same_filename_in_two_label_dirs_gets_distinct_ids(tmp_path):
+    rows = [{'filename': 'img_001.jpg', 'label': 'healthy'}, {'filename': 'img_001.jpg', 'label': 'nitrogen'}]
+    assert row_key(rows[0]) == 'healthy/img_001.jpg'
+    assert row_key({'path': 'x/y.jpg', 'filename': 'y.jpg', 'label': 'z'}) == 'x/y.jpg'
+    assert row_key(rows[0], 'filename') == 'img_001.jpg'  # explizite Spalte = altes Verhalten
+    arrays, _ = build_split_index(rows, 0.0, 0.0)
+    assert arrays['train'].size == 2
+
+    root = tmp_path / 'images'
+    for r in rows:
+        (root / r['label']).mkdir(parents=True)
+        Image.new('RGB', (8, 8)).save(root / r['label'] / r['filename'])
+    meta = tmp_path / 'meta.csv'
+    meta.write_text('filename,label\n' + ''.join(f"{r['filename']},{r['label']}\n" for r in rows))
+    ds = PlantDataset(str(root), str(meta), ['healthy', 'nitrogen'])
+    ids = ds.sample_ids
+    assert len(set(ids.tolist())) == 2
+
+    # Teacher-Logit-Cache Lookup per Sample-ID trifft je Label die eigene Zeile
+    cache_dir = tmp_path / 'teacher'
+    cache_dir.mkdir()
+    cached_ids = ids[::-1].copy()
+    np.save(cache_dir / IDS_FILE, cached_ids)
+    mm = np.memmap(cache_dir / LOGITS_FILE, dtype=np.float16, mode='w+', shape=(1, 2, 2))
+    mm[0] = [[0, 1], [1, 0]]  # Zeile 0 = nitrogen (umgekehrte Reihenfolge)
+    mm.flush()
+    (cache_dir / META_FILE).write_text(json.dumps({'signature': {'s': 1}, 'shape': [1, 2, 2]}))
+    only_second = PlantDataset(str(root), str(meta), ['healthy', 'nitrogen'], ids=[sample_id('nitrogen/img_001.jpg')])
+    cache = TeacherLogitCache.open(cache_dir, only_second.sample_ids, {'s': 1})
+    assert cache is not None
+    np.testing.assert_array_equal(cache.lookup(np.array([0]), np.array([0])).numpy(), [[0, 1]])
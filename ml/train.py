@@ -23,7 +23,7 @@ import numpy as np
 try:
     import torch
     from torch import nn
-    from torch.utils.data import DataLoader, random_split
+    from torch.utils.data import DataLoader
 except ImportError:
     torch = None  # type: ignore
 
@@ -55,7 +55,7 @@ def main():
     ap.add_argument('--config', required=True, help='Pfad zur YAML Konfiguration')
     ap.add_argument('--out', required=True, help='Ausgabeverzeichnis')
     ap.add_argument('--fast-dev-run', action='store_true', help='Nur wenige Batches (2 Train/1 Val) für schnellen Smoke-Test')
-    ap.add_argument('--resume', type=str, default=None, help='Pfad zu Checkpoint (.pt) für Resume')
+    ap.add_argument('--resume', type=str, default=None, help="Pfad zu Checkpoint (.pt) für Resume oder 'latest' (neuester in <out>/checkpoints)")
     ap.add_argument('--deterministic', action='store_true', help='cuDNN deterministisch (geringere Performance möglich)')
     ap.add_argument('--log-dir', type=str, default=None, help='Optionales TensorBoard Log Verzeichnis')
     ap.add_argument('--lr-find', action='store_true', help='Führe Learning Rate Range Test durch und beende danach')
@@ -69,7 +69,23 @@ def main():
     ap.add_argument('--median-min-delta', type=float, default=0.0, help='Minimale Verbesserung über Median um als Fortschritt zu zählen')
     ap.add_argument('--roc-curve', action='store_true', help='Erzeuge macro ROC Kurve & roc_curve.json')
     ap.add_argument('--save-miscls', type=int, default=0, help='Speichere Top-K Fehlklassifikationen mit höchsten Verlusten als Thumbnails')
+    ap.add_argument('--save-inference', action='store_true', help='Speichere Val/Test Logits, Labels & Per-Sample Losses als .npy (inference/)')
+    ap.add_argument('--step-profile', action='store_true', help='Per-Step Profiling (Loader-Wartezeit, H2D, Fwd, Bwd, Opt, img/s) -> step_profile.json + TB')
+    ap.add_argument('--profile-trace', type=str, default=None, help="torch.profiler Trace für Step-Fenster START:END (z.B. 20:25) -> profiler/")
+    ap.add_argument('--autotune-loader', action='store_true', help='Benchmarke num_workers x batch_size, schreibe loader_autotune.json + config_tuned.yaml und beende')
+    ap.add_argument('--autotune-steps', type=int, default=200, help='Gemessene Schritte je Kandidat (nach Warmup = num_workers*prefetch_factor Batches)')
+    ap.add_argument('--autotune-workers', type=str, default=None, help='Worker-Kandidaten, z.B. 0,2,4,8 (Default: 0,1,2,4,.. bis CPU-Kerne)')
+    ap.add_argument('--autotune-batch-sizes', type=str, default=None, help='Batch-Kandidaten, z.B. 32,64 (Default: bs/2, bs, 2*bs)')
+    ap.add_argument('--autotune-write-config', action='store_true', help='Bestes Ergebnis zusätzlich direkt in --config schreiben')
+    ap.add_argument('--asha-dir', type=str, default=None, help='Gemeinsames Rung-Verzeichnis eines Sweeps -> ASHA stoppt schwache Trials (siehe asha.py)')
+    ap.add_argument('--trial-id', type=str, default=None, help='Trial-Name für ASHA (Default: Name von --out)')
+    ap.add_argument('--prune-from', type=str, default=None, help='best.pt eines Laufs: strukturiert prunen (prune-Block) und mit prune.finetune_epochs nachtrainieren')
+    ap.add_argument('--prune-ratio', type=float, default=None, help='Override prune.ratio (Anteil entfernter Kanäle je Gruppe)')
+    ap.add_argument('--qat-from', type=str, default=None, help='best.pt eines Laufs: Quantization-Aware Fine-Tuning (qat-Block) + quantisierungsfreundlicher ONNX Export')
+    ap.add_argument('--scaling-baseline', type=str, default=None, help='metrics_final.json eines 1-Prozess Laufs als Referenz für DDP Scaling Efficiency')
     args = ap.parse_args()
+    if args.prune_from and args.qat_from:
+        ap.error('--prune-from und --qat-from nacheinander ausführen (erst prunen, dann QAT vom geprunten best.pt)')
 
     cfg = load_config(args.config)
     out_dir = Path(args.out)
@@ -92,11 +108,22 @@ def main():
         (out_dir / 'plan.json').write_text(json.dumps(planned, indent=2), encoding='utf-8')
         return
 
+    # DDP (torchrun, WORLD_SIZE > 1): gloo Process Group, Threads je Rank, Logs nur auf Rank 0
+    from ddp import init_distributed, wrap_model, train_sampler, eval_sampler, all_reduce_tracker, all_reduce_sum, all_reduce_max, barrier, cleanup
+    dist_ctx = init_distributed(cfg.raw.get('distributed', {}))
+    if dist_ctx.enabled:
+        if args.lr_find or args.autotune_loader:
+            raise SystemExit('--lr-find / --autotune-loader werden im DDP Modus nicht unterstützt (ohne torchrun starten)')
+        set_seed(seed + dist_ctx.rank)  # unterschiedliche Augmentierung je Rank (Init wird von DDP gebroadcastet)
+
     device_pref = cfg.raw.get('experiment', {}).get('device', 'auto')
     if device_pref == 'auto':
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
     else:
         device = device_pref
+    if dist_ctx.enabled and device == 'cuda':
+        device = f'cuda:{dist_ctx.local_rank}'
+        torch.cuda.set_device(device)
     print(f"[INFO] Device gewählt: {device}")
 
     # Dataset laden
@@ -111,26 +138,37 @@ def main():
         'healthy','nitrogen_deficiency','calcium_deficiency','overwatering','underwatering',
         'heat_stress','pest_suspect','fungal_suspect','nutrient_other','unknown'
     ]
-    from dataset import PlantDataset, build_transforms  # local import
+    from dataset import build_split_datasets, build_transforms, build_loader  # local import
+    image_size = cfg.raw.get('model', {}).get('image_size', 224)
     train_tf, val_tf = build_transforms(
-        image_size=cfg.raw.get('model', {}).get('image_size', 224),
+        image_size=image_size,
         augment_cfg=cfg.raw.get('augment')
     )
-    full_ds = PlantDataset(data_root, meta_csv, class_names, transform=train_tf)
-    val_ratio = 0.15
-    test_ratio = 0.15
-    n = len(full_ds)
-    n_val = int(n * val_ratio)
-    n_test = int(n * test_ratio)
-    n_train = n - n_val - n_test
-    train_ds, val_ds, test_ds = random_split(full_ds, [n_train, n_val, n_test], generator=torch.Generator().manual_seed(42))
-    # override val/test transforms
-    if val_tf:
-        val_ds.dataset.transform = val_tf  # type: ignore
+    # JPEG Draft-Decode: direkt in reduzierter Auflösung dekodieren (>= Resize-Ziel, siehe image_io.py)
+    decode_size = int(image_size * 1.15) if data_cfg.get('jpeg_draft', True) else None
+    # Splits: vorberechneter Index (data.split_index) oder stabiler Hash-Split nach plant_id (ml/splits.py);
+    # je Split eigenes Dataset mit eigener Transform (nur die benötigten meta.csv Zeilen werden geladen)
+    # Image Cache (data.cache: Pfad, image_cache.py): einmal dekodiert, read-only geteilt (z.B. von Sweep-Trials)
+    from image_cache import open_image_cache
+    image_cache = open_image_cache(data_cfg, int(image_size * 1.15))
+    split_ds, split_meta = build_split_datasets(data_root, meta_csv, class_names, data_cfg,
+                                                {'train': train_tf, 'val': val_tf, 'test': val_tf}, decode_size=decode_size,
+                                                image_cache=image_cache)
+    train_ds, val_ds, test_ds = split_ds['train'], split_ds['val'], split_ds['test']
+    n_train, n_val, n_test = len(train_ds), len(val_ds), len(test_ds)
+    print(f"[SPLIT] {split_meta.get('strategy')} ({split_meta.get('path') or split_meta.get('salt', '')}): train={n_train} val={n_val} test={n_test}")
     batch_size = cfg.raw.get('train', {}).get('batch_size', 32)
     num_workers = cfg.raw.get('train', {}).get('num_workers', 2)
-    train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True, num_workers=num_workers)
-    val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+    train_cfg = cfg.raw.get('train', {})
+    # DDP: DistributedSampler für Train, ungepaddete Shards für Val (exakte Metriken nach all_reduce)
+    train_dist_sampler = train_sampler(train_ds, dist_ctx, seed)
+    # Loader-Optionen (persistent_workers, prefetch_factor, pin_memory, worker_threads) aus train-Block
+    train_loader = build_loader(train_ds, batch_size, train_cfg, device, shuffle=True, sampler=train_dist_sampler)
+    val_loader = build_loader(val_ds, batch_size, train_cfg, device, sampler=eval_sampler(val_ds, dist_ctx))
+    # Progressive Resizing (train.progressive_resize): Train-Auflösung je Phase, Val/Export immer image_size
+    from progressive import parse_resize_schedule, phase_for_epoch, relative_cost
+    resize_phases = parse_resize_schedule(train_cfg, image_size)
+    train_res = (image_size, batch_size)
 
     # Modell bauen
     model_name = cfg.raw.get('model', {}).get('name', 'mobilenet_v3_small')
@@ -138,11 +176,13 @@ def main():
     model = None
     try:
         from torchvision import models
+        # --prune-from / --qat-from überschreiben alle Gewichte -> keine ImageNet Gewichte laden
+        weights = None if (args.prune_from or args.qat_from) else models.MobileNet_V3_Small_Weights.DEFAULT
         if model_name == 'mobilenet_v3_small':
-            model = models.mobilenet_v3_small(weights=models.MobileNet_V3_Small_Weights.DEFAULT)
+            model = models.mobilenet_v3_small(weights=weights)
             model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
         else:
-            model = models.mobilenet_v3_small(weights=models.MobileNet_V3_Small_Weights.DEFAULT)
+            model = models.mobilenet_v3_small(weights=weights)
             model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
     except Exception as e:
         print(f"[WARN] torchvision Modell-Laden fehlgeschlagen: {e}. Fallback auf einfache ConvNet.")
@@ -151,14 +191,64 @@ def main():
             nn.Conv2d(16, 32, 3, padding=1), nn.ReLU(), nn.MaxPool2d(2),
             nn.AdaptiveAvgPool2d((1,1)), nn.Flatten(), nn.Linear(32, num_classes)
         )
+    # Structured Pruning (--prune-from): Gewichte laden, Kanäle physisch entfernen, danach normales Fine-Tuning
+    prune_spec = None
+    prune_cfg = None
+    prune_original = None
+    if args.prune_from:
+        import prune as prune_mod
+        prune_cfg = prune_mod.prune_config(cfg.raw)
+        if args.prune_ratio is not None:
+            prune_cfg['ratio'] = args.prune_ratio
+        prune_src = torch.load(args.prune_from, map_location='cpu')
+        if prune_src.get('qat'):
+            raise SystemExit('[PRUNE] --prune-from braucht einen Float-Checkpoint (nicht den QAT best.pt)')
+        prune_mod.load_pruned_checkpoint(model, prune_src)
+        if dist_ctx.is_main:
+            import copy
+            prune_original = copy.deepcopy(model).eval()  # Referenz für den Vorher/Nachher Report am Ende
+        prune_spec = prune_mod.prune_model(model, prune_cfg['ratio'], prune_cfg['importance'], prune_cfg['round_to'],
+                                           prune_cfg['min_channels'], prune_cfg['skip'])
+        if not prune_spec:
+            print('[PRUNE][WARN] Keine prunebaren Gruppen gefunden (kein mobilenet_v3_small?) – trainiere unverändert weiter.')
+        print(f"[PRUNE] ratio={prune_cfg['ratio']} importance={prune_cfg['importance']} -> "
+              f"{prune_mod.count_params(model):,} Parameter ({len(prune_spec)} Gruppen)")
+    # Quantization-Aware Training (--qat-from): FakeQuant Observer einfügen, dann kurzes Fine-Tuning
+    qat_cfg = None
+    if args.qat_from:
+        import prune as prune_mod
+        import qat as qat_mod
+        qat_cfg = qat_mod.qat_config(cfg.raw)
+        qat_src = torch.load(args.qat_from, map_location='cpu')
+        if qat_src.get('qat'):
+            raise SystemExit('[QAT] --qat-from braucht einen Float-Checkpoint (QAT best.pt ist bereits vorbereitet)')
+        prune_mod.load_pruned_checkpoint(model, qat_src)  # auch geprunte Checkpoints (prune_spec)
+        prune_spec = qat_src.get('prune_spec')
+        model = qat_mod.prepare_qat(model, qat_cfg['backend'], qat_cfg['per_channel'],
+                                    torch.randn(2, 3, image_size, image_size))
+        print(f"[QAT] backend={qat_cfg['backend']} per_channel={qat_cfg['per_channel']} "
+              f"{qat_mod.count_fake_quant(model)} FakeQuant Module, {qat_cfg['epochs']} Epochen")
     model.to(device)
 
+    # Performance Modi (experiment.compile / channels_last / cpu_bf16) – alle opt-in mit Fallback
+    from performance import setup_performance
+    perf = setup_performance(model, device, cfg.raw.get('experiment', {}))
+    net = perf.wrap(wrap_model(model, dist_ctx))  # Forward über net (ggf. DDP); state_dict / Export / Checkpoints über model
+
     # Optimizer / Scheduler
     opt_cfg = cfg.raw.get('optimizer', {})
     lr = opt_cfg.get('lr', 1e-3)
+    if prune_cfg is not None and prune_cfg['lr'] is not None:
+        lr = float(prune_cfg['lr'])
+    if qat_cfg is not None and qat_cfg['lr'] is not None:
+        lr = float(qat_cfg['lr'])
     wd = opt_cfg.get('weight_decay', 0.0)
     optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=wd)
     epochs = cfg.raw.get('train', {}).get('epochs', 10)
+    if prune_cfg is not None:
+        epochs = prune_cfg['finetune_epochs']
+    if qat_cfg is not None:
+        epochs = qat_cfg['epochs']
     criterion = nn.CrossEntropyLoss(label_smoothing=cfg.raw.get('loss', {}).get('label_smoothing', 0.0))
     # Class Weights Handling (list or path)
     cw_cfg = cfg.raw.get('loss', {}).get('class_weights')
@@ -177,7 +267,11 @@ def main():
             print(f"[LOSS][WARN] Konnte Class Weights nicht laden: {e}")
 
     from metrics import MetricsTracker
-    tracker = MetricsTracker(num_classes)
+    metrics_cfg = cfg.raw.get('metrics', {}) or {}
+    # Streaming Akkumulatoren (konstanter Speicher, DDP-reduzierbar): Top-k, ECE, Log-Loss
+    tracker = MetricsTracker(num_classes, topk=metrics_cfg.get('topk', ()) or (),
+                             score_bins=int(metrics_cfg.get('score_bins', 0) or 0),
+                             ece_bins=int(metrics_cfg.get('ece_bins', 15) or 0), log_loss=True)
     best_macro = -1.0
     patience = cfg.raw.get('train', {}).get('early_stop_patience', 5)
     no_improve = 0
@@ -186,7 +280,10 @@ def main():
     median_min_delta = args.median_min_delta
     f1_history: list[float] = []
     median_no_improve = 0
-    use_amp = bool(cfg.raw.get('experiment', {}).get('mixed_precision', False) and device == 'cuda')
+    use_amp = bool(cfg.raw.get('experiment', {}).get('mixed_precision', False) and device.startswith('cuda'))
+    # Loss-Sync: standardmäßig Device-Tensor-Akkumulation, .item() nur pro Log-Intervall / Epoche
+    log_interval = cfg.raw.get('logging', {}).get('interval_steps', 50)
+    sync_every_batch = bool(cfg.raw.get('logging', {}).get('sync_every_batch', False))
     if use_amp:
         print('[AMP] Mixed Precision aktiviert')
         scaler = torch.cuda.amp.GradScaler()
@@ -197,17 +294,28 @@ def main():
 
     def validate():
         model.eval()
-        tracker.cm[:] = 0
+        tracker.reset()
         total_loss = 0.0
+        count = 0
+        loss_sum = torch.zeros((), device=device)  # Device-Akkumulator: ein Sync pro Validierung statt pro Batch
         with torch.no_grad():
             for x, y in val_loader:
-                x, y = x.to(device), y.to(device)
-                out = model(x)
-                loss = criterion(out, y)
-                total_loss += float(loss.item()) * x.size(0)
+                x, y = perf.prepare_input(x.to(device)), y.to(device)
+                with perf.autocast():
+                    out = net(x)
+                loss = criterion(out.float(), y)
+                if sync_every_batch:
+                    total_loss += float(loss.item()) * x.size(0)
+                else:
+                    loss_sum += loss.detach() * x.size(0)
+                count += x.size(0)
                 tracker.update(out, y)
+        if not sync_every_batch:
+            total_loss = float(loss_sum.item())
+        all_reduce_tracker(tracker, dist_ctx)
+        total_loss, count = all_reduce_sum([total_loss, count], dist_ctx)
         res = tracker.compute()
-        return total_loss / len(val_loader.dataset), res
+        return total_loss / max(1, count), res
 
     warmup_epochs = opt_cfg.get('warmup_epochs', 0)
     cosine = opt_cfg.get('cosine_schedule', False)
@@ -230,6 +338,42 @@ def main():
         lr_history.append(current)
         return current
 
+    # DataLoader Autotuning: Worker x Batch-Größe mit echtem Dataset + Modell (Fwd/Bwd ohne Optimizer-Step)
+    if args.autotune_loader:
+        from loader_autotune import autotune, candidate_workers, parse_int_list, write_tuned_config
+        workers = parse_int_list(args.autotune_workers) or candidate_workers()
+        batch_sizes = parse_int_list(args.autotune_batch_sizes) or sorted({max(1, batch_size // 2), batch_size, batch_size * 2})
+        model.train()
+
+        def autotune_step(x, y):
+            x, y = perf.prepare_input(x.to(device)), y.to(device)
+            with perf.autocast():
+                loss = criterion(net(x), y)
+            loss.backward()
+            model.zero_grad(set_to_none=True)
+
+        def make_loader(nw: int, bs: int):
+            return build_loader(train_ds, bs, {**train_cfg, 'num_workers': nw}, device, shuffle=True, persistent=False)
+
+        print(f"[AUTOTUNE] Workers {workers} x Batch {batch_sizes}, {args.autotune_steps} Steps je Kandidat")
+        tune = autotune(make_loader, autotune_step, workers, batch_sizes, args.autotune_steps,
+                        prefetch_factor=int(train_cfg.get('prefetch_factor', 2) or 2))
+        tune['baseline'] = {'num_workers': num_workers, 'batch_size': batch_size}
+        tune['device'] = device
+        tune['cpu_count'] = os.cpu_count()
+        with open(out_dir / 'loader_autotune.json', 'w', encoding='utf-8') as f:
+            json.dump(tune, f, indent=2)
+        best = tune['best']
+        if best is None:
+            print('[AUTOTUNE][WARN] Kein Kandidat erfolgreich – Config unverändert.')
+            return
+        tuned_path = write_tuned_config(Path(args.config), out_dir / 'config_tuned.yaml', best)
+        print(f"[AUTOTUNE] Bestes Setting: num_workers={best['num_workers']} batch_size={best['batch_size']} ({best['img_per_s']:.1f} img/s) -> {tuned_path}")
+        if args.autotune_write_config:
+            write_tuned_config(Path(args.config), Path(args.config), best)
+            print(f"[AUTOTUNE] Config aktualisiert: {args.config}")
+        return
+
     # TensorBoard Setup (lazy import)
     # LR Finder (Leslie Smith Range Test)
     if args.lr_find:
@@ -244,10 +388,11 @@ def main():
         steps_done = 0
         model.train()
         for batch, (x, y) in enumerate(train_loader):
-            x, y = x.to(device), y.to(device)
+            x, y = perf.prepare_input(x.to(device)), y.to(device)
             optimizer.zero_grad(set_to_none=True)
-            out = model(x)
-            loss = criterion(out, y)
+            with perf.autocast():
+                out = net(x)
+                loss = criterion(out, y)
             loss.backward()
             optimizer.step()
             l = float(loss.item())
@@ -277,7 +422,7 @@ def main():
             tb_writer.close()
         return
     tb_writer = None
-    if args.log_dir:
+    if args.log_dir and dist_ctx.is_main:
         try:
             from torch.utils.tensorboard import SummaryWriter
             log_dir = Path(args.log_dir)
@@ -289,19 +434,60 @@ def main():
 
     print(f"[INFO] Starte Training: {epochs} Epochen, {n_train} Train-Samples, {n_val} Val-Samples (warmup={warmup_epochs}, cosine={cosine})")
     start_epoch = 1
+    # Checkpointing: best.pt + periodische Full-State Checkpoints (Hintergrund-Thread, atomar, rotierend)
+    from checkpointing import AsyncCheckpointer, FULL_STATE_FORMAT, capture_rng_state, restore_rng_state, load_checkpoint, latest_checkpoint
+    ckpt_every = int(train_cfg.get('checkpoint_every', 1))
+    # ASHA (Sweeps): Trial meldet macro_f1 an Rung-Epochen, schwache Trials stoppen früh
+    from asha import AshaPruner
+    asha = AshaPruner.from_config(cfg.raw.get('asha'), args.asha_dir, args.trial_id or out_dir.name, epochs)
+    if asha is not None:
+        print(f"[ASHA] Rungs {asha.rungs} (eta={asha.reduction_factor}) -> {asha.rung_dir}")
+    checkpointer = AsyncCheckpointer(out_dir / 'checkpoints', keep_last=int(train_cfg.get('checkpoint_keep_last', 3)),
+                                     async_write=bool(train_cfg.get('async_checkpoint', True)))
     # Resume Support
     if args.resume:
-        ckpt_path = Path(args.resume)
-        if ckpt_path.exists():
+        ckpt_path = latest_checkpoint(out_dir / 'checkpoints') if args.resume == 'latest' else Path(args.resume)
+        if ckpt_path is None:
+            print(f"[RESUME][WARN] Kein Checkpoint unter {out_dir / 'checkpoints'} – starte neu.")
+        elif ckpt_path.exists():
             try:
-                ckpt = torch.load(ckpt_path, map_location='cpu')
+                ckpt = load_checkpoint(ckpt_path, map_location='cpu')
                 model.load_state_dict(ckpt['model'])
                 best_macro = float(ckpt.get('macro_f1', best_macro))
                 start_epoch = int(ckpt.get('epoch', 0)) + 1
-                print(f"[RESUME] Geladen ab Epoch {start_epoch-1} best_macro={best_macro:.4f}")
+                if ckpt.get('format') == FULL_STATE_FORMAT:
+                    optimizer.load_state_dict(ckpt['optimizer'])
+                    if scaler is not None and ckpt.get('scaler'):
+                        scaler.load_state_dict(ckpt['scaler'])
+                    lr_history[:] = ckpt.get('lr_history', [])
+                    f1_history[:] = ckpt.get('f1_history', [])
+                    es = ckpt.get('early_stopping', {})
+                    no_improve = int(es.get('no_improve', 0))
+                    median_no_improve = int(es.get('median_no_improve', 0))
+                    if ckpt.get('rng'):
+                        restore_rng_state(ckpt['rng'])
+                    print(f"[RESUME] Full State geladen (Optimizer/Scaler/LR/RNG/Early-Stop) ab Epoch {start_epoch-1} best_macro={best_macro:.4f}")
+                else:
+                    print(f"[RESUME] Geladen ab Epoch {start_epoch-1} best_macro={best_macro:.4f} (nur Gewichte – Optimizer startet neu)")
             except Exception as e:
                 print(f"[RESUME][WARN] Konnte Checkpoint nicht laden: {e}")
 
+    def full_state(epoch: int):
+        return {
+            'format': FULL_STATE_FORMAT,
+            'model': model.state_dict(),
+            'macro_f1': best_macro,
+            'epoch': epoch,
+            'optimizer': optimizer.state_dict(),
+            'scaler': scaler.state_dict() if scaler is not None else None,
+            'lr_history': list(lr_history),
+            'f1_history': list(f1_history),
+            'early_stopping': {'no_improve': no_improve, 'median_no_improve': median_no_improve},
+            'rng': capture_rng_state(),
+            'prune_spec': prune_spec,
+            'qat': qat_cfg,
+        }
+
     # Mixup / Cutmix config
     aug_cfg = cfg.raw.get('augment', {})
     mixup_cfg = aug_cfg.get('mixup', {}) or {}
@@ -310,10 +496,57 @@ def main():
     mixup_alpha = float(mixup_cfg.get('alpha', 0.2))
     use_cutmix = bool(cutmix_cfg.get('enabled', False))
     cutmix_alpha = float(cutmix_cfg.get('alpha', 1.0))
+    # batch: ein lam pro Batch (Host RNG) | per_sample: lam/Box/Methode je Sample, komplett auf dem Device
+    mix_mode = str(aug_cfg.get('mix_mode', 'batch'))
+    if (use_mixup or use_cutmix) and mix_mode not in ('batch', 'per_sample'):
+        print(f"[MIX][WARN] Unbekannter augment.mix_mode={mix_mode} – verwende 'batch'")
+        mix_mode = 'batch'
+    # Per-Sample Verlust für gemischte Targets (gleiche Gewichte / Label Smoothing wie criterion)
+    criterion_per_sample = nn.CrossEntropyLoss(weight=criterion.weight, label_smoothing=criterion.label_smoothing, reduction='none')
+    beta_cache = {}
+
+    def sample_beta(alpha: float, n: int, dev):
+        key = (alpha, str(dev))
+        if key not in beta_cache:
+            a = torch.tensor(alpha, dtype=torch.float32, device=dev)
+            beta_cache[key] = torch.distributions.Beta(a, a)
+        return beta_cache[key].sample((n,))
+
+    def mix_per_sample(x, y):
+        n, _, H, W = x.shape
+        dev = x.device
+        perm = torch.randperm(n, device=dev)
+        x_b = x[perm]
+        if use_mixup and use_cutmix:
+            use_cut = torch.rand(n, device=dev) < 0.5
+        else:
+            use_cut = torch.full((n,), use_cutmix, dtype=torch.bool, device=dev)
+        lam_mix = sample_beta(mixup_alpha, n, dev)
+        lam_cut = sample_beta(cutmix_alpha, n, dev)
+        # CutMix Boxen je Sample (Vektor-Variante von rand_bbox)
+        cut_rat = torch.sqrt(1.0 - lam_cut)
+        cut_w = (W * cut_rat).long()
+        cut_h = (H * cut_rat).long()
+        cx = torch.randint(W, (n,), device=dev)
+        cy = torch.randint(H, (n,), device=dev)
+        x1 = (cx - cut_w // 2).clamp(0, W); x2 = (cx + cut_w // 2).clamp(0, W)
+        y1 = (cy - cut_h // 2).clamp(0, H); y2 = (cy + cut_h // 2).clamp(0, H)
+        xs = torch.arange(W, device=dev).view(1, 1, W)
+        ys = torch.arange(H, device=dev).view(1, H, 1)
+        box = (xs >= x1.view(-1, 1, 1)) & (xs < x2.view(-1, 1, 1)) & (ys >= y1.view(-1, 1, 1)) & (ys < y2.view(-1, 1, 1))
+        lam_cut = 1 - ((x2 - x1) * (y2 - y1)).float() / float(H * W)
+        lam_v = lam_mix.view(-1, 1, 1, 1).to(x.dtype)
+        x_cut = torch.where(box.unsqueeze(1), x_b, x)
+        x_mix = lam_v * x + (1 - lam_v) * x_b
+        x = torch.where(use_cut.view(-1, 1, 1, 1), x_cut, x_mix)
+        lam = torch.where(use_cut, lam_cut, lam_mix)
+        return x, (y, y[perm], lam, 'per_sample'), 'per_sample'
 
     def apply_mixup_cutmix(x, y):
         if not (use_mixup or use_cutmix):
-            return x, y, None
+            return x, None, None
+        if mix_mode == 'per_sample':
+            return mix_per_sample(x, y)
         lam = 1.0
         mode = None
         if use_mixup and use_cutmix:
@@ -326,7 +559,7 @@ def main():
             mode = 'mixup'
         else:
             mode = 'cutmix'
-        indices = torch.randperm(x.size(0))
+        indices = torch.randperm(x.size(0), device=x.device)
         if mode == 'mixup':
             lam = np.random.beta(mixup_alpha, mixup_alpha)
             x = lam * x + (1 - lam) * x[indices]
@@ -341,6 +574,9 @@ def main():
 
     def mixup_criterion(pred, target_tuple):
         y_a, y_b, lam, mode = target_tuple
+        if mode == 'per_sample':
+            # lam ist ein (N,) Tensor; Mittelwert über Samples (bei Class Weights nicht gewichts-normiert)
+            return (lam * criterion_per_sample(pred, y_a) + (1 - lam) * criterion_per_sample(pred, y_b)).mean()
         return lam * criterion(pred, y_a) + (1 - lam) * criterion(pred, y_b)
 
     def rand_bbox(size, lam):
@@ -358,68 +594,133 @@ def main():
         bby2 = np.clip(cy + cut_h // 2, 0, H)
         return bbx1, bby1, bbx2, bby2
 
+    # Step Profiler (opt-in): Zeitanteile je Phase, img/s, Loader Queue-Tiefe
+    from step_profiler import StepProfiler, NullStepProfiler, parse_trace_window, queue_depth
+    if args.step_profile or args.profile_trace:
+        prof = StepProfiler(device, tb_writer=tb_writer, trace_window=parse_trace_window(args.profile_trace), trace_dir=out_dir / 'profiler')
+    else:
+        prof = NullStepProfiler()
+    step_times: list[float] = []  # Sekunden je Trainingsschritt (H2D bis loss.item)
+    step_samples: list[int] = []   # Samples je Schritt (Progressive Resizing: Batchgröße je Phase verschieden)
+    train_seconds = 0.0   # reine Train-Loop Zeit (ohne Validierung)
+    train_samples = 0
     for epoch in range(start_epoch, epochs+1):
         current_lr = adjust_lr(epoch)
+        phase = phase_for_epoch(resize_phases, epoch)
+        if phase is not None and (phase.size, phase.batch_size or batch_size) != train_res:
+            train_res = (phase.size, phase.batch_size or batch_size)
+            train_ds.transform = build_transforms(image_size=phase.size, augment_cfg=cfg.raw.get('augment'))[0]
+            train_ds.decode_size = int(phase.size * 1.15) if data_cfg.get('jpeg_draft', True) else None
+            train_loader = build_loader(train_ds, train_res[1], train_cfg, device, shuffle=True, sampler=train_dist_sampler)
+            print(f"[RESIZE] Epoch {epoch}: Train {phase.size}px, batch_size={train_res[1]}")
+        if train_dist_sampler is not None:
+            train_dist_sampler.set_epoch(epoch)
+        t_epoch = time.perf_counter()
         if epoch == 1 or epoch % 5 == 0 or epoch == epochs:
             print(f"[LR] Epoch {epoch} lr={current_lr:.6f}")
+        if qat_cfg is not None:
+            frozen = qat_mod.update_qat_state(model, epoch, qat_cfg)
+            if frozen and epoch in (qat_cfg['freeze_bn_epoch'], qat_cfg['freeze_observer_epoch']):
+                print(f"[QAT] Epoch {epoch}: eingefroren {', '.join(frozen)}")
         model.train()
         running = 0.0
+        running_t = torch.zeros((), device=device)
         max_train_batches = 2 if args.fast_dev_run else None
-        for i, (x, y) in enumerate(train_loader):
+        prof.start_epoch(epoch)
+        train_steps_epoch = 0
+        train_iter = iter(train_loader)
+        for i, (x, y) in enumerate(train_iter):
+            prof.mark('data_wait')
             if max_train_batches is not None and i >= max_train_batches:
                 break
-            x, y = x.to(device), y.to(device)
+            t_step = time.perf_counter()
+            x, y = perf.prepare_input(x.to(device)), y.to(device)
+            prof.mark('h2d')
             optimizer.zero_grad(set_to_none=True)
             if use_amp:
                 with torch.cuda.amp.autocast():
                     x_aug, target_aug, mode = apply_mixup_cutmix(x, y)
-                    out = model(x_aug)
+                    out = net(x_aug)
                     if target_aug is not None:
                         loss = mixup_criterion(out, target_aug)
                     else:
                         loss = criterion(out, y)
+                prof.mark('fwd')
                 scaler.scale(loss).backward()
+                prof.mark('bwd')
                 torch.nn.utils.clip_grad_norm_(model.parameters(), cfg.raw.get('train', {}).get('gradient_clip_norm', 5.0))
                 scaler.step(optimizer)
                 scaler.update()
             else:
-                x_aug, target_aug, mode = apply_mixup_cutmix(x, y)
-                out = model(x_aug)
-                if target_aug is not None:
-                    loss = mixup_criterion(out, target_aug)
-                else:
-                    loss = criterion(out, y)
+                with perf.autocast():
+                    x_aug, target_aug, mode = apply_mixup_cutmix(x, y)
+                    out = net(x_aug)
+                    if target_aug is not None:
+                        loss = mixup_criterion(out, target_aug)
+                    else:
+                        loss = criterion(out, y)
+                prof.mark('fwd')
                 loss.backward()
+                prof.mark('bwd')
                 torch.nn.utils.clip_grad_norm_(model.parameters(), cfg.raw.get('train', {}).get('gradient_clip_norm', 5.0))
                 optimizer.step()
-            running += float(loss.item())
-            if (i+1) % cfg.raw.get('logging', {}).get('interval_steps', 50) == 0:
+            prof.mark('opt')
+            if sync_every_batch:
+                running += float(loss.item())  # Debug: Sync + Host-Roundtrip je Batch
+            else:
+                running_t += loss.detach()
+            step_times.append(time.perf_counter() - t_step)
+            step_samples.append(x.size(0))
+            train_samples += x.size(0)
+            if (i+1) % log_interval == 0:
+                if not sync_every_batch:
+                    running = float(running_t.item())
                 print(f"[E{epoch}][{i+1}] loss={running/(i+1):.4f}")
+            prof.end_step(x.size(0), queue_depth(train_iter) if prof.enabled else None)
+            train_steps_epoch = i + 1
+        train_seconds += time.perf_counter() - t_epoch
+        if not sync_every_batch:
+            running = float(running_t.item())
+        train_loss = running / max(1, train_steps_epoch)
         # Fast dev run: only 1 val batch
         if args.fast_dev_run:
             # manual mini-val loop
-            model.eval(); tracker.cm[:] = 0; total_loss = 0.0
+            model.eval(); tracker.reset(); total_loss = 0.0; count = 0
             with torch.no_grad():
                 for j, (vx, vy) in enumerate(val_loader):
                     if j > 0: break
-                    vx, vy = vx.to(device), vy.to(device)
-                    vout = model(vx)
-                    vloss = criterion(vout, vy)
-                    total_loss += float(vloss.item()) * vx.size(0)
+                    vx, vy = perf.prepare_input(vx.to(device)), vy.to(device)
+                    with perf.autocast():
+                        vout = net(vx)
+                    vloss = criterion(vout.float(), vy)
+                    total_loss += float(vloss.item()) * vx.size(0)  # nur 1 Batch
+                    count += vx.size(0)
                     tracker.update(vout, vy)
+            all_reduce_tracker(tracker, dist_ctx)
+            total_loss, count = all_reduce_sum([total_loss, count], dist_ctx)
             metrics_res = tracker.compute()
-            val_loss = total_loss / ((j+1) * val_loader.batch_size)
+            val_loss = total_loss / max(1, count)
         else:
             val_loss, metrics_res = validate()
         if use_amp and scaler is not None:
             print(f"[VAL][Epoch {epoch}] loss={val_loss:.4f} macro_f1={metrics_res.macro_f1:.4f} scaler_scale={scaler.get_scale():.2f}")
         else:
             print(f"[VAL][Epoch {epoch}] loss={val_loss:.4f} macro_f1={metrics_res.macro_f1:.4f}")
+        if metrics_res.topk:
+            extra = ' '.join(f"top{k}={v:.4f}" for k, v in metrics_res.topk.items())
+            print(f"[VAL][Epoch {epoch}] {extra} ece={metrics_res.ece:.4f} nll={metrics_res.log_loss:.4f}")
         if tb_writer:
             global_step = (epoch - 1) * len(train_loader)
             tb_writer.add_scalar('val/loss', val_loss, epoch)
+            tb_writer.add_scalar('train/loss', train_loss, epoch)
             tb_writer.add_scalar('val/macro_f1', metrics_res.macro_f1, epoch)
             tb_writer.add_scalar('train/last_lr', current_lr, epoch)
+            for k, v in (metrics_res.topk or {}).items():
+                tb_writer.add_scalar(f'val/top{k}_acc', v, epoch)
+            if metrics_res.ece is not None:
+                tb_writer.add_scalar('val/ece', metrics_res.ece, epoch)
+            if metrics_res.log_loss is not None:
+                tb_writer.add_scalar('val/log_loss', metrics_res.log_loss, epoch)
             # Confusion matrix as image (small helper)
             try:
                 import matplotlib.pyplot as plt
@@ -433,7 +734,6 @@ def main():
                 buf = io.BytesIO()
                 fig.savefig(buf, format='png')
                 buf.seek(0)
-                import numpy as np
                 import PIL.Image as PILImage
                 img = PILImage.open(buf)
                 img_np = np.array(img).transpose(2,0,1)  # CHW
@@ -445,10 +745,13 @@ def main():
         if metrics_res.macro_f1 > best_macro:
             best_macro = metrics_res.macro_f1
             no_improve = 0
-            torch.save({'model': model.state_dict(), 'macro_f1': best_macro, 'epoch': epoch}, out_dir / 'best.pt')
+            if dist_ctx.is_main:
+                checkpointer.save({'model': model.state_dict(), 'macro_f1': best_macro, 'epoch': epoch,
+                                   'prune_spec': prune_spec, 'qat': qat_cfg}, out_dir / 'best.pt')
             print(f"[SAVE] Neuer Bestwert macro_f1={best_macro:.4f}")
         else:
             no_improve += 1
+        stop_msg = None
         # Median Early Stopping
         if median_window > 0 and len(f1_history) >= median_window:
             import numpy as _np
@@ -460,13 +763,40 @@ def main():
             else:
                 median_no_improve = 0
             if median_patience > 0 and median_no_improve >= median_patience:
-                print(f"[EARLY STOP MEDIAN] Keine median-basierte Verbesserung nach {median_no_improve} Epochen (Window={median_window}).")
-                break
+                stop_msg = f"[EARLY STOP MEDIAN] Keine median-basierte Verbesserung nach {median_no_improve} Epochen (Window={median_window})."
         # Klassischer Early Stop
-        if no_improve >= patience:
-            print(f"[EARLY STOP] Keine Verbesserung {no_improve} Epochen.")
+        if stop_msg is None and no_improve >= patience:
+            stop_msg = f"[EARLY STOP] Keine Verbesserung {no_improve} Epochen."
+        # ASHA: nur Rank 0 schreibt ins Rung-Verzeichnis, Entscheidung an alle Ranks
+        if asha is not None:
+            pruned = 0.0 if not dist_ctx.is_main or asha.report(epoch, metrics_res.macro_f1) else 1.0
+            pruned, = all_reduce_sum([pruned], dist_ctx)
+            if stop_msg is None and pruned > 0:
+                stop_msg = f"[ASHA] Trial gestoppt an Rung Epoch {epoch} (macro_f1={metrics_res.macro_f1:.4f} nicht in Top 1/{asha.reduction_factor})."
+        # Full-State Checkpoint (inkl. Early-Stop Zähler dieser Epoche)
+        if dist_ctx.is_main and ckpt_every > 0 and (epoch % ckpt_every == 0 or epoch == epochs or stop_msg):
+            checkpointer.save_full(full_state(epoch))
+        if stop_msg:
+            print(stop_msg)
             break
 
+    # Durchsatz über alle Ranks (Samples summiert, langsamster Rank bestimmt die Zeit)
+    train_samples_all, = all_reduce_sum([train_samples], dist_ctx)
+    train_seconds_max = all_reduce_max(train_seconds, dist_ctx)
+    throughput = {
+        'samples': int(train_samples_all),
+        'seconds': train_seconds_max,
+        'samples_per_s': train_samples_all / train_seconds_max if train_seconds_max > 0 else None,
+    }
+    # Ab hier nur Rank 0: Export, Post-hoc Auswertung, Reports
+    checkpointer.flush()
+    barrier(dist_ctx)
+    if not dist_ctx.is_main:
+        checkpointer.close()
+        cleanup(dist_ctx)
+        return
+    profile_summary = prof.write(out_dir / 'step_profile.json') if prof.enabled else None
+
     # Export ONNX / TFLite (Stub if conversion fails)
     export_cfg = cfg.raw.get('export', {})
     model.eval()
@@ -474,7 +804,11 @@ def main():
     if export_cfg.get('onnx'):
         onnx_path = out_dir / 'model.onnx'
         try:
-            torch.onnx.export(model, dummy, onnx_path.as_posix(), input_names=['input'], output_names=['logits'], opset_version=17)
+            if qat_cfg is not None:
+                # QAT: model.onnx = Float-Graph mit QAT-Gewichten (-> quantize_ptq int8_full), dazu model_qat_qdq.onnx
+                qat_mod.export_qat_onnx(model, dummy, out_dir, qat_cfg['export_qdq'])
+            else:
+                torch.onnx.export(model, dummy, onnx_path.as_posix(), input_names=['input'], output_names=['logits'], opset_version=17)
             print(f"[EXPORT] ONNX: {onnx_path}")
             if export_cfg.get('simplify_onnx', False):
                 try:
@@ -497,97 +831,76 @@ def main():
         # Placeholder: tatsächliche Konvertierung erfordert TF oder onnx2tf Pipeline
         (out_dir / 'model_tflite_placeholder.txt').write_text('Konvertierung noch nicht implementiert.')
         print('[EXPORT] TFLite Placeholder erzeugt.')
+    prune_report = None
+    if prune_cfg is not None:
+        # Vorher/Nachher: Parameter, ONNX / TFLite fp32 Größe, CPU Latenz (Batch 1) -> prune_report.json
+        # (beide direkt nacheinander gemessen, damit die Latenzen vergleichbar sind)
+        prune_before = prune_mod.model_stats(prune_original, image_size, out_dir / 'prune' / 'before', prune_cfg['report_tflite'],
+                                             prune_cfg['latency_iters'], prune_cfg['latency_threads'])
+        prune_after = prune_mod.model_stats(model, image_size, out_dir / 'prune' / 'after', prune_cfg['report_tflite'],
+                                            prune_cfg['latency_iters'], prune_cfg['latency_threads'])
+        prune_report = {'source': args.prune_from, 'finetuned': True, 'finetune_epochs': epochs, 'config': prune_cfg,
+                        'prune_spec': prune_spec, 'before': prune_before, 'after': prune_after,
+                        'change': prune_mod.compare_stats(prune_before, prune_after)}
+        (out_dir / 'prune_report.json').write_text(json.dumps(prune_report, indent=2), encoding='utf-8')
+        prune_mod.print_report(prune_report)
 
-    # Optional Test Evaluation mit Best-Checkpoint
+    # Post-hoc Auswertung: Val/Test je genau einmal mit Best-Checkpoint inferieren (Logits/Labels/Losses Cache),
+    # Test-Metriken, PR, ROC und Fehlklassifikationen werden daraus berechnet (kein erneutes Dekodieren).
+    from inference_results import collect_inference
     test_metrics = None
+    val_results = None
+    test_results = None
+    post_max_batches = 1 if args.fast_dev_run else None
+    checkpointer.flush()  # best.pt muss vollständig geschrieben sein
     try:
-        if 'test_ds' in locals() and (out_dir / 'best.pt').exists():
+        if (out_dir / 'best.pt').exists():
             best_ckpt = torch.load(out_dir / 'best.pt', map_location=device)
             model.load_state_dict(best_ckpt['model'])
-            model.eval(); tracker.cm[:] = 0
-            test_loader = DataLoader(test_ds, batch_size=batch_size, shuffle=False, num_workers=num_workers)
-            test_loss_accum = 0.0
-            with torch.no_grad():
-                for tx, ty in test_loader:
-                    tx, ty = tx.to(device), ty.to(device)
-                    tout = model(tx)
-                    tloss = criterion(tout, ty)
-                    test_loss_accum += float(tloss.item()) * tx.size(0)
-                    tracker.update(tout, ty)
-            t_res = tracker.compute()
-            test_metrics = {
-                'loss': test_loss_accum / len(test_loader.dataset),
-                'macro_f1': t_res.macro_f1,
-                'confusion': t_res.confusion.tolist(),
-                'per_class': t_res.per_class
-            }
-            print(f"[TEST] loss={test_metrics['loss']:.4f} macro_f1={test_metrics['macro_f1']:.4f}")
+        need_val = args.pr_curve or args.roc_curve or args.save_miscls > 0 or args.save_inference
+        if need_val:
+            # DDP: val_loader ist nur der Shard von Rank 0 -> vollständigen Loader in Split-Reihenfolge verwenden
+            post_val_loader = build_loader(val_ds, batch_size, train_cfg, device, persistent=False) if dist_ctx.enabled else val_loader
+            val_results = collect_inference(model, post_val_loader, device, criterion_per_sample, max_batches=post_max_batches)
+        if (out_dir / 'best.pt').exists():
+            test_loader = build_loader(test_ds, batch_size, train_cfg, device, persistent=False)
+            test_results = collect_inference(model, test_loader, device, criterion_per_sample, max_batches=post_max_batches)
+        if args.save_inference:
+            inf_dir = out_dir / 'inference'
+            if val_results is not None:
+                val_results.save(inf_dir, 'val')
+            if test_results is not None:
+                test_results.save(inf_dir, 'test')
+            print(f"[INFER] Logits/Labels/Losses gespeichert -> {inf_dir}")
     except Exception as e:
-        print(f"[TEST][WARN] Test-Eval fehlgeschlagen: {e}")
+        print(f"[INFER][WARN] Inferenz-Durchlauf fehlgeschlagen: {e}")
+
+    if test_results is not None and len(test_results):
+        tracker.reset()
+        tracker.update(test_results.logits, test_results.labels)
+        t_res = tracker.compute()
+        test_metrics = {
+            # Mittel der Per-Sample Verluste (bei Class Weights nicht gewichts-normiert)
+            'loss': test_results.mean_loss(),
+            'macro_f1': t_res.macro_f1,
+            'confusion': t_res.confusion.tolist(),
+            'per_class': t_res.per_class,
+            **t_res.streaming_summary(),
+        }
+        print(f"[TEST] loss={test_metrics['loss']:.4f} macro_f1={test_metrics['macro_f1']:.4f}")
 
     # PR Curve (Val) falls angefordert
     pr_curve = None
     roc_curve_data = None
-    if args.pr_curve:
+    if args.pr_curve and val_results is not None:
         try:
             print('[PR] Berechne Precision/Recall Curve...')
-            from sklearn.metrics import precision_recall_curve, auc
-            model.eval(); tracker.cm[:] = 0
-            # Sammle alle logits und Labels im Val-Set
-            all_logits = []
-            all_labels = []
-            with torch.no_grad():
-                for vx, vy in val_loader:
-                    vx = vx.to(device)
-                    out = model(vx)
-                    all_logits.append(out.detach().cpu())
-                    all_labels.append(vy.detach().cpu())
-            import torch as _t
-            logits_cat = _t.cat(all_logits, dim=0)
-            labels_cat = _t.cat(all_labels, dim=0)
-            probs = logits_cat.softmax(dim=1)
-            # Macro: Durchschnitt über Klassen P/R vs Schwelle – wir mitteln diskrete P/R Werte über Klassen
-            num_cls = probs.size(1)
-            thresholds_set = None
-            import numpy as _np
-            pr_points = []
-            for c in range(num_cls):
-                y_true = (labels_cat == c).numpy()
-                y_score = probs[:, c].numpy()
-                prec, rec, thr = precision_recall_curve(y_true, y_score)
-                if thresholds_set is None:
-                    thresholds_set = thr
-                # Interpolate rec/prec onto common threshold grid if shapes differ – simple slicing/truncation
-                pr_points.append((prec, rec, thr))
-            # Build macro curve by sampling a fixed set of thresholds from 0..1
-            grid = _np.linspace(0, 1, 101)
-            macro_prec = []
-            macro_rec = []
-            for t in grid:
-                cls_prec = []
-                cls_rec = []
-                for prec, rec, thr in pr_points:
-                    # Choose closest threshold index
-                    if len(thr) == 0:
-                        continue
-                    idx = min(range(len(thr)), key=lambda i: abs(thr[i]-t)) if len(thr) > 0 else 0
-                    # precision/recall arrays have len(thr)+1; align by idx
-                    p_val = prec[min(idx, len(prec)-1)]
-                    r_val = rec[min(idx, len(rec)-1)]
-                    cls_prec.append(p_val)
-                    cls_rec.append(r_val)
-                if cls_prec:
-                    macro_prec.append(float(_np.mean(cls_prec)))
-                    macro_rec.append(float(_np.mean(cls_rec)))
-                else:
-                    macro_prec.append(0.0); macro_rec.append(0.0)
-            pr_auc = auc(macro_rec, macro_prec) if len(macro_rec) > 1 else 0.0
-            pr_curve = {
-                'thresholds': grid.tolist(),
-                'macro_precision': macro_prec,
-                'macro_recall': macro_rec,
-                'macro_pr_auc': pr_auc
-            }
+            from curves import macro_pr_curve
+            # Vektorisiert: sortierte Scores + searchsorted je Klasse (ml/curves.py)
+            pr_curve = macro_pr_curve(val_results.probs, val_results.labels)
+            macro_prec = pr_curve['macro_precision']
+            macro_rec = pr_curve['macro_recall']
+            pr_auc = pr_curve['macro_pr_auc']
             with open(out_dir / 'pr_curve.json', 'w', encoding='utf-8') as f:
                 json.dump(pr_curve, f, indent=2)
             print(f"[PR] Fertig (macro PR AUC={pr_auc:.4f}) -> pr_curve.json")
@@ -607,15 +920,115 @@ def main():
         except Exception as e:
             print(f"[PR][WARN] Berechnung fehlgeschlagen: {e}")
 
+    # ROC Curve (Val)
+    if args.roc_curve and val_results is not None:
+        try:
+            print('[ROC] Berechne ROC Kurve...')
+            from curves import macro_roc_curve
+            # One-vs-rest macro averaging (TPR auf festes FPR-Raster interpoliert)
+            roc_curve_data = macro_roc_curve(val_results.probs, val_results.labels)
+            macro_fpr = roc_curve_data['fpr']
+            macro_tpr = roc_curve_data['tpr']
+            roc_auc = roc_curve_data['macro_roc_auc']
+            with open(out_dir / 'roc_curve.json', 'w', encoding='utf-8') as f:
+                json.dump(roc_curve_data, f, indent=2)
+            print(f"[ROC] Fertig (macro ROC AUC={roc_auc:.4f}) -> roc_curve.json")
+            if tb_writer:
+                try:
+                    import matplotlib.pyplot as plt, io, numpy as _np2, PIL.Image as _PIL
+                    fig, ax = plt.subplots()
+                    ax.plot(macro_fpr, macro_tpr)
+                    ax.set_xlabel('FPR'); ax.set_ylabel('TPR'); ax.set_title(f'Macro ROC (AUC={roc_auc:.3f})')
+                    buf = io.BytesIO(); fig.savefig(buf, format='png'); buf.seek(0)
+                    img = _PIL.open(buf)
+                    tb_writer.add_image('val/macro_roc_curve', _np2.array(img).transpose(2,0,1), 0)
+                    plt.close(fig)
+                except Exception as e:
+                    print(f"[ROC][WARN] ROC TB Logging fehlgeschlagen: {e}")
+        except Exception as e:
+            print(f"[ROC][WARN] Berechnung fehlgeschlagen: {e}")
+
+    # Save misclassification thumbnails
+    if args.save_miscls > 0 and val_results is not None:
+        try:
+            from PIL import Image
+            print(f"[MISCLS] Sammle Fehlklassifikationen (Top {args.save_miscls}) ...")
+            mis = []  # (loss, path, true, pred)
+            # val_loader ist nicht geshuffelt -> Position i im Cache entspricht val_ds.samples[i]
+            preds = val_results.preds
+            for i, sample_obj in enumerate(val_ds.samples[:len(val_results)]):
+                label = int(val_results.labels[i]); pred = int(preds[i])
+                if pred != label:
+                    mis.append((float(val_results.losses[i]), sample_obj.path, label, pred))
+            mis.sort(key=lambda x: x[0], reverse=True)
+            export_dir = out_dir / 'misclassifications'
+            export_dir.mkdir(exist_ok=True, parents=True)
+            for idx, (loss_val, path, y_true, y_pred) in enumerate(mis[:args.save_miscls]):
+                try:
+                    im = Image.open(path).convert('RGB')
+                    im.thumbnail((256,256))
+                    save_name = f"{idx:03d}_loss{loss_val:.3f}_t{y_true}_p{y_pred}.jpg"
+                    im.save(export_dir / save_name, format='JPEG', quality=90)
+                except Exception:
+                    pass
+            print(f"[MISCLS] Gespeichert: {min(len(mis), args.save_miscls)} Thumbnails -> {export_dir}")
+        except Exception as e:
+            print(f"[MISCLS][WARN] Export fehlgeschlagen: {e}")
+
+    # Performance Modi + gemessene Schrittzeit (erster Schritt = Warmup/Kompilierung, separat ausgewiesen)
+    perf_report = perf.summary()
+    if step_times:
+        steady = step_times[1:] or step_times
+        perf_report['step_time_ms'] = {
+            'first': step_times[0] * 1000.0,
+            'mean': float(np.mean(steady)) * 1000.0,
+            'median': float(np.median(steady)) * 1000.0,
+            'steps': len(step_times),
+        }
+        # gezählte Samples / summierte Schrittzeit (ohne ersten Schritt) statt train.batch_size / Median
+        steady_samples = step_samples[1:] if len(step_samples) > 1 else step_samples
+        perf_report['train_samples_per_s'] = sum(steady_samples) / float(np.sum(steady)) if np.sum(steady) > 0 else None
+    perf_report['train_throughput'] = throughput
+    if dist_ctx.enabled:
+        dist_report = dist_ctx.summary()
+        dist_report['global_samples_per_s'] = throughput['samples_per_s']
+        dist_report['per_rank_samples_per_s'] = (throughput['samples_per_s'] / dist_ctx.world_size) if throughput['samples_per_s'] else None
+        baseline_sps = None
+        if args.scaling_baseline:
+            try:
+                with open(args.scaling_baseline, 'r', encoding='utf-8') as f:
+                    baseline_sps = json.load(f)['performance']['train_throughput']['samples_per_s']
+            except Exception as e:
+                print(f"[DDP][WARN] Scaling Baseline nicht lesbar: {e}")
+        dist_report['baseline_samples_per_s'] = baseline_sps
+        if baseline_sps and throughput['samples_per_s']:
+            dist_report['speedup'] = throughput['samples_per_s'] / baseline_sps
+            dist_report['scaling_efficiency'] = dist_report['speedup'] / dist_ctx.world_size
+        else:
+            dist_report['speedup'] = None
+            dist_report['scaling_efficiency'] = None
+        perf_report['distributed'] = dist_report
+
     # Speichere finale Metriken
     metrics_json = {
         'best_macro_f1': best_macro,
         'confusion': metrics_res.confusion.tolist(),
         'per_class': metrics_res.per_class,
+        'val_streaming': metrics_res.streaming_summary(),
         'lr_history': lr_history,
         'mixed_precision': use_amp,
         'device': device,
+        'split': {**split_meta, 'sizes': {'train': n_train, 'val': n_val, 'test': n_test}},
+        'performance': perf_report,
+        'step_profile': profile_summary['overall'] if profile_summary else None,
         'epochs_trained': epoch,
+        'progressive_resize': {
+            'phases': [{'epoch': p.epoch, 'size': p.size, 'batch_size': p.batch_size or batch_size} for p in resize_phases],
+            'relative_cost': relative_cost(resize_phases, epoch, image_size),
+        } if resize_phases else None,
+        'asha': asha.summary() if asha is not None else None,
+        'prune': {'prune_spec': prune_spec, 'change': prune_report['change']} if prune_report else None,
+        'qat': {**qat_cfg, 'source': args.qat_from} if qat_cfg is not None else None,
         'resume_start_epoch': start_epoch,
         'test': test_metrics,
         'pr_curve': pr_curve,
@@ -630,6 +1043,10 @@ def main():
     }
     with open(out_dir / 'metrics_final.json', 'w', encoding='utf-8') as f:
         json.dump(metrics_json, f, indent=2)
+    checkpointer.close()
+    cleanup(dist_ctx)
+    if checkpointer.errors:
+        print(f"[CKPT][WARN] {len(checkpointer.errors)} Checkpoint(s) nicht geschrieben: {checkpointer.errors}")
     print('[DONE] Training abgeschlossen.')
     if tb_writer:
         tb_writer.close()
@@ -687,94 +1104,5 @@ def main():
         except Exception as e:
             print(f"[REPORT][WARN] HTML Report fehlgeschlagen: {e}")
 
-    # ROC Curve (Val) after PR if requested
-    if args.roc_curve:
-        try:
-            print('[ROC] Berechne ROC Kurve...')
-            from sklearn.metrics import roc_curve, auc
-            model.eval()
-            all_logits = []
-            all_labels = []
-            with torch.no_grad():
-                for vx, vy in val_loader:
-                    vx = vx.to(device)
-                    out = model(vx)
-                    all_logits.append(out.detach().cpu())
-                    all_labels.append(vy.detach().cpu())
-            import torch as _t
-            logits_cat = _t.cat(all_logits, dim=0)
-            labels_cat = _t.cat(all_labels, dim=0)
-            probs = logits_cat.softmax(dim=1)
-            num_cls = probs.size(1)
-            import numpy as _np
-            # One-vs-rest macro averaging
-            tprs = []
-            fprs = []
-            for c in range(num_cls):
-                y_true = (labels_cat == c).numpy().astype(int)
-                y_score = probs[:, c].numpy()
-                fpr, tpr, _ = roc_curve(y_true, y_score)
-                # Interpolate onto unified grid
-                grid = _np.linspace(0,1,101)
-                tpr_interp = _np.interp(grid, fpr, tpr)
-                tprs.append(tpr_interp)
-            macro_tpr = _np.mean(tprs, axis=0).tolist()
-            macro_fpr = grid.tolist()
-            roc_auc = auc(grid, _np.mean(tprs, axis=0))
-            roc_curve_data = {'fpr': macro_fpr, 'tpr': macro_tpr, 'macro_roc_auc': float(roc_auc)}
-            with open(out_dir / 'roc_curve.json', 'w', encoding='utf-8') as f:
-                json.dump(roc_curve_data, f, indent=2)
-            print(f"[ROC] Fertig (macro ROC AUC={roc_auc:.4f}) -> roc_curve.json")
-            if tb_writer:
-                try:
-                    import matplotlib.pyplot as plt, io, numpy as _np2, PIL.Image as _PIL
-                    fig, ax = plt.subplots()
-                    ax.plot(macro_fpr, macro_tpr)
-                    ax.set_xlabel('FPR'); ax.set_ylabel('TPR'); ax.set_title(f'Macro ROC (AUC={roc_auc:.3f})')
-                    buf = io.BytesIO(); fig.savefig(buf, format='png'); buf.seek(0)
-                    img = _PIL.open(buf)
-                    tb_writer.add_image('val/macro_roc_curve', _np2.array(img).transpose(2,0,1), 0)
-                    plt.close(fig)
-                except Exception as e:
-                    print(f"[ROC][WARN] ROC TB Logging fehlgeschlagen: {e}")
-        except Exception as e:
-            print(f"[ROC][WARN] Berechnung fehlgeschlagen: {e}")
-
-    # Save misclassification thumbnails
-    if args.save_miscls > 0:
-        try:
-            from PIL import Image
-            print(f"[MISCLS] Sammle Fehlklassifikationen (Top {args.save_miscls}) ...")
-            model.eval()
-            mis = []  # (loss, path, true, pred)
-            softmax = torch.nn.Softmax(dim=1)
-            with torch.no_grad():
-                for s in val_ds.indices:  # type: ignore
-                    img_t, label = val_ds.dataset[s]  # type: ignore
-                    if not isinstance(img_t, torch.Tensor):
-                        continue
-                    x = img_t.unsqueeze(0).to(device)
-                    out = model(x)
-                    prob = softmax(out)
-                    loss_val = float(criterion(out, torch.tensor([label], device=device)))
-                    pred = int(out.argmax(dim=1).item())
-                    if pred != label:
-                        sample_obj = full_ds.samples[s]  # type: ignore
-                        mis.append((loss_val, sample_obj.path, label, pred))
-            mis.sort(key=lambda x: x[0], reverse=True)
-            export_dir = out_dir / 'misclassifications'
-            export_dir.mkdir(exist_ok=True, parents=True)
-            for idx, (loss_val, path, y_true, y_pred) in enumerate(mis[:args.save_miscls]):
-                try:
-                    im = Image.open(path).convert('RGB')
-                    im.thumbnail((256,256))
-                    save_name = f"{idx:03d}_loss{loss_val:.3f}_t{y_true}_p{y_pred}.jpg"
-                    im.save(export_dir / save_name, format='JPEG', quality=90)
-                except Exception:
-                    pass
-            print(f"[MISCLS] Gespeichert: {min(len(mis), args.save_miscls)} Thumbnails -> {export_dir}")
-        except Exception as e:
-            print(f"[MISCLS][WARN] Export fehlgeschlagen: {e}")
-
 if __name__ == '__main__':
     main()